@@ -28,7 +28,7 @@ the MoNA library, in a more efficient manner than doing them separately.
 #
 
 # stdlib
-from typing import List
+from typing import Iterator, List
 
 # 3rd party
 from domdf_python_tools.paths import PathPlus
@@ -36,7 +36,8 @@ from domdf_python_tools.paths import PathPlus
 # this package
 import MoNA_GCMS_Library
 from pyms_nist_search import ReferenceData
-from pyms_nist_search.mona_tools import mass_spec_from_mona, parse_metadata
+from pyms_nist_search.mona_tools import MetadataDiagnostics, mass_spec_from_mona, parse_metadata
+from pyms_nist_search.msp import write_msp
 
 __all__: List[str] = []
 
@@ -47,11 +48,10 @@ def main() -> None:
 	"""
 
 	contributors = MoNA_GCMS_Library.parse_mona_contributors.ContributorList()
+	diagnostics = MetadataDiagnostics()
 
-	# Create ReferenceData and write to file
-	with (PathPlus(MoNA_GCMS_Library.__file__).parent / "MoNA.msp").open('w') as msp_fp:
-
-		for comp in MoNA_GCMS_Library.parse_mona_json.load_mona_json():
+	def iter_reference_data() -> Iterator[ReferenceData]:
+		for comp in MoNA_GCMS_Library.parse_mona_json.iter_mona_json():
 
 			compound: dict = comp["compound"][0]
 			names: list = compound["names"]
@@ -60,27 +60,28 @@ def main() -> None:
 
 			mass_spec = mass_spec_from_mona(comp["spectrum"])
 
-			properties_dict = parse_metadata(comp)
+			properties_dict = parse_metadata(comp, diagnostics)
 
 			# Contributors
 			contributor = contributors.add_contributor(properties_dict["contributor"])
-			contributor.add_contribution(**properties_dict)
+			contributor.add_contribution(properties_dict["id"], properties_dict["license"])
 
 			# MSP
 			del properties_dict["license"]
 
-			ref_data = ReferenceData(
+			yield ReferenceData(
 					name=name,
 					mass_spec=mass_spec,
 					synonyms=synonyms,
 					**properties_dict,
 					)
 
-			msp = ref_data.to_msp()
-			print(msp)
-			msp_fp.write(msp)
+	# Create ReferenceData and write to file
+	with (PathPlus(MoNA_GCMS_Library.__file__).parent / "MoNA.msp").open('w') as msp_fp:
+		write_msp(iter_reference_data(), msp_fp)
 
 	contributors.write_authors_file()
+	print(diagnostics.summary())
 
 
 if __name__ == "__main__":
@@ -28,17 +28,21 @@ and the license the contributions are licensed under.
 #
 
 # stdlib
-from typing import Dict, List, Optional, Sequence, Union
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Optional, Sequence, Set, Union
 
 # 3rd party
 from domdf_python_tools.compat import importlib_resources
+from typing_extensions import SupportsIndex
 
 # this package
 import MoNA_GCMS_Library
-from MoNA_GCMS_Library.parse_mona_json import load_mona_json
+from MoNA_GCMS_Library.parse_mona_json import iter_mona_json
 from pyms_nist_search.mona_tools import parse_metadata
 
-__all__ = ("Contributor", "Record", "ContributorList")
+__all__ = ("Contributor", "Record", "ContributorList", "known_licenses")
+
+#: Licenses which are summarised in the ``AUTHORS`` file when all of a contributor's records use them.
+known_licenses: FrozenSet[str] = frozenset({"CC BY", "CC BY 4.0", "CC BY-SA", "CC BY-NC-SA"})
 
 
 class Contributor:
@@ -56,6 +60,14 @@ class Contributor:
 		else:
 			self.contributions = []
 
+	@property
+	def licenses(self) -> Set[str]:
+		"""
+		The licenses the contributions are licensed under.
+		"""
+
+		return {record.license for record in self.contributions}
+
 	def __eq__(self, other) -> bool:  # noqa: MAN001
 		if isinstance(other, str):
 			return self.name == other
@@ -132,14 +144,72 @@ class Record:  # noqa: PRM002
 		if not properties_dict["license"]:
 			return cls(properties_dict["id"])
 		else:
-			return cls(**properties_dict)
+			return cls(properties_dict["id"], properties_dict["license"])
 
 
 class ContributorList(list, Sequence[Union[str, Contributor]]):
 	"""
 	A list of :class:`~.Contributor` objects.
+
+	The contributors are also indexed by name, so looking up a contributor takes constant time.
 	"""
 
+	def __init__(self, contributors: Iterable[Contributor] = ()):
+		super().__init__(contributors)
+		self._reindex()
+
+	def _reindex(self) -> None:
+		self._index: Dict[str, Contributor] = {}
+
+		for contributor in self:
+			self._index.setdefault(contributor.name, contributor)
+
+	def __contains__(self, item: object) -> bool:
+		if isinstance(item, Contributor):
+			item = item.name
+
+		if isinstance(item, str):
+			return item in self._index
+
+		return super().__contains__(item)
+
+	def append(self, contributor: Contributor) -> None:  # noqa: D102
+		super().append(contributor)
+		self._index.setdefault(contributor.name, contributor)
+
+	def extend(self, contributors: Iterable[Contributor]) -> None:  # noqa: D102
+		for contributor in contributors:
+			self.append(contributor)
+
+	def __iadd__(self, contributors: Iterable[Contributor]) -> "ContributorList":  # type: ignore[override,misc]
+		self.extend(contributors)
+		return self
+
+	def insert(self, index: SupportsIndex, contributor: Contributor) -> None:  # noqa: D102
+		super().insert(index, contributor)
+		self._reindex()
+
+	def remove(self, contributor: Union[str, Contributor]) -> None:  # noqa: D102
+		super().remove(contributor)
+		self._reindex()
+
+	def pop(self, index: SupportsIndex = -1) -> Contributor:  # noqa: D102
+		contributor = super().pop(index)
+		self._reindex()
+		return contributor
+
+	def clear(self) -> None:  # noqa: D102
+		super().clear()
+		self._index.clear()
+
+	def __setitem__(self, index, value) -> None:  # noqa: MAN001
+		super().__setitem__(index, value)
+		self._reindex()
+
+	def __delitem__(self, index) -> None:  # noqa: MAN001
+		super().__delitem__(index)
+		self._reindex()
+
 	def add_contributor(self, contributor_name: str) -> Contributor:
 		"""
 		Add a new contributor to the list and return the :class:`~.Contributor` object representing them.
@@ -147,12 +217,13 @@ class ContributorList(list, Sequence[Union[str, Contributor]]):
 		:param contributor_name: The name of the contributor.
 		"""
 
-		if contributor_name in self:
-			return self[self.index(contributor_name)]
-		else:
-			new_contributor = Contributor(contributor_name)
-			self.append(new_contributor)
-			return new_contributor
+		contributor = self._index.get(contributor_name)
+
+		if contributor is None:
+			contributor = Contributor(contributor_name)
+			self.append(contributor)
+
+		return contributor
 
 	def get_contributor(self, contributor_name: str) -> Optional[Contributor]:
 		"""
@@ -162,10 +233,25 @@ class ContributorList(list, Sequence[Union[str, Contributor]]):
 		:param contributor_name: The name of the contributor
 		"""  # noqa: D400
 
-		if contributor_name in self:
-			return self[self.index(contributor_name)]
-		else:
-			return None
+		return self._index.get(contributor_name)
+
+	def iter_authors(self) -> Iterator[str]:
+		"""
+		Iterate over the entries in the ``AUTHORS`` file, one contributor at a time.
+		"""
+
+		for contributor in self:
+			lines = [contributor.name]
+			licenses = contributor.licenses
+
+			if len(licenses) == 1 and licenses <= known_licenses:
+				lines.append(f"\tAll contributions licensed under {licenses.pop()}")
+			else:
+				for record in contributor.contributions:
+					lines.append(f"\tid: {record.id} \t License: {record.license}")
+
+			lines.append('')
+			yield '\n'.join(lines) + '\n'
 
 	def write_authors_file(self) -> None:
 		"""
@@ -174,26 +260,12 @@ class ContributorList(list, Sequence[Union[str, Contributor]]):
 
 		with importlib_resources.path(MoNA_GCMS_Library, "AUTHORS") as authors_file:
 			with authors_file.open('w') as fp:
-
-				for contributor in self:
-					print(contributor.name)
-					fp.write(f"{contributor.name}\n")
-
-					for license_ in {"CC BY", "CC BY 4.0", "CC BY-SA", "CC BY-NC-SA"}:
-						if all([record.license == license_ for record in contributor.contributions]):
-							print(f"\tAll contributions licensed under {license_}")
-							fp.write(f"\tAll contributions licensed under {license_}\n")
-							break
-					else:
-						for record in contributor.contributions:
-							print(f"\tid: {record.id} \t License: {record.license}")
-							fp.write(f"\tid: {record.id} \t License: {record.license}\n")
-
-					print()
-					fp.write('\n')
+				for entry in self.iter_authors():
+					print(entry, end='')
+					fp.write(entry)
 
 	@classmethod
-	def from_mona_dict(cls, mona_data: List[Dict]) -> "ContributorList":
+	def from_mona_dict(cls, mona_data: Iterable[Dict]) -> "ContributorList":
 		"""
 		Construct a :class:`~.ContributorList` from the MoNA database.
 
@@ -203,17 +275,15 @@ class ContributorList(list, Sequence[Union[str, Contributor]]):
 		contributors = cls()
 
 		for comp in mona_data:
-			record = Record.from_mona_dict(comp)
-			name = parse_metadata(comp)["contributor"]
-
-			contributor = contributors.add_contributor(name)
-			contributor.contributions.append(record)
+			properties_dict = parse_metadata(comp)
+			contributor = contributors.add_contributor(properties_dict["contributor"])
+			contributor.add_contribution(properties_dict["id"], properties_dict["license"])
 
 		return contributors
 
 
 def main() -> None:
-	mona_data = load_mona_json()
+	mona_data = iter_mona_json()
 	contributor_list = ContributorList.from_mona_dict(mona_data)
 	contributor_list.write_authors_file()
 
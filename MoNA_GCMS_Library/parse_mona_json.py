@@ -29,26 +29,41 @@ https://chemdata.nist.gov/mass-spc/ms-search/Library_conversion_tool.html
 #
 
 # stdlib
-import json
-import shutil
-from typing import Dict, List
+import collections
+import io
+import itertools
+import multiprocessing
+import multiprocessing.pool
+import os
+import time
+from typing import IO, Deque, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
 
 # 3rd party
-from domdf_python_tools.compat import importlib_resources
 from domdf_python_tools.paths import PathPlus
 
 # this package
 import MoNA_GCMS_Library
-from pyms_nist_search import ReferenceData
+from pyms_nist_search import ReferenceData, mona_tools
+from pyms_nist_search.mona_tools import MetadataDiagnostics
+from pyms_nist_search.msp import write_msp
 
-__all__ = ("load_mona_json", "create_mona_msp")
+__all__ = (
+		"iter_mona_json",
+		"load_mona_json",
+		"convert_mona_chunk",
+		"convert_mona_parallel",
+		"create_mona_msp",
+		)
 
+_T = TypeVar("_T")
 
-def load_mona_json() -> List[Dict]:
+
+def iter_mona_json() -> Iterator[Dict]:
 	"""
-	Loads the MoNA database from a compressed JSON file.
+	Iterate over the compounds in the MoNA database, one at a time.
 
-	:return:
+	The compounds are read directly from the compressed JSON file, without extracting it to disk
+	or loading the whole database into memory.
 	"""
 
 	mona_library_dir = PathPlus(__file__).parent
@@ -60,24 +75,148 @@ def load_mona_json() -> List[Dict]:
 	# 			'https://mona.fiehnlab.ucdavis.edu/rest/downloads/retrieve/33c87724-3595-4d7e-9bc0-35d1011c7482/',
 	# 			str(library_zip_file))
 
-	if not library_json_file.is_file():
-		shutil.unpack_archive(str(library_zip_file), str(mona_library_dir), format="zip")
+	if library_json_file.is_file():
+		return mona_tools.iter_mona_json(library_json_file)
+	else:
+		return mona_tools.iter_mona_json(library_zip_file)
+
+
+def load_mona_json() -> List[Dict]:
+	"""
+	Loads the MoNA database from a compressed JSON file.
+
+	:return:
+	"""
 
-	return json.loads(importlib_resources.read_text(MoNA_GCMS_Library, "MoNA-export-GC-MS_Spectra.json"))
+	return list(iter_mona_json())
 
 
-def create_mona_msp() -> None:
+def _chunked(iterable: Iterable[_T], size: int) -> Iterator[List[_T]]:
+	iterator = iter(iterable)
+
+	while True:
+		chunk = list(itertools.islice(iterator, size))
+		if not chunk:
+			return
+		yield chunk
+
+
+def convert_mona_chunk(mona_data: List[Dict], verbose: bool = False) -> Tuple[int, str, MetadataDiagnostics]:
+	"""
+	Convert a chunk of compounds from the MoNA database into MSP format.
+
+	:param mona_data: The compounds, parsed from the JSON file.
+	:param verbose: Whether to print unrecognised properties as they are encountered.
+
+	:return: The number of records converted, the MSP data for those records,
+		and diagnostics for any properties which were not recognised.
+	"""
+
+	fp = io.StringIO()
+	diagnostics = MetadataDiagnostics(verbose=verbose)
+	count = write_msp((ReferenceData.from_mona_dict(comp, diagnostics) for comp in mona_data), fp)
+	return count, fp.getvalue(), diagnostics
+
+
+def convert_mona_parallel(
+		mona_data: Iterable[Dict],
+		fp: IO[str],
+		processes: Optional[int] = None,
+		chunk_size: int = 500,
+		report_interval: float = 5.0,
+		diagnostics: Optional[MetadataDiagnostics] = None,
+		) -> int:
+	"""
+	Convert compounds from the MoNA database into MSP format using a pool of worker processes.
+
+	The compounds are split into chunks which are converted in parallel,
+	and the output is written to ``fp`` in the same order as the input.
+	At most two chunks per process are in flight at once, so memory usage does not depend on
+	the size of the database.
+
+	:param mona_data: The compounds, parsed from the JSON file.
+	:param fp: The file to write the MSP data to.
+	:param processes: The number of worker processes. Defaults to the number of CPUs.
+		If ``1`` the records are converted in the current process.
+	:param chunk_size: The number of records to send to a worker process at once.
+	:param report_interval: The minimum number of seconds between progress reports.
+	:param diagnostics: Collects any properties which were not recognised.
+		If its :attr:`~.MetadataDiagnostics.verbose` attribute is :py:obj:`True`
+		the properties are also printed as they are encountered.
+
+	:return: The number of records written.
+	"""
+
+	if processes is None:
+		processes = os.cpu_count() or 1
+
+	if processes < 1:
+		raise ValueError("`processes` must be at least 1.")
+	if chunk_size < 1:
+		raise ValueError("`chunk_size` must be at least 1.")
+
+	count = 0
+	start_time = last_report = time.perf_counter()
+
+	verbose = diagnostics is not None and diagnostics.verbose
+
+	def write_chunk(result: Tuple[int, str, MetadataDiagnostics]) -> None:
+		nonlocal count, last_report
+
+		chunk_count, msp_data, chunk_diagnostics = result
+		fp.write(msp_data)
+		count += chunk_count
+
+		if diagnostics is not None:
+			diagnostics.merge(chunk_diagnostics)
+
+		now = time.perf_counter()
+		if now - last_report >= report_interval:
+			print(f"Converted {count} records ({count / (now - start_time):.0f} records/s)")
+			last_report = now
+
+	chunks = _chunked(mona_data, chunk_size)
+
+	if processes == 1:
+		for chunk in chunks:
+			write_chunk(convert_mona_chunk(chunk, verbose))
+
+	else:
+		with multiprocessing.Pool(processes) as pool:
+			in_flight: Deque["multiprocessing.pool.AsyncResult[Tuple[int, str, MetadataDiagnostics]]"] = collections.deque()
+
+			for chunk in chunks:
+				in_flight.append(pool.apply_async(convert_mona_chunk, (chunk, verbose)))
+
+				if len(in_flight) >= processes * 2:
+					write_chunk(in_flight.popleft().get())
+
+			while in_flight:
+				write_chunk(in_flight.popleft().get())
+
+	elapsed = time.perf_counter() - start_time
+	print(f"Converted {count} records in {elapsed:.1f}s ({count / max(elapsed, 1e-9):.0f} records/s)")
+
+	return count
+
+
+def create_mona_msp(processes: Optional[int] = None, verbose: bool = False) -> None:
 	"""
 	Generate ``.msp`` files for each file in the MoNA database.
+
+	:param processes: The number of worker processes to use for the conversion.
+		Defaults to the number of CPUs.
+	:param verbose: Whether to print unrecognised properties as they are encountered.
+		A summary of the unrecognised properties is always printed at the end.
 	"""
 
+	diagnostics = MetadataDiagnostics(verbose=verbose)
+
 	# Create ReferenceData and write to file
 	with (PathPlus(MoNA_GCMS_Library.__file__).parent / "MoNA.msp").open('w') as fp:
-		for comp in load_mona_json():
-			ref_data = ReferenceData.from_mona_dict(comp)
-			msp = ref_data.to_msp()
-			# print(msp)
-			fp.write(msp)
+		convert_mona_parallel(iter_mona_json(), fp, processes=processes, diagnostics=diagnostics)
+
+	print(diagnostics.summary())
 
 
 def main() -> None:
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+#
+#  soak_search.py
+"""
+Soak test for the search engine.
+
+Runs a large number of searches against the MoNA user library and checks that the
+resident set size (RSS) of the process stays flat once warmed up,
+which would not be the case if references were leaked when constructing the results.
+
+Requires the NIST MS Search DLL (on Windows) or the Docker search server (elsewhere),
+and the MoNA library in ``MoNA_GCMS_Library/MoNA``.
+"""
+#
+#
+#  This file is part of PyMassSpec NIST Search
+#  Python interface to the NIST MS Search DLL
+#
+#  Copyright (c) 2020-2026 Dominic Davis-Foster <dominic@davis-foster.co.uk>
+#
+#  PyMassSpec NIST Search is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as
+#  published by the Free Software Foundation; either version 3 of
+#  the License, or (at your option) any later version.
+#
+#  PyMassSpec NIST Search is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public
+#  License along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+
+
+# stdlib
+import ctypes
+import gc
+import os
+import sys
+import time
+from typing import Optional
+
+# 3rd party
+from domdf_python_tools.paths import PathPlus
+from pyms.Spectrum import MassSpectrum
+
+# this package
+import pyms_nist_search
+
+NUM_SEARCHES = 100_000
+WARMUP_SEARCHES = 5_000
+SAMPLE_INTERVAL = 10_000
+
+#: Every nth search also retrieves the reference data for the hits.
+REF_DATA_INTERVAL = 10
+
+#: Maximum permitted growth in RSS after warm-up, in bytes.
+MAX_RSS_GROWTH = 10 * 1024 * 1024
+
+# Benzene
+mass_list = [26, 27, 37, 38, 39, 50, 51, 52, 63, 73, 74, 76, 77, 78, 79]
+intensity_list = [35, 34, 43, 57, 135, 163, 195, 157, 28, 35, 117, 46, 202, 999, 66]
+
+
+def current_rss() -> int:
+	"""
+	Returns the resident set size of the current process, in bytes.
+	"""
+
+	if sys.platform == "win32":
+
+		class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+			_fields_ = [
+					("cb", ctypes.c_ulong),
+					("PageFaultCount", ctypes.c_ulong),
+					("PeakWorkingSetSize", ctypes.c_size_t),
+					("WorkingSetSize", ctypes.c_size_t),
+					("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+					("QuotaPagedPoolUsage", ctypes.c_size_t),
+					("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+					("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+					("PagefileUsage", ctypes.c_size_t),
+					("PeakPagefileUsage", ctypes.c_size_t),
+					]
+
+		counters = PROCESS_MEMORY_COUNTERS()
+		counters.cb = ctypes.sizeof(counters)
+		handle = ctypes.windll.kernel32.GetCurrentProcess()  # type: ignore[attr-defined]
+		ctypes.windll.psapi.GetProcessMemoryInfo(  # type: ignore[attr-defined]
+				handle,
+				ctypes.byref(counters),
+				counters.cb,
+				)
+		return counters.WorkingSetSize
+
+	# Linux
+	statm = PathPlus("/proc/self/statm").read_text().split()
+	return int(statm[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def main() -> None:
+	"""
+	Run the soak test, raising :exc:`AssertionError` if the RSS grows by more than ``MAX_RSS_GROWTH``.
+	"""
+
+	repo_root = PathPlus(__file__).parent.parent.abspath()
+	mass_spec = MassSpectrum(mass_list, intensity_list)
+
+	with pyms_nist_search.Engine(
+			str(repo_root / "MoNA_GCMS_Library" / "MoNA"),
+			pyms_nist_search.NISTMS_USER_LIB,
+			str(repo_root),
+			) as search:
+
+		baseline_rss: Optional[int] = None
+		start = time.perf_counter()
+
+		for idx in range(1, NUM_SEARCHES + 1):
+			if idx % REF_DATA_INTERVAL:
+				search.full_spectrum_search(mass_spec, n_hits=20)
+			else:
+				search.full_search_with_ref_data(mass_spec, n_hits=5, prefetch=5)
+
+			if idx == WARMUP_SEARCHES:
+				gc.collect()
+				baseline_rss = current_rss()
+				print(f"RSS after {idx} searches (baseline): {baseline_rss / 1024 / 1024:.1f} MB")
+
+			elif idx % SAMPLE_INTERVAL == 0:
+				rss = current_rss()
+				elapsed = time.perf_counter() - start
+				print(f"RSS after {idx} searches: {rss / 1024 / 1024:.1f} MB ({idx / elapsed:.0f} searches/s)")
+
+	assert baseline_rss is not None
+
+	gc.collect()
+	growth = current_rss() - baseline_rss
+	print(f"RSS growth after warm-up: {growth / 1024 / 1024:.2f} MB")
+
+	if growth > MAX_RSS_GROWTH:
+		raise AssertionError(
+				f"RSS grew by {growth / 1024 / 1024:.2f} MB over {NUM_SEARCHES - WARMUP_SEARCHES} searches "
+				f"(limit {MAX_RSS_GROWTH / 1024 / 1024:.0f} MB)"
+				)
+
+	print("RSS is stable.")
+
+
+if __name__ == "__main__":
+	main()
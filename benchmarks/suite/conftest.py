@@ -0,0 +1,559 @@
+#!/usr/bin/env python
+#
+#  conftest.py
+"""
+Fixtures for the benchmark suite.
+
+The benchmarks use `pytest-benchmark <https://pytest-benchmark.readthedocs.io>`_
+and run on any platform without the NIST MS Search DLL or Docker:
+the C extension is replaced by :class:`~.MockCore`, which returns canned results,
+and the search server by :class:`~.MockSearchServer`, which serves canned responses on ``localhost:5001``.
+The synthetic data are generated from a fixed seed, so every run measures the same work.
+
+Run the suite and save the results as a baseline with:
+
+.. code-block:: bash
+
+	$ tox -e bench
+
+and compare a later run against the most recent baseline with:
+
+.. code-block:: bash
+
+	$ tox -e bench -- --benchmark-compare --benchmark-compare-fail=mean:10%
+"""
+#
+#  This file is part of PyMassSpec NIST Search
+#  Python interface to the NIST MS Search DLL
+#
+#  Copyright (c) 2020-2026 Dominic Davis-Foster <dominic@davis-foster.co.uk>
+#
+#  PyMassSpec NIST Search is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as
+#  published by the Free Software Foundation; either version 3 of
+#  the License, or (at your option) any later version.
+#
+#  PyMassSpec NIST Search is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public
+#  License along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+
+# stdlib
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List
+
+# 3rd party
+import pytest
+import sdjson
+from domdf_python_tools.paths import PathPlus
+from pyms.Spectrum import MassSpectrum
+
+# this package
+from pyms_nist_search import ReferenceData, SearchResult, docker_engine, win_engine
+from pyms_nist_search.compiled_library import compile_msp
+from pyms_nist_search.msp import write_msp
+
+#: The seed for the random number generator used to create the synthetic data.
+SEED = 1234
+
+#: The number of hits returned for each search.
+NUM_HITS = 20
+
+#: The number of spectra in a batch search.
+NUM_SPECTRA = 100
+
+#: The number of peaks in each synthetic spectrum.
+NUM_PEAKS = 150
+
+#: The number of records in the synthetic MSP, compiled and MoNA libraries.
+NUM_RECORDS = 1000
+
+#: The number of different sets of metadata in the synthetic MoNA records.
+NUM_MONA_VARIANTS = 6
+
+
+def make_mass_spec(rng: random.Random, num_peaks: int = NUM_PEAKS) -> MassSpectrum:
+	"""
+	Create a synthetic mass spectrum.
+
+	:param rng:
+	:param num_peaks:
+	"""
+
+	mass_list = sorted(rng.sample(range(30, 600), num_peaks))
+	intensity_list = [float(rng.randint(1, 9999)) for _ in mass_list]
+	return MassSpectrum(mass_list, intensity_list)
+
+
+def make_name_chars(name: str, width: int = 81) -> List[int]:
+	"""
+	Encode a name as the character codes returned by the C extension, padded with ``NUL``.
+
+	:param name:
+	:param width:
+	"""
+
+	name_chars = [ord(char) for char in name[:width - 1]]
+	return name_chars + [0] * (width - len(name_chars))
+
+
+def make_pynist_hit(rng: random.Random, idx: int) -> Dict[str, Any]:
+	"""
+	Create a hit in the form returned by the C extension.
+
+	:param rng:
+	:param idx: The index of the hit.
+	"""
+
+	# 224 and 225 are the DLL's codes for α and β
+	name_chars = make_name_chars(f"Compound {idx}, {rng.randint(1, 99)}-dimethyl-") + [224, 225]
+
+	return {
+			"hit_name_chars": name_chars,
+			"cas_no": rng.randint(50, 999999),
+			"sim_num": rng.randint(500, 999),
+			"rev_sim_num": rng.randint(500, 999),
+			"hit_prob": rng.randint(0, 9999),
+			"spec_loc": rng.randint(0, 2**31),
+			"lib_idx": 0,
+			}
+
+
+def make_pynist_reference_data(rng: random.Random, idx: int) -> Dict[str, Any]:
+	"""
+	Create reference data in the form returned by the C extension.
+
+	:param rng:
+	:param idx: The index of the compound.
+	"""
+
+	mass_spec = make_mass_spec(rng)
+
+	return {
+			"name_chars": make_name_chars(f"Compound {idx}"),
+			"cas": f"{idx}-00-0",
+			"formula": "C6H6",
+			"contributor": "Synthetic",
+			"nist_no": 100000 + idx,
+			"id": str(idx),
+			"mw": rng.randint(50, 600),
+			"mass_list": mass_spec.mass_list,
+			"intensity_list": mass_spec.intensity_list,
+			"synonyms_chars": [make_name_chars(f"Synonym {idx}.{n}") for n in range(3)],
+			"lib_idx": 0,
+			}
+
+
+def make_hit_table(hits: List[Dict[str, Any]], num_spectra: int) -> Dict[str, Any]:
+	"""
+	Create the columnar hit table returned by ``_core._full_spectrum_search_batch``,
+	with the same hits for each spectrum.
+
+	:param hits: Hits in the form returned by the C extension.
+	:param num_spectra:
+	"""
+
+	rows = [(query_idx, hit) for query_idx in range(num_spectra) for hit in hits]
+	name_width = len(hits[0]["hit_name_chars"])
+
+	return {
+			"query_idx": [query_idx for query_idx, hit in rows],
+			"spec_loc": [hit["spec_loc"] for query_idx, hit in rows],
+			"lib_idx": [hit["lib_idx"] for query_idx, hit in rows],
+			"sim_num": [hit["sim_num"] for query_idx, hit in rows],
+			"rev_sim_num": [hit["rev_sim_num"] for query_idx, hit in rows],
+			"hit_prob": [hit["hit_prob"] for query_idx, hit in rows],
+			"cas_no": [hit["cas_no"] for query_idx, hit in rows],
+			"hit_names": bytes(char for query_idx, hit in rows for char in hit["hit_name_chars"]),
+			"name_width": name_width,
+			}
+
+
+class MockCore:
+	"""
+	Stands in for the C extension, returning canned results without searching a library.
+
+	:param hits: The hits returned by every search, in the form returned by the C extension.
+	:param reference_data: The reference data returned for every location, in the form returned by the C extension.
+	"""
+
+	def __init__(self, hits: List[Dict[str, Any]], reference_data: Dict[str, Any]) -> None:
+		self.hits = hits
+		self.reference_data = reference_data
+
+	def _spectrum_search(self, spectrum: str, controls: Any, constraints: Any) -> List[Dict[str, Any]]:
+		return self.hits
+
+	def _full_spectrum_search(self, spectrum: str, controls: Any, constraints: Any) -> List[Dict[str, Any]]:
+		return self.hits
+
+	def _full_spectrum_search_batch(
+			self,
+			spectra: bytes,
+			offsets: List[int],
+			n_hits: int,
+			controls: Any,
+			constraints: Any,
+			release_gil: bool,
+			) -> Dict[str, Any]:
+		return make_hit_table(self.hits[:n_hits], len(offsets) - 1)
+
+	def _get_reference_data(self, spec_loc: int) -> Dict[str, Any]:
+		return self.reference_data
+
+	def _get_reference_data_many(self, spec_locs: List[int]) -> List[Dict[str, Any]]:
+		return [self.reference_data] * len(spec_locs)
+
+
+class MockSearchServer:
+	"""
+	Stands in for the search server in the Docker image, serving canned responses on ``localhost:5001``.
+
+	:param responses: Mapping of URL paths (without the query string) to the JSON text returned for them.
+	"""
+
+	def __init__(self, responses: Dict[str, str]) -> None:
+		self.responses = {path: body.encode("UTF-8") for path, body in responses.items()}
+
+		server = self
+
+		class Handler(BaseHTTPRequestHandler):
+			protocol_version = "HTTP/1.1"
+
+			def do_GET(self) -> None:  # noqa: N802
+				# Read and discard the request body, as the real server would parse it.
+				self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+				body = server.responses.get(self.path.split('?')[0])
+				if body is None:
+					self.send_error(404)
+					return
+
+				self.send_response(200)
+				self.send_header("Content-Type", "application/json")
+				self.send_header("Content-Length", str(len(body)))
+				self.end_headers()
+				self.wfile.write(body)
+
+			do_POST = do_GET  # noqa: N815
+
+			def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+				pass
+
+		self.httpd = ThreadingHTTPServer(("localhost", 5001), Handler)
+		self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+	def __enter__(self) -> "MockSearchServer":
+		self.thread.start()
+		return self
+
+	def __exit__(self, exc_type, exc_val, exc_tb) -> None:  # noqa: MAN001
+		self.httpd.shutdown()
+		self.httpd.server_close()
+
+
+@pytest.fixture(scope="session")
+def mass_spec() -> MassSpectrum:
+	return make_mass_spec(random.Random(SEED))
+
+
+@pytest.fixture(scope="session")
+def spectra() -> List[MassSpectrum]:
+	rng = random.Random(SEED)
+	return [make_mass_spec(rng) for _ in range(NUM_SPECTRA)]
+
+
+@pytest.fixture(scope="session")
+def pynist_hits() -> List[Dict[str, Any]]:
+	rng = random.Random(SEED)
+	return [make_pynist_hit(rng, idx) for idx in range(NUM_HITS)]
+
+
+@pytest.fixture(scope="session")
+def pynist_reference_data() -> Dict[str, Any]:
+	return make_pynist_reference_data(random.Random(SEED), 0)
+
+
+@pytest.fixture(scope="session")
+def reference_data(pynist_reference_data: Dict[str, Any]) -> ReferenceData:
+	return ReferenceData.from_pynist(pynist_reference_data)
+
+
+@pytest.fixture(scope="session")
+def msp_file(tmp_path_factory) -> PathPlus:
+	"""
+	A synthetic MSP library with :py:data:`NUM_RECORDS` records.
+	"""
+
+	rng = random.Random(SEED)
+	filename = PathPlus(tmp_path_factory.mktemp("msp")) / "library.msp"
+
+	with filename.open('w') as fp:
+		write_msp((ReferenceData.from_pynist(make_pynist_reference_data(rng, idx)) for idx in range(NUM_RECORDS)), fp)
+
+	return filename
+
+
+@pytest.fixture(scope="session")
+def compiled_library_file(msp_file: PathPlus) -> PathPlus:
+	"""
+	The synthetic MSP library in the compiled binary format.
+	"""
+
+	filename = msp_file.with_suffix(".pynistlib")
+	compile_msp(msp_file, filename)
+	return filename
+
+
+@pytest.fixture(scope="session")
+def hit_list(pynist_hits: List[Dict[str, Any]]) -> List[SearchResult]:
+	return [SearchResult.from_pynist(hit) for hit in pynist_hits]
+
+
+@pytest.fixture()
+def win_search(
+		monkeypatch,
+		pynist_hits: List[Dict[str, Any]],
+		pynist_reference_data: Dict[str, Any],
+		) -> win_engine.Engine:
+	"""
+	A :class:`pyms_nist_search.win_engine.Engine` backed by :class:`~.MockCore`.
+	"""
+
+	monkeypatch.setattr(win_engine, "_core", MockCore(pynist_hits, pynist_reference_data))
+
+	# Skip __init__, which would initialise the DLL
+	return win_engine.Engine.__new__(win_engine.Engine)
+
+
+@pytest.fixture(scope="module")
+def docker_search(
+		pynist_hits: List[Dict[str, Any]],
+		pynist_reference_data: Dict[str, Any],
+		) -> Iterator[docker_engine.Engine]:
+	"""
+	A :class:`pyms_nist_search.docker_engine.Engine` which communicates with a :class:`~.MockSearchServer`.
+	"""
+
+	hit_list = [SearchResult.from_pynist(hit) for hit in pynist_hits]
+	ref_data = ReferenceData.from_pynist(pynist_reference_data)
+
+	responses = {
+			"/info/features": sdjson.dumps(["loc_many"]),
+			"/search/spectrum/": sdjson.dumps(hit_list),
+			"/search/quick/": sdjson.dumps(hit_list),
+			"/search/spectrum_with_ref_data/": sdjson.dumps([(hit, ref_data) for hit in hit_list]),
+			"/search/loc_many/": sdjson.dumps([ref_data] * len(hit_list)),
+			}
+	responses.update({f"/search/loc/{hit.spec_loc}": sdjson.dumps(ref_data) for hit in hit_list})
+
+	try:
+		server = MockSearchServer(responses)
+	except OSError:
+		pytest.skip("Port 5001 is in use, so the mock search server cannot be started.")
+
+	# Skip __init__, which would start the Docker container
+	engine = docker_engine.Engine.__new__(docker_engine.Engine)
+	engine.initialised = True
+	engine._server_features = None
+
+	with server:
+		yield engine
+
+
+@pytest.fixture(scope="session")
+def hit_list_json(hit_list: List[SearchResult]) -> str:
+	return sdjson.dumps(hit_list)
+
+
+def write_jcamp_file(filename: PathPlus, rng: random.Random, idx: int) -> None:
+	"""
+	Write a synthetic JCAMP-DX file in the NIST WebBook format.
+
+	:param filename:
+	:param rng:
+	:param idx: The index of the compound.
+	"""
+
+	mass_spec = make_mass_spec(rng)
+	peaks = [f"{mz},{int(intensity)}" for mz, intensity in zip(mass_spec.mass_list, mass_spec.intensity_list)]
+
+	lines = [
+			f"##TITLE=Compound {idx}",
+			"##JCAMP-DX=4.24",
+			"##DATA TYPE=MASS SPECTRUM",
+			"##ORIGIN=Synthetic",
+			"##OWNER=NIST Mass Spectrometry Data Center",
+			f"##CAS REGISTRY NO={idx}-00-0",
+			f"##$NIST MASS SPEC NO={100000 + idx}",
+			"##MOLFORM=C6 H6",
+			f"##MW={rng.randint(50, 600)}",
+			"##XUNITS=M/Z",
+			"##YUNITS=RELATIVE ABUNDANCE",
+			"##XFACTOR=1",
+			"##YFACTOR=1",
+			f"##NPOINTS={len(peaks)}",
+			"##PEAK TABLE=(XY..XY)",
+			]
+	lines.extend(' '.join(peaks[i:i + 5]) for i in range(0, len(peaks), 5))
+	lines.append("##END=")
+
+	filename.write_lines(lines)
+
+
+@pytest.fixture(scope="session")
+def jcamp_file(tmp_path_factory) -> PathPlus:
+	filename = PathPlus(tmp_path_factory.mktemp("jcamp")) / "000000-Mass.jdx"
+	write_jcamp_file(filename, random.Random(SEED), 0)
+	return filename
+
+
+@pytest.fixture(scope="session")
+def jcamp_dir(tmp_path_factory) -> PathPlus:
+	"""
+	A directory of :py:data:`NUM_SPECTRA` synthetic JCAMP-DX files.
+	"""
+
+	directory = PathPlus(tmp_path_factory.mktemp("jcamp_dir"))
+	rng = random.Random(SEED)
+
+	for idx in range(NUM_SPECTRA):
+		write_jcamp_file(directory / f"{idx:06d}-Mass.jdx", rng, idx)
+
+	return directory
+
+
+def make_mona_record(rng: random.Random, idx: int) -> Dict[str, Any]:
+	"""
+	Create a synthetic compound in the same format as the MoNA JSON export.
+
+	The metadata cycle through :py:data:`NUM_MONA_VARIANTS` variants found in the real export,
+	such as missing IDs, CAS numbers under either name, computed values listed before measured ones,
+	properties which are skipped or not recognised, and contributors taken from the submitter.
+
+	:param rng:
+	:param idx: The index of the compound.
+	"""
+
+	mass_spec = make_mass_spec(rng)
+	variant = idx % NUM_MONA_VARIANTS
+
+	record: Dict[str, Any] = {
+			"id": f"SYN{idx:06d}",
+			"compound": [{"names": [{"name": f"Compound {idx}"}, {"name": f"Synonym {idx}"}]}],
+			"submitter": {"institution": "Synthetic Institute"},
+			"spectrum": ' '.join(
+					f"{mz}.0:{intensity / 99.99:.6f}"
+					for mz, intensity in zip(mass_spec.mass_list, mass_spec.intensity_list)
+					),
+			}
+
+	if variant == 0:
+		compound_metadata = [
+				{"name": "molecular formula", "value": "C6H6", "computed": False},
+				{"name": "total exact mass", "value": 78.04695, "computed": True},
+				{"name": "SMILES", "value": "c1ccccc1", "computed": True},
+				{"name": "cas", "value": "71-43-2", "computed": False},
+				]
+		metadata = [
+				{"name": "accession", "value": f"ACC{idx:06d}", "computed": False},
+				{"name": "author", "value": "Synthetic", "computed": False},
+				{"name": "license", "value": "CC BY", "computed": False},
+				{"name": "instrument", "value": "GC-MS", "computed": False},
+				{"name": "ionization energy", "value": "70 eV", "computed": False},
+				{"name": "mass accuracy", "value": 1.5, "category": "mass spectrometry", "computed": True},
+				{"name": "retention index", "value": 1234, "computed": False},
+				]
+	elif variant == 1:
+		# No ID or author, and the CAS number under its longer name.
+		del record["id"]
+		compound_metadata = [
+				{"name": "Molecular Formula", "value": "C7H8", "computed": False},
+				{"name": "CAS Number", "value": "108-88-3", "computed": False},
+				{"name": "InChIKey", "value": "YXFVVABEGXRONW-UHFFFAOYSA-N", "computed": True},
+				]
+		metadata = [
+				{"name": "license", "value": "CC0", "computed": False},
+				{"name": "data format", "value": "mzML", "computed": False},
+				]
+	elif variant == 2:
+		# Computed values listed first, and the mass from the spectrum's metadata.
+		compound_metadata = [
+				{"name": "molecular formula", "value": "C8H10", "computed": True},
+				{"name": "molecular formula", "value": "C8H10O", "computed": False},
+				{"name": "cas", "value": '', "computed": False},
+				{"name": "cas", "value": "100-41-4", "computed": True},
+				]
+		metadata = [
+				{"name": "exact mass", "value": 106.07825, "computed": True},
+				{"name": "accurate mass", "value": 106.1, "computed": False},
+				{"name": "Author", "value": "Synthetic Author", "computed": False},
+				{"name": "accession", "value": f"ACC{idx:06d}", "computed": False},
+				]
+	elif variant == 3:
+		# Properties which are not recognised, including in a skipped category.
+		compound_metadata = [
+				{"name": "compound class", "value": "Aromatic", "computed": False},
+				{"name": "melting point", "value": "5.5 C", "computed": False},
+				{"name": "total exact mass", "value": 128.0626, "computed": True},
+				]
+		metadata = [
+				{"name": "column", "value": "DB-5", "computed": False},
+				{"name": "splash", "value": "splash10-0000", "computed": True},
+				{"name": "precursor m/z", "value": 129.0, "category": "Focused Ion", "computed": False},
+				{"name": "ion type", "value": "[M]+", "computed": False},
+				]
+	elif variant == 4:
+		# Accurate mass only, and no submitter institution.
+		record["submitter"] = {"firstName": "Synthetic", "lastName": "Submitter"}
+		compound_metadata = [
+				{"name": "molecular formula", "value": "C10H8", "computed": False},
+				]
+		metadata = [
+				{"name": "accurate mass", "value": 128.0626, "computed": False},
+				{"name": "formula", "value": "C10H8", "computed": False},
+				{"name": "institution", "value": "Synthetic University", "computed": False},
+				]
+	else:
+		# No metadata at all.
+		record["submitter"] = {}
+		compound_metadata = []
+		metadata = []
+
+	record["compound"][0]["metaData"] = compound_metadata
+	record["metaData"] = metadata
+
+	return record
+
+
+@pytest.fixture(scope="session")
+def mona_record() -> Dict[str, Any]:
+	"""
+	A synthetic compound in the same format as the MoNA JSON export.
+	"""
+
+	return make_mona_record(random.Random(SEED), 0)
+
+
+@pytest.fixture(scope="session")
+def mona_records() -> List[Dict[str, Any]]:
+	"""
+	:py:data:`NUM_RECORDS` synthetic compounds in the same format as the MoNA JSON export,
+	covering each of the variants produced by :func:`~.make_mona_record`.
+	"""
+
+	rng = random.Random(SEED)
+	return [make_mona_record(rng, idx) for idx in range(NUM_RECORDS)]
+
+
+@pytest.fixture(scope="session")
+def mona_reference_data(mona_records: List[Dict[str, Any]]) -> List[ReferenceData]:
+	return [ReferenceData.from_mona_dict(record) for record in mona_records]
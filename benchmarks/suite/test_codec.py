@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+#
+#  test_codec.py
+"""
+Benchmarks for converting search results and reference data between the forms used by the C extension,
+the search server and Python.
+"""
+#
+#  This file is part of PyMassSpec NIST Search
+#  Python interface to the NIST MS Search DLL
+#
+#  Copyright (c) 2020-2026 Dominic Davis-Foster <dominic@davis-foster.co.uk>
+#
+#  PyMassSpec NIST Search is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as
+#  published by the Free Software Foundation; either version 3 of
+#  the License, or (at your option) any later version.
+#
+#  PyMassSpec NIST Search is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public
+#  License along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+
+# stdlib
+from typing import Any, Dict, List
+
+# 3rd party
+import sdjson
+from pyms.Spectrum import MassSpectrum
+
+# this package
+from pyms_nist_search import ReferenceData, SearchResult
+from pyms_nist_search.docker_engine import hit_list_from_json, hit_list_with_ref_data_from_json
+from pyms_nist_search.utils import pack, parse_name_chars
+
+
+def test_pack(benchmark, mass_spec: MassSpectrum):
+	packed = benchmark(pack, mass_spec, len(mass_spec))
+	assert packed.count('*') == len(mass_spec)
+
+
+def test_parse_name_chars(benchmark, pynist_hits: List[Dict[str, Any]]):
+	name_chars = pynist_hits[0]["hit_name_chars"]
+	name = benchmark(parse_name_chars, name_chars)
+	assert name.startswith("Compound 0")
+
+
+def test_search_result_from_pynist(benchmark, pynist_hits: List[Dict[str, Any]]):
+	hit_list = benchmark(lambda: [SearchResult.from_pynist(hit) for hit in pynist_hits])
+	assert len(hit_list) == len(pynist_hits)
+
+
+def test_reference_data_from_pynist(benchmark, pynist_reference_data: Dict[str, Any]):
+	ref_data = benchmark(ReferenceData.from_pynist, pynist_reference_data)
+	assert ref_data.name == "Compound 0"
+
+
+def test_hit_list_to_json(benchmark, hit_list: List[SearchResult]):
+	benchmark(sdjson.dumps, hit_list)
+
+
+def test_hit_list_from_json(benchmark, hit_list: List[SearchResult], hit_list_json: str):
+	assert benchmark(hit_list_from_json, hit_list_json) == hit_list
+
+
+def test_hit_list_with_ref_data_from_json(
+		benchmark,
+		hit_list: List[SearchResult],
+		reference_data: ReferenceData,
+		):
+	json_data = sdjson.dumps([(hit, reference_data) for hit in hit_list])
+	assert len(benchmark(hit_list_with_ref_data_from_json, json_data)) == len(hit_list)
+
+
+def test_reference_data_to_json(benchmark, reference_data: ReferenceData):
+	assert ReferenceData.from_json(benchmark(reference_data.to_json)) == reference_data
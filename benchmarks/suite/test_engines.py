@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+#
+#  test_engines.py
+"""
+Benchmarks for the overhead of the search engines, excluding the library search itself.
+
+The Windows engine is backed by a mock C extension, and the Docker engine by a mock search server,
+so these measure the encoding, transport and decoding around each search.
+"""
+#
+#  This file is part of PyMassSpec NIST Search
+#  Python interface to the NIST MS Search DLL
+#
+#  Copyright (c) 2020-2026 Dominic Davis-Foster <dominic@davis-foster.co.uk>
+#
+#  PyMassSpec NIST Search is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as
+#  published by the Free Software Foundation; either version 3 of
+#  the License, or (at your option) any later version.
+#
+#  PyMassSpec NIST Search is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public
+#  License along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+
+# stdlib
+from typing import List
+
+# 3rd party
+from pyms.Spectrum import MassSpectrum
+
+# this package
+from pyms_nist_search import docker_engine, win_engine
+
+# this package
+from .conftest import NUM_HITS
+
+
+def test_win_full_spectrum_search(benchmark, win_search: win_engine.Engine, mass_spec: MassSpectrum):
+	assert len(benchmark(win_search.full_spectrum_search, mass_spec, NUM_HITS)) == NUM_HITS
+
+
+def test_win_full_spectrum_search_many(
+		benchmark,
+		win_search: win_engine.Engine,
+		spectra: List[MassSpectrum],
+		):
+	hit_lists = benchmark(win_search.full_spectrum_search_many, spectra, NUM_HITS)
+	assert len(hit_lists) == len(spectra)
+	assert len(hit_lists[0]) == NUM_HITS
+
+
+def test_win_full_search_with_ref_data(benchmark, win_search: win_engine.Engine, mass_spec: MassSpectrum):
+	hits = benchmark(win_search.full_search_with_ref_data, mass_spec, NUM_HITS, prefetch=NUM_HITS)
+	assert len(hits) == NUM_HITS
+
+
+def test_win_full_spectrum_search_metrics(benchmark, win_search: win_engine.Engine, mass_spec: MassSpectrum):
+	win_search.metrics.enable()
+
+	try:
+		assert len(benchmark(win_search.full_spectrum_search, mass_spec, NUM_HITS)) == NUM_HITS
+	finally:
+		win_search.metrics.disable()
+		win_search.metrics.reset()
+
+
+def test_docker_full_spectrum_search(
+		benchmark,
+		docker_search: docker_engine.Engine,
+		mass_spec: MassSpectrum,
+		):
+	assert len(benchmark(docker_search.full_spectrum_search, mass_spec, NUM_HITS)) == NUM_HITS
+
+
+def test_docker_full_search_with_ref_data(
+		benchmark,
+		docker_search: docker_engine.Engine,
+		mass_spec: MassSpectrum,
+		):
+	hits = benchmark(docker_search.full_search_with_ref_data, mass_spec, NUM_HITS, prefetch=NUM_HITS)
+	assert len(hits) == NUM_HITS
+
+
+def test_docker_get_reference_data_many(benchmark, docker_search: docker_engine.Engine):
+	spec_locs = list(range(NUM_HITS))
+	assert len(benchmark(docker_search.get_reference_data_many, spec_locs)) == NUM_HITS
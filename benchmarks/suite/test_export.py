@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+#
+#  test_export.py
+"""
+Benchmarks for exporting reference data, and for importing it from JCAMP-DX files and the MoNA library.
+"""
+#
+#  This file is part of PyMassSpec NIST Search
+#  Python interface to the NIST MS Search DLL
+#
+#  Copyright (c) 2020-2026 Dominic Davis-Foster <dominic@davis-foster.co.uk>
+#
+#  PyMassSpec NIST Search is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as
+#  published by the Free Software Foundation; either version 3 of
+#  the License, or (at your option) any later version.
+#
+#  PyMassSpec NIST Search is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public
+#  License along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+
+# stdlib
+import io
+from typing import Any, Dict, List
+
+# 3rd party
+import pytest
+from domdf_python_tools.paths import PathPlus
+
+# this package
+from MoNA_GCMS_Library.parse_mona_json import convert_mona_parallel
+from pyms_nist_search import ReferenceData
+from pyms_nist_search.jcamp import load_jcamp_dir, read_jcamp
+from pyms_nist_search.mona_tools import MetadataDiagnostics, mass_spec_from_mona, parse_metadata
+from pyms_nist_search.msp import write_msp
+
+# this package
+from .conftest import NUM_MONA_VARIANTS, NUM_SPECTRA
+
+#: The number of records written in the MSP export benchmark.
+NUM_RECORDS = 100
+
+#: The number of MoNA records converted in the parallel conversion benchmark.
+NUM_MONA_RECORDS = 2000
+
+#: The output of the original implementation of :func:`~pyms_nist_search.mona_tools.parse_metadata`
+#: for each variant of the synthetic MoNA records.
+BASELINE_METADATA: List[Dict[str, Any]] = [
+		{
+				"formula": "C6H6",
+				"mw": 78.04695,
+				"exact_mass": 78.04695,
+				"cas": "71-43-2",
+				"contributor": "Synthetic",
+				"license": "CC BY",
+				"id": "SYN000000",
+				},
+		{
+				"formula": "C7H8",
+				"mw": 0.0,
+				"exact_mass": 0.0,
+				"cas": "108-88-3",
+				"contributor": "Synthetic Institute",
+				"license": "CC0",
+				"id": '',
+				},
+		{
+				"formula": "C8H10",
+				"mw": 106.07825,
+				"exact_mass": 106.07825,
+				"cas": "100-41-4",
+				"contributor": "Synthetic Author",
+				"license": '',
+				"id": "SYN000002",
+				},
+		{
+				"formula": '',
+				"mw": 128.0626,
+				"exact_mass": 128.0626,
+				"cas": '',
+				"contributor": "Synthetic Institute",
+				"license": '',
+				"id": "SYN000003",
+				},
+		{
+				"formula": "C10H8",
+				"mw": 128.0626,
+				"exact_mass": 128.0626,
+				"cas": '',
+				"contributor": '',
+				"license": '',
+				"id": "SYN000004",
+				},
+		{
+				"formula": '',
+				"mw": 0.0,
+				"exact_mass": 0.0,
+				"cas": '',
+				"contributor": '',
+				"license": '',
+				"id": "SYN000005",
+				},
+		]
+
+
+def test_to_msp(benchmark, reference_data: ReferenceData):
+	assert benchmark(reference_data.to_msp).startswith("Name: Compound 0")
+
+
+def test_write_msp(benchmark, reference_data: ReferenceData):
+
+	def export() -> int:
+		return write_msp([reference_data] * NUM_RECORDS, io.StringIO())
+
+	assert benchmark(export) == NUM_RECORDS
+
+
+def test_to_msp_mona(benchmark, mona_reference_data: List[ReferenceData]):
+
+	def export() -> str:
+		return ''.join(f"{ref_data.to_msp()}\n\n" for ref_data in mona_reference_data)
+
+	assert benchmark(export).startswith("Name: Compound 0")
+
+
+def test_write_msp_mona(benchmark, mona_reference_data: List[ReferenceData]):
+	expected = ''.join(f"{ref_data.to_msp()}\n\n" for ref_data in mona_reference_data)
+
+	def export() -> str:
+		fp = io.StringIO()
+		write_msp(mona_reference_data, fp)
+		return fp.getvalue()
+
+	# The output must be byte-identical to that of ReferenceData.to_msp()
+	assert benchmark(export) == expected
+
+
+def test_from_jcamp(benchmark, jcamp_file: PathPlus):
+	assert benchmark(ReferenceData.from_jcamp, jcamp_file).name == "Compound 0"
+
+
+def test_read_jcamp(benchmark, jcamp_file: PathPlus):
+	assert benchmark(read_jcamp, jcamp_file).name == "Compound 0"
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_load_jcamp_dir(benchmark, jcamp_dir: PathPlus, workers: int):
+	assert len(benchmark(lambda: list(load_jcamp_dir(jcamp_dir, workers=workers)))) == NUM_SPECTRA
+
+
+def test_mass_spec_from_mona(benchmark, mona_record: Dict[str, Any]):
+	mass_spec = benchmark(mass_spec_from_mona, mona_record["spectrum"])
+	assert len(mass_spec) == mona_record["spectrum"].count(':')
+
+
+def test_parse_metadata(benchmark, mona_record: Dict[str, Any]):
+	assert benchmark(parse_metadata, mona_record)["cas"] == "71-43-2"
+
+
+def test_parse_metadata_baseline(mona_records: List[Dict[str, Any]]):
+	diagnostics = MetadataDiagnostics()
+	results = [parse_metadata(record, diagnostics) for record in mona_records[:NUM_MONA_VARIANTS]]
+	assert results == BASELINE_METADATA
+
+	# The original implementation printed each of these properties.
+	assert dict(diagnostics.unknown_properties) == {("compound", "melting point"): 1, ("spectrum", "splash"): 1}
+
+
+def test_parse_metadata_many(benchmark, mona_records: List[Dict[str, Any]]):
+	results = benchmark(lambda: [parse_metadata(record) for record in mona_records])
+	assert len(results) == len(mona_records)
+
+	for idx, properties in enumerate(results):
+		expected = BASELINE_METADATA[idx % NUM_MONA_VARIANTS]
+		assert properties == {**expected, "id": expected["id"] and f"SYN{idx:06d}"}
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_convert_mona_parallel(benchmark, mona_record: Dict[str, Any], processes: int):
+	mona_data = [mona_record] * NUM_MONA_RECORDS
+
+	def convert() -> int:
+		return convert_mona_parallel(mona_data, io.StringIO(), processes=processes)
+
+	assert benchmark(convert) == NUM_MONA_RECORDS
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+#
+#  test_library.py
+"""
+Benchmarks for reading spectral libraries from MSP files and the compiled binary format.
+"""
+#
+#  This file is part of PyMassSpec NIST Search
+#  Python interface to the NIST MS Search DLL
+#
+#  Copyright (c) 2020-2026 Dominic Davis-Foster <dominic@davis-foster.co.uk>
+#
+#  PyMassSpec NIST Search is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as
+#  published by the Free Software Foundation; either version 3 of
+#  the License, or (at your option) any later version.
+#
+#  PyMassSpec NIST Search is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public
+#  License along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+
+# 3rd party
+import pytest
+from domdf_python_tools.paths import PathPlus
+
+# this package
+from pyms_nist_search.compiled_library import CompiledLibrary, compile_msp
+from pyms_nist_search.msp import iter_msp
+
+# this package
+from .conftest import NUM_RECORDS
+
+
+@pytest.mark.parametrize("use_mmap", [False, True])
+def test_iter_msp(benchmark, msp_file: PathPlus, use_mmap: bool):
+	assert benchmark(lambda: sum(1 for _ in iter_msp(msp_file, use_mmap=use_mmap))) == NUM_RECORDS
+
+
+def test_iter_msp_metadata(benchmark, msp_file: PathPlus):
+	assert benchmark(lambda: sum(1 for _ in iter_msp(msp_file, spectra=False))) == NUM_RECORDS
+
+
+def test_iter_msp_names(benchmark, msp_file: PathPlus):
+	assert benchmark(lambda: sum(1 for _ in iter_msp(msp_file, fields=["name"], spectra=False))) == NUM_RECORDS
+
+
+def test_compile_msp(benchmark, msp_file: PathPlus, tmp_path):
+	assert benchmark(compile_msp, msp_file, PathPlus(tmp_path) / "library.pynistlib") == NUM_RECORDS
+
+
+def test_compiled_library_open(benchmark, compiled_library_file: PathPlus):
+
+	def load_record() -> str:
+		with CompiledLibrary(compiled_library_file) as library:
+			return library[NUM_RECORDS // 2].name
+
+	assert benchmark(load_record) == f"Compound {NUM_RECORDS // 2}"
+
+
+def test_compiled_library_iter(benchmark, compiled_library_file: PathPlus):
+	with CompiledLibrary(compiled_library_file) as library:
+		assert benchmark(lambda: sum(1 for _ in library)) == NUM_RECORDS
+
+
+def test_compiled_library_get_spectrum(benchmark, compiled_library_file: PathPlus):
+	with CompiledLibrary(compiled_library_file) as library:
+		assert benchmark(lambda: [library.get_spectrum(idx) for idx in range(len(library))])[0] is not None
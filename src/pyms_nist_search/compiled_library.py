@@ -0,0 +1,445 @@
+#!/usr/bin/env python
+#
+#  compiled_library.py
+"""
+A compact binary format for libraries of :class:`~.ReferenceData`, which can be loaded without parsing.
+
+The file is memory-mapped when opened, so opening a library takes constant time regardless of its size,
+and the mass spectra can be accessed as zero-copy :class:`numpy.ndarray` views.
+
+The file consists of a fixed-size header followed by these sections, each aligned to 8 bytes:
+
+* a table of fixed-size numeric fields (NIST number, molecular weight, exact mass, library index and flags)
+  with one row per record;
+* the offsets of each record's peaks in the peak arrays (``uint64``, one more than the number of records);
+* the m/z values of all peaks (``float32``);
+* the intensities of all peaks (``float32``);
+* the offsets of each string in the string table (``uint64``);
+* the string table, containing the UTF-8 encoded name, CAS number, ID, formula, contributor and synonyms
+  of each record. The synonyms are separated by newlines.
+
+All values are little-endian.
+
+Spectra are stored in single precision, which represents integer m/z values and intensities below
+:math:`2^{24}` exactly.
+
+.. versionadded:: 0.9.0
+"""
+#
+#  This file is part of PyMassSpec NIST Search
+#  Python interface to the NIST MS Search DLL
+#
+#  Copyright (c) 2020-2021 Dominic Davis-Foster <dominic@davis-foster.co.uk>
+#
+#  PyMassSpec NIST Search is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as
+#  published by the Free Software Foundation; either version 3 of
+#  the License, or (at your option) any later version.
+#
+#  PyMassSpec NIST Search is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public
+#  License along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+#  PyMassSpec NIST Search includes the redistributable binaries for NIST MS Search in
+#  the x86 and x64 directories. Available from
+#  ftp://chemdata.nist.gov/mass-spc/v1_7/NISTDLL3.zip .
+#  ctnt66.dll and ctnt66_64.dll copyright 1984-1996 FairCom Corporation.
+#  "FairCom" and "c-tree Plus" are trademarks of FairCom Corporation
+#  and are registered in the United States and other countries.
+#  All Rights Reserved.
+
+
+# stdlib
+import array
+import mmap
+import struct
+import sys
+import tempfile
+from typing import IO, Iterable, Iterator, List, Optional, Tuple, Union, overload
+
+# 3rd party
+import numpy
+from domdf_python_tools.paths import PathPlus
+from domdf_python_tools.typing import PathLike
+from pyms.Spectrum import MassSpectrum
+
+# this package
+from pyms_nist_search.jcamp import load_jcamp_dir
+from pyms_nist_search.mona_tools import iter_mona_json
+from pyms_nist_search.msp import iter_msp
+from pyms_nist_search.reference_data import ReferenceData
+
+__all__ = (
+		"CompiledLibrary",
+		"write_compiled_library",
+		"compile_msp",
+		"compile_jcamp_dir",
+		"compile_mona_json",
+		)
+
+_MAGIC = b"PYNISTLB"
+_VERSION = 1
+
+# magic, version, number of string fields, number of records, number of peaks,
+# and the offsets of the sections from the start of the file.
+_header = struct.Struct("<8sIIQQQQQQQQ")
+
+_string_fields = ("name", "cas", "id", "formula", "contributor", "synonyms")
+
+_record_dtype = numpy.dtype([
+		("nist_no", "<i8"),
+		("mw", "<i8"),
+		("exact_mass", "<f8"),
+		("lib_idx", "<i4"),
+		("flags", "<u4"),
+		])
+
+# Set in the flags field if the record has a mass spectrum.
+_HAS_SPECTRUM = 1
+
+# The size of the chunks sections are copied into the library file in.
+_COPY_CHUNK_SIZE = 1 << 20
+
+
+def _padding(offset: int) -> bytes:
+	return b"\0" * (-offset % 8)
+
+
+class _SectionWriter:
+	"""
+	Writes a section of the file to a temporary file, so records can be written in a single pass.
+	"""
+
+	def __init__(self) -> None:
+		self.fp: IO[bytes] = tempfile.TemporaryFile()  # pylint: disable=consider-using-with
+		self.size = 0
+
+	def write(self, data: Union[bytes, array.array]) -> None:
+		self.size += self.fp.write(data)
+
+	def copy_to(self, fp: IO[bytes]) -> None:
+		self.fp.seek(0)
+
+		for chunk in iter(lambda: self.fp.read(_COPY_CHUNK_SIZE), b''):
+			fp.write(chunk)
+
+		self.fp.close()
+
+
+def write_compiled_library(records: Iterable[ReferenceData], filename: PathLike) -> int:
+	"""
+	Write :class:`~.ReferenceData` records to a compiled library file.
+
+	The records are written in a single pass, so ``records`` may be a generator.
+	Only the offset tables are held in memory.
+
+	:param records:
+	:param filename: The file to write the library to.
+
+	:return: The number of records written.
+	"""
+
+	numeric_rows = _SectionWriter()
+	mz_values = _SectionWriter()
+	intensity_values = _SectionWriter()
+	strings = _SectionWriter()
+	peak_offsets = array.array('Q', [0])
+	string_offsets = array.array('Q', [0])
+
+	num_records = 0
+	num_peaks = 0
+	row = numpy.zeros(1, dtype=_record_dtype)
+
+	for ref_data in records:
+		mass_spec = ref_data._mass_spec  # Avoid copying the spectrum
+
+		row["nist_no"] = ref_data.nist_no
+		row["mw"] = ref_data.mw
+		row["exact_mass"] = ref_data.exact_mass
+		row["lib_idx"] = ref_data.lib_idx
+
+		if mass_spec is None:
+			row["flags"] = 0
+		else:
+			row["flags"] = _HAS_SPECTRUM
+			mz_values.write(numpy.asarray(mass_spec.mass_list, dtype="<f4").tobytes())
+			intensity_values.write(numpy.asarray(mass_spec.intensity_list, dtype="<f4").tobytes())
+			num_peaks += len(mass_spec.mass_list)
+
+		numeric_rows.write(row.tobytes())
+		peak_offsets.append(num_peaks)
+
+		for value in (
+				ref_data.name,
+				ref_data.cas,
+				ref_data.id,
+				ref_data.formula,
+				ref_data.contributor,
+				'\n'.join(ref_data._synonyms),
+				):
+			strings.write(value.encode("UTF-8"))
+			string_offsets.append(strings.size)
+
+		num_records += 1
+
+	if sys.byteorder != "little":  # pragma: no cover
+		peak_offsets.byteswap()
+		string_offsets.byteswap()
+
+	with open(filename, "wb") as fp:
+		offset = _header.size + len(_padding(_header.size))
+		section_offsets = []
+
+		for size in (
+				numeric_rows.size,
+				len(peak_offsets) * peak_offsets.itemsize,
+				mz_values.size,
+				intensity_values.size,
+				len(string_offsets) * string_offsets.itemsize,
+				strings.size,
+				):
+			section_offsets.append(offset)
+			offset += size + len(_padding(size))
+
+		fp.write(_header.pack(_MAGIC, _VERSION, len(_string_fields), num_records, num_peaks, *section_offsets))
+
+		sections: Tuple[Union[_SectionWriter, array.array], ...] = (
+				numeric_rows,
+				peak_offsets,
+				mz_values,
+				intensity_values,
+				string_offsets,
+				strings,
+				)
+
+		for section in sections:
+			fp.write(_padding(fp.tell()))
+
+			if isinstance(section, array.array):
+				section.tofile(fp)
+			else:
+				section.copy_to(fp)
+
+	return num_records
+
+
+class CompiledLibrary:
+	"""
+	A library of :class:`~.ReferenceData` records in a compiled library file.
+
+	The file is memory-mapped, so opening the library is fast regardless of its size,
+	and records are only decoded when they are accessed.
+
+	The library can be used as a context manager, which closes the file on exit.
+
+	:param filename: The compiled library file, created with :func:`~.write_compiled_library`.
+	"""
+
+	def __init__(self, filename: PathLike) -> None:
+		self.filename = PathPlus(filename)
+
+		with open(self.filename, "rb") as fp:
+			if not self.filename.stat().st_size:
+				raise ValueError(f"{self.filename} is not a compiled library.")
+			self._mmap = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+		if len(self._mmap) < _header.size:
+			self._mmap.close()
+			raise ValueError(f"{self.filename} is not a compiled library.")
+
+		(
+				magic,
+				version,
+				num_string_fields,
+				num_records,
+				num_peaks,
+				records_offset,
+				peak_offsets_offset,
+				mz_offset,
+				intensity_offset,
+				string_offsets_offset,
+				strings_offset,
+				) = _header.unpack_from(self._mmap)
+
+		if magic != _MAGIC:
+			self._mmap.close()
+			raise ValueError(f"{self.filename} is not a compiled library.")
+
+		if version != _VERSION or num_string_fields != len(_string_fields):
+			self._mmap.close()
+			raise ValueError(f"Unsupported compiled library version {version}.")
+
+		buffer = self._mmap
+		self._records = numpy.frombuffer(buffer, _record_dtype, num_records, records_offset)
+		self._peak_offsets = numpy.frombuffer(buffer, "<u8", num_records + 1, peak_offsets_offset)
+		self._mz = numpy.frombuffer(buffer, "<f4", num_peaks, mz_offset)
+		self._intensities = numpy.frombuffer(buffer, "<f4", num_peaks, intensity_offset)
+		self._string_offsets = numpy.frombuffer(
+				buffer,
+				"<u8",
+				num_records * len(_string_fields) + 1,
+				string_offsets_offset,
+				)
+		self._strings_offset = strings_offset
+
+	def __len__(self) -> int:
+		return len(self._records)
+
+	def __repr__(self) -> str:
+		return f"<{self.__class__.__name__}({str(self.filename)!r}, {len(self)} records)>"
+
+	def _check_index(self, index: int) -> int:
+		num_records = len(self._records)
+
+		if index < 0:
+			index += num_records
+		if not 0 <= index < num_records:
+			raise IndexError("Record index out of range")
+
+		return index
+
+	def get_spectrum(self, index: int) -> Optional[Tuple[numpy.ndarray, numpy.ndarray]]:
+		"""
+		Returns the m/z values and intensities of the record at ``index``
+		as read-only ``float32`` views into the file, or :py:obj:`None` if it has no spectrum.
+
+		:param index:
+		"""  # noqa: D400
+
+		index = self._check_index(index)
+
+		if not self._records["flags"][index] & _HAS_SPECTRUM:
+			return None
+
+		start, end = self._peak_offsets[index:index + 2]
+		return self._mz[start:end], self._intensities[start:end]
+
+	def _get_strings(self, index: int) -> List[str]:
+		num_fields = len(_string_fields)
+		offsets = self._string_offsets[index * num_fields:(index + 1) * num_fields + 1].tolist()
+		base = self._strings_offset
+		data = self._mmap[base + offsets[0]:base + offsets[-1]]
+		start = offsets[0]
+
+		return [data[a - start:b - start].decode("UTF-8") for a, b in zip(offsets, offsets[1:])]
+
+	def get_name(self, index: int) -> str:
+		"""
+		Returns the name of the record at ``index``, without decoding the rest of the record.
+
+		:param index:
+		"""
+
+		index = self._check_index(index)
+		start, end = self._string_offsets[index * len(_string_fields):index * len(_string_fields) + 2].tolist()
+		return self._mmap[self._strings_offset + start:self._strings_offset + end].decode("UTF-8")
+
+	@overload
+	def __getitem__(self, index: int) -> ReferenceData: ...
+
+	@overload
+	def __getitem__(self, index: slice) -> List[ReferenceData]: ...
+
+	def __getitem__(self, index: Union[int, slice]) -> Union[ReferenceData, List[ReferenceData]]:
+		if isinstance(index, slice):
+			return [self[idx] for idx in range(*index.indices(len(self)))]
+
+		index = self._check_index(index)
+		name, cas, id_, formula, contributor, synonyms = self._get_strings(index)
+		nist_no, mw, exact_mass, lib_idx, _ = self._records[index].tolist()
+
+		ref_data = ReferenceData(
+				name=name,
+				cas=cas,
+				nist_no=nist_no,
+				id=id_,
+				mw=mw,
+				exact_mass=exact_mass,
+				formula=formula,
+				contributor=contributor,
+				synonyms=synonyms.split('\n') if synonyms else None,
+				lib_idx=lib_idx,
+				)
+
+		spectrum = self.get_spectrum(index)
+		if spectrum is not None:
+			mz, intensities = spectrum
+			# Set directly to avoid ReferenceData copying the spectrum.
+			ref_data._mass_spec = MassSpectrum(mz.astype(numpy.float64), intensities.astype(numpy.float64))
+
+		return ref_data
+
+	def __iter__(self) -> Iterator[ReferenceData]:
+		for index in range(len(self)):
+			yield self[index]
+
+	def close(self) -> None:
+		"""
+		Close the library file.
+
+		Any spectra obtained from :meth:`~.CompiledLibrary.get_spectrum` must not be used after the file is closed.
+		"""
+
+		del self._records, self._peak_offsets, self._mz, self._intensities, self._string_offsets
+
+		try:
+			self._mmap.close()
+		except BufferError:
+			# Views returned by get_spectrum() are still alive; the file is closed when they are garbage collected.
+			pass
+
+	def __enter__(self) -> "CompiledLibrary":
+		return self
+
+	def __exit__(self, exc_type, exc_val, exc_tb) -> None:  # noqa: MAN001
+		self.close()
+
+
+def compile_msp(msp_file: PathLike, filename: PathLike) -> int:
+	"""
+	Convert an MSP file into a compiled library.
+
+	:param msp_file: The MSP file to read.
+	:param filename: The file to write the library to.
+
+	:return: The number of records written.
+	"""
+
+	return write_compiled_library(iter_msp(msp_file), filename)
+
+
+def compile_jcamp_dir(path: PathLike, filename: PathLike, workers: Optional[int] = None) -> int:
+	"""
+	Convert a directory of JCAMP-DX files into a compiled library.
+
+	Files which cannot be read are skipped.
+
+	:param path: The directory containing the files.
+	:param filename: The file to write the library to.
+	:param workers: The number of worker processes to use to read the files.
+		See :func:`~.load_jcamp_dir` for details.
+
+	:return: The number of records written.
+	"""
+
+	return write_compiled_library(load_jcamp_dir(path, workers=workers), filename)
+
+
+def compile_mona_json(mona_file: PathLike, filename: PathLike) -> int:
+	"""
+	Convert a MoNA JSON export, or the zip file it is distributed in, into a compiled library.
+
+	:param mona_file: The MoNA JSON export.
+	:param filename: The file to write the library to.
+
+	:return: The number of records written.
+	"""
+
+	records = (ReferenceData.from_mona_dict(comp) for comp in iter_mona_json(mona_file))
+	return write_compiled_library(records, filename)
@@ -42,7 +42,8 @@ import json
 import os
 import pathlib
 import time
-from typing import Callable, List, Optional, Sequence, Tuple, Union
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
+from typing import Callable, Dict, FrozenSet, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
 
 # 3rd party
 import docker  # type: ignore[import-untyped]
@@ -53,8 +54,13 @@ from domdf_python_tools.typing import PathLike
 from pyms.Spectrum import MassSpectrum
 
 # this package
-from pyms_nist_search.reference_data import ReferenceData
+from pyms_nist_search.metrics import MetricsRegistry, registry
+from pyms_nist_search.msp import write_msp
+from pyms_nist_search.reference_data import LazyReferenceData, ReferenceData
+from pyms_nist_search.search_controls import SearchConstraints, SearchControls, _any_peak_query
 from pyms_nist_search.search_result import SearchResult
+from pyms_nist_search.search_stats import SearchStats
+from pyms_nist_search.utils import SpectrumLike, as_mass_spectrum
 
 # this package
 from . import _core  # type: ignore[attr-defined]
@@ -64,8 +70,28 @@ __all__ = [
 		"Engine",
 		"hit_list_from_json",
 		"hit_list_with_ref_data_from_json",
+		"SERVER_TIMEOUT_MARGIN",
+		"UnsupportedFeatureError",
 		]
 
+SERVER_TIMEOUT_MARGIN: float = 5.0
+"""
+The time in seconds, in addition to the ``timeout`` search control,
+to wait for the search server to respond before raising :exc:`TimeoutError`.
+
+This is also the time to wait when asking the search server which features it supports.
+
+.. versionadded:: 0.9.0
+"""
+
+
+class UnsupportedFeatureError(RuntimeError):
+	"""
+	Raised when the search server does not support a feature, as its docker image is too old.
+
+	.. versionadded:: 0.9.0
+	"""
+
 
 def require_init(func: Callable) -> Callable:
 	"""
@@ -127,6 +153,9 @@ class Engine:
 
 	initialised: bool = False
 
+	#: The :class:`~.MetricsRegistry` which calls to the search methods are recorded in. Disabled by default.
+	metrics: MetricsRegistry = registry
+
 	image_name: str = "domdfcoding/pywine-pyms-nist:latest"
 	"""
 	The name (and label) of the docker image to use.
@@ -144,6 +173,9 @@ class Engine:
 
 		self.debug: bool = bool(debug)
 
+		# The optional features supported by the search server. Determined when first needed.
+		self._server_features: Optional[FrozenSet[str]] = None
+
 		parsed_lib_paths, parsed_lib_types = self._parse_lib_paths_and_types(lib_path, lib_type)
 
 		# # Check if the server is already running
@@ -285,12 +317,26 @@ class Engine:
 			self.initialised = False
 
 	@require_init
-	def spectrum_search(self, mass_spec: MassSpectrum, n_hits: int = 5) -> List[SearchResult]:
+	@registry.instrument
+	def spectrum_search(
+			self,
+			mass_spec: MassSpectrum,
+			n_hits: int = 5,
+			controls: Optional[SearchControls] = None,
+			constraints: Optional[SearchConstraints] = None,
+			) -> List[SearchResult]:
 		"""
 		Perform a Quick Spectrum Search of the mass spectral library.
 
+		Unless overridden by ``controls``, every spectrum in the library is compared
+		with ``mass_spec`` using the Quick identity search (search mode ``'Q'``).
+
+		.. versionchanged:: 0.9.0  Added the ``controls`` and ``constraints`` arguments.
+
 		:param mass_spec: The mass spectrum to search against the library.
 		:param n_hits: The number of hits to return.
+		:param controls: Options controlling how the spectra are compared.
+		:param constraints: Constraints on the hits returned, which are applied during the library search.
 
 		:return: List of possible identities for the mass spectrum.
 		"""
@@ -298,25 +344,42 @@ class Engine:
 		if not isinstance(mass_spec, MassSpectrum):
 			raise TypeError("`mass_spec` must be a pyms.Spectrum.MassSpectrum object.")
 
+		with registry.phase("spectrum_search", "encode"):
+			params = _search_params(n_hits, controls, constraints)
+			spectrum_json = sdjson.dumps(mass_spec)
+
 		retry_count = 0
 
 		# Keep trying until it works
 		while retry_count < 240:
 			try:
-				res = requests.post(
-						f"http://localhost:5001/search/quick/?n_hits={n_hits}",
-						json=sdjson.dumps(mass_spec),
-						)
+				self._check_search_options(controls, constraints)
+
+				with registry.phase("spectrum_search", "transport"):
+					res = requests.post(
+							"http://localhost:5001/search/quick/",
+							params=params,
+							json=spectrum_json,
+							timeout=_request_timeout(controls),
+							)
+
+				_record_payload("spectrum_search", spectrum_json, res)
 				print(res.text)
-				return hit_list_from_json(res.text)
 
+				with registry.phase("spectrum_search", "decode"):
+					return hit_list_from_json(res.text)
+
+			except requests.exceptions.ReadTimeout:
+				raise TimeoutError("The search did not finish before the timeout") from None
 			except requests.exceptions.ConnectionError:
 				time.sleep(0.5)
 				retry_count += 1
+				registry.increment("spectrum_search", "retries")
 
 		raise TimeoutError("Unable to communicate with the search server.")
 
 	@staticmethod
+	@registry.instrument
 	def cas_search(cas: str) -> List[SearchResult]:
 		"""
 		Search for a compound by CAS number.
@@ -340,20 +403,157 @@ class Engine:
 			except requests.exceptions.ConnectionError:
 				time.sleep(0.5)
 				retry_count += 1
+				registry.increment("cas_search", "retries")
+
+		raise TimeoutError("Unable to communicate with the search server.")
+
+	@require_init
+	@registry.instrument
+	def name_search(self, name: str, lib_idx: Optional[int] = None) -> List[SearchResult]:
+		"""
+		Search for a compound by name, using the name index of the library.
+
+		Synonyms are searched as well as the primary name of each compound.
+		Names are compared ignoring case, spaces and punctuation,
+		and only the first 18 letters and digits are considered.
+
+		.. versionadded:: 0.9.0
+
+		:param name:
+		:param lib_idx: The (zero-based) index of the library to search
+			(see :meth:`~.get_lib_paths`). If :py:obj:`None` every library is searched in turn.
+
+		:return: List of compounds with the given name.
+		"""
+
+		if lib_idx is None:
+			lib_indices: Iterable[int] = range(len(self.get_lib_paths()))
+		else:
+			lib_indices = [lib_idx]
+
+		hit_list = []
+
+		for idx in lib_indices:
+			retry_count = 0
+
+			# Keep trying until it works
+			while retry_count < 240:
+				try:
+					self._require_server_feature("index_search", "index searches")
+					res = requests.post(f"http://localhost:5001/search/name/{idx}", params={"name": name})
+					res.raise_for_status()
+					hit_list.extend(hit_list_from_json(res.text))
+					break
+
+				except requests.exceptions.ConnectionError:
+					time.sleep(0.5)
+					retry_count += 1
+					registry.increment("name_search", "retries")
+
+			else:
+				raise TimeoutError("Unable to communicate with the search server.")
+
+		return hit_list
+
+	@require_init
+	@registry.instrument
+	def formula_search(self, formula: str) -> List[SearchResult]:
+		"""
+		Search for compounds by chemical formula, using the formula index of the library.
+
+		Elements may be given in any order. A semi-structural formula,
+		such as ``C6H3(CH3)2(C4H9)``, is converted to the net formula before searching.
+
+		.. versionadded:: 0.9.0
+
+		:param formula:
+
+		:return: List of compounds with the given formula.
+		"""
+
+		return self._index_search("formula", formula)
+
+	@require_init
+	@registry.instrument
+	def mw_search(self, mw: int) -> List[SearchResult]:
+		"""
+		Search for compounds by nominal molecular weight, using the molecular weight index of the library.
+
+		.. versionadded:: 0.9.0
+
+		:param mw:
+
+		:return: List of compounds with the given molecular weight.
+		"""
+
+		if mw < 0:
+			raise ValueError("`mw` cannot be negative.")
+
+		return self._index_search("mw", str(int(mw)))
+
+	@require_init
+	@registry.instrument
+	def nist_no_search(self, nist_no: int) -> List[SearchResult]:
+		"""
+		Search for a compound by NIST registry number.
+
+		.. note:: This requires the ``SPECNO.INU`` index, which is not present in all user libraries.
+
+		.. versionadded:: 0.9.0
+
+		:param nist_no:
+
+		:return: List of results for the NIST number (usually just one result).
+		"""
+
+		return self._index_search("nist_no", str(int(nist_no)))
+
+	def _index_search(self, index: str, query: str) -> List[SearchResult]:
+		"""
+		Search one of the library indices.
+
+		:param index: The name of the index to search.
+		:param query:
+		"""
+
+		retry_count = 0
+
+		# Keep trying until it works
+		while retry_count < 240:
+			try:
+				self._require_server_feature("index_search", "index searches")
+				res = requests.post(f"http://localhost:5001/search/{index}", params={"query": query})
+				res.raise_for_status()
+				return hit_list_from_json(res.text)
+
+			except requests.exceptions.ConnectionError:
+				time.sleep(0.5)
+				retry_count += 1
+				registry.increment("_index_search", "retries")
 
 		raise TimeoutError("Unable to communicate with the search server.")
 
 	@require_init
+	@registry.instrument
 	def full_spectrum_search(
 			self,
 			mass_spec: MassSpectrum,
 			n_hits: int = 5,
+			controls: Optional[SearchControls] = None,
+			constraints: Optional[SearchConstraints] = None,
 			) -> List[SearchResult]:
 		"""
 		Perform a Full Spectrum Search of the mass spectral library.
 
+		Unless overridden by ``controls``, the library is screened for candidate spectra
+		which are then compared with ``mass_spec`` using the Identity search (search mode ``'I'``).
+
+		.. versionchanged:: 0.9.0  Added the ``controls`` and ``constraints`` arguments.
+
 		:param mass_spec: The mass spectrum to search against the library.
 		:param n_hits: The number of hits to return.
+		:param controls: Options controlling how the spectra are compared.
+		:param constraints: Constraints on the hits returned, which are applied during the library search.
 
 		:return: List of possible identities for the mass spectrum.
 		"""
@@ -361,34 +561,242 @@ class Engine:
 		if not isinstance(mass_spec, MassSpectrum):
 			raise TypeError("`mass_spec` must be a pyms.Spectrum.MassSpectrum object.")
 
+		with registry.phase("full_spectrum_search", "encode"):
+			params = _search_params(n_hits, controls, constraints)
+			spectrum_json = sdjson.dumps(mass_spec)
+
+		retry_count = 0
+
+		# Keep trying until it works
+		while retry_count < 240:
+			try:
+				self._check_search_options(controls, constraints)
+
+				with registry.phase("full_spectrum_search", "transport"):
+					res = requests.post(
+							"http://localhost:5001/search/spectrum/",
+							params=params,
+							json=spectrum_json,
+							timeout=_request_timeout(controls),
+							)
+
+				_record_payload("full_spectrum_search", spectrum_json, res)
+
+				with registry.phase("full_spectrum_search", "decode"):
+					return hit_list_from_json(res.text)
+
+			except requests.exceptions.ReadTimeout:
+				raise TimeoutError("The search did not finish before the timeout") from None
+			except requests.exceptions.ConnectionError:
+				time.sleep(0.5)
+				retry_count += 1
+				registry.increment("full_spectrum_search", "retries")
+
+		raise TimeoutError("Unable to communicate with the search server.")
+
+	@require_init
+	@registry.instrument
+	def screen_search(self, mass_spec: MassSpectrum, controls: Optional[SearchControls] = None) -> List[int]:
+		"""
+		Screen the mass spectral library for spectra which may match ``mass_spec``, without comparing the spectra.
+
+		This is much faster than a full search, so can be used to decide which spectra are worth searching in full.
+
+		.. versionadded:: 0.9.0
+
+		:param mass_spec: The mass spectrum to search against the library.
+		:param controls: Options controlling the screen search.
+			The ``presearch`` option cannot be ``'off'``.
+
+		:return: The locations of the candidate spectra in the library.
+			These can be passed to :meth:`~.get_reference_data`.
+		"""
+
+		if not isinstance(mass_spec, MassSpectrum):
+			raise TypeError("`mass_spec` must be a pyms.Spectrum.MassSpectrum object.")
+
+		params = {} if controls is None else {"controls": controls.to_json()}
 		retry_count = 0
 
 		# Keep trying until it works
 		while retry_count < 240:
 			try:
+				self._require_server_feature("screen_search", "screen searches")
 				res = requests.post(
-						f"http://localhost:5001/search/spectrum/?n_hits={n_hits}",
+						"http://localhost:5001/search/screen/",
+						params=params,
 						json=sdjson.dumps(mass_spec),
+						timeout=_request_timeout(controls),
 						)
-				return hit_list_from_json(res.text)
+				res.raise_for_status()
+				return res.json()
 
+			except requests.exceptions.ReadTimeout:
+				raise TimeoutError("The search did not finish before the timeout") from None
 			except requests.exceptions.ConnectionError:
 				time.sleep(0.5)
 				retry_count += 1
+				registry.increment("screen_search", "retries")
 
 		raise TimeoutError("Unable to communicate with the search server.")
 
 	@require_init
+	@registry.instrument
+	def any_peak_search(self, peaks: Iterable[Tuple[int, int, int]], min_matches: Optional[int] = None) -> List[int]:
+		"""
+		Find the spectra in the mass spectral library which contain the given peaks.
+
+		The library's peak index is used rather than comparing spectra, so this is much faster than a spectrum search.
+
+		.. versionadded:: 0.9.0
+
+		:param peaks: The peaks to look for, as ``(<m/z>, <min abundance>, <max abundance>)`` tuples.
+			The abundances are percentages of the base peak, between 1 and 100. At most 10 peaks may be given.
+		:param min_matches: The minimum number of the peaks each spectrum must contain.
+			By default each spectrum must contain all of the peaks.
+
+		:return: The locations of the matching spectra in the library.
+			These can be passed to :meth:`~.get_reference_data`.
+		"""
+
+		checked_peaks, min_matches = _any_peak_query(peaks, min_matches)
+		retry_count = 0
+
+		# Keep trying until it works
+		while retry_count < 240:
+			try:
+				self._require_server_feature("any_peak_search", "peak searches")
+				res = requests.post(
+						"http://localhost:5001/search/any_peak/",
+						params={"min_matches": min_matches},
+						json=json.dumps(checked_peaks),
+						)
+				res.raise_for_status()
+				return res.json()
+
+			except requests.exceptions.ConnectionError:
+				time.sleep(0.5)
+				retry_count += 1
+				registry.increment("any_peak_search", "retries")
+
+		raise TimeoutError("Unable to communicate with the search server.")
+
+	@require_init
+	def iter_full_spectrum_search(
+			self,
+			spectra: Iterable[SpectrumLike],
+			n_hits: int = 5,
+			max_in_flight: int = 4,
+			controls: Optional[SearchControls] = None,
+			constraints: Optional[SearchConstraints] = None,
+			) -> Iterator[Tuple[int, List[SearchResult]]]:
+		"""
+		Perform a Full Spectrum Search of the mass spectral library for each spectrum in ``spectra``.
+
+		Results are yielded as ``(index, hits)`` tuples as each search finishes,
+		where ``index`` is the position of the spectrum in ``spectra``.
+		Results may therefore be yielded out of order.
+
+		At most ``max_in_flight`` searches are submitted to the search server at once,
+		and ``spectra`` is only consumed as results are yielded. This means memory usage
+		does not depend on the number of spectra, so ``spectra`` can be a lazy iterable
+		such as the scans of a :class:`pyms.GCMS.Class.GCMS_data` object.
+
+		.. versionadded:: 0.9.0
+
+		:param spectra: The mass spectra to search against the library.
+			May also contain :class:`pyms.Spectrum.Scan` and :class:`pyms.Peak.Class.Peak` objects.
+		:param n_hits: The number of hits to return for each spectrum.
+		:param max_in_flight: The maximum number of searches in progress at once.
+		:param controls: Options controlling how the spectra are compared.
+		:param constraints: Constraints on the hits returned, which are applied during the library search.
+		"""
+
+		if max_in_flight < 1:
+			raise ValueError("`max_in_flight` must be at least 1.")
+
+		in_flight: Dict[Future, int] = {}
+
+		with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+			try:
+				for idx, spectrum in enumerate(spectra):
+					if len(in_flight) >= max_in_flight:
+						# Wait for a search to finish before submitting another.
+						done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+						for future in done:
+							yield in_flight.pop(future), future.result()
+
+					future = executor.submit(
+							self.full_spectrum_search,
+							as_mass_spectrum(spectrum),
+							n_hits,
+							controls,
+							constraints,
+							)
+					in_flight[future] = idx
+
+				for future in as_completed(list(in_flight)):
+					yield in_flight.pop(future), future.result()
+
+			finally:
+				# The generator may have been closed early.
+				for future in in_flight:
+					future.cancel()
+
+	@require_init
+	@registry.instrument
+	def full_spectrum_search_many(
+			self,
+			spectra: Iterable[SpectrumLike],
+			n_hits: int = 5,
+			controls: Optional[SearchControls] = None,
+			constraints: Optional[SearchConstraints] = None,
+			) -> List[List[SearchResult]]:
+		"""
+		Perform a Full Spectrum Search of the mass spectral library for each spectrum in ``spectra``.
+
+		The searches are submitted to the search server concurrently with :meth:`~.iter_full_spectrum_search`.
+
+		.. versionadded:: 0.9.0
+
+		:param spectra: The mass spectra to search against the library.
+			May also contain :class:`pyms.Spectrum.Scan` and :class:`pyms.Peak.Class.Peak` objects.
+		:param n_hits: The number of hits to return for each spectrum.
+		:param controls: Options controlling how the spectra are compared.
+		:param constraints: Constraints on the hits returned, which are applied during the library search.
+
+		:return: The hits for each spectrum, in the same order as ``spectra``.
+		"""
+
+		results = dict(self.iter_full_spectrum_search(spectra, n_hits, controls=controls, constraints=constraints))
+		return [results[idx] for idx in range(len(results))]
+
+	@require_init
+	@registry.instrument
 	def full_search_with_ref_data(
 			self,
 			mass_spec: MassSpectrum,
 			n_hits: int = 5,
+			prefetch: Optional[int] = None,
+			controls: Optional[SearchControls] = None,
+			constraints: Optional[SearchConstraints] = None,
 			) -> List[Tuple[SearchResult, ReferenceData]]:
 		"""
 		Perform a Full Spectrum Search of the mass spectral library, including reference data.
 
+		By default the reference data for every hit is retrieved along with the hits, in a single request.
+		If ``prefetch`` is given, only the reference data for the top ``prefetch`` hits is retrieved immediately.
+		The reference data for the remaining hits is then only retrieved from the search server
+		when it is first accessed (see :class:`~.LazyReferenceData`), which must be before the engine is uninitialised.
+
+		.. versionchanged:: 0.9.0  Added the ``prefetch``, ``controls`` and ``constraints`` arguments.
+
 		:param mass_spec: The mass spectrum to search against the library.
 		:param n_hits: The number of hits to return.
+		:param prefetch: The number of hits to retrieve the reference data for immediately.
+			If :py:obj:`None`, or ``n_hits`` or greater, the reference data for all hits is retrieved.
+		:param controls: Options controlling how the spectra are compared.
+		:param constraints: Constraints on the hits returned, which are applied during the library search.
 
 		:return: List of tuples containing possible identities
 			for the mass spectrum, and the reference data.
@@ -399,23 +807,62 @@ class Engine:
 		if not isinstance(mass_spec, MassSpectrum):
 			raise TypeError("`mass_spec` must be a pyms.Spectrum.MassSpectrum object.")
 
+		if prefetch is not None and prefetch < 0:
+			raise ValueError("`prefetch` cannot be negative.")
+
+		if prefetch is not None and prefetch < n_hits:
+			hit_list = self.full_spectrum_search(mass_spec, n_hits, controls, constraints)
+
+			prefetched = self.get_reference_data_many([hit.spec_loc for hit in hit_list[:prefetch]])
+
+			output_buffer: List[Tuple[SearchResult, ReferenceData]] = []
+
+			for idx, hit in enumerate(hit_list):
+				if idx < prefetch:
+					ref_data = prefetched[idx]
+				else:
+					ref_data = LazyReferenceData(functools.partial(self.get_reference_data, hit.spec_loc))
+				output_buffer.append((hit, ref_data))
+
+			registry.increment("full_search_with_ref_data", "reference_data_prefetched", len(prefetched))
+			registry.increment("full_search_with_ref_data", "reference_data_deferred", len(hit_list) - len(prefetched))
+
+			return output_buffer
+
+		with registry.phase("full_search_with_ref_data", "encode"):
+			params = _search_params(n_hits, controls, constraints)
+			spectrum_json = sdjson.dumps(mass_spec)
+
 		retry_count = 0
 
 		# Keep trying until it works
 		while retry_count < 240:
 			try:
-				res = requests.post(
-						f"http://localhost:5001/search/spectrum_with_ref_data/?n_hits={n_hits}",
-						json=sdjson.dumps(mass_spec),
-						)
-				return hit_list_with_ref_data_from_json(res.text)
+				self._check_search_options(controls, constraints)
+
+				with registry.phase("full_search_with_ref_data", "transport"):
+					res = requests.post(
+							"http://localhost:5001/search/spectrum_with_ref_data/",
+							params=params,
+							json=spectrum_json,
+							timeout=_request_timeout(controls),
+							)
+
+				_record_payload("full_search_with_ref_data", spectrum_json, res)
+
+				with registry.phase("full_search_with_ref_data", "decode"):
+					return hit_list_with_ref_data_from_json(res.text)
+			except requests.exceptions.ReadTimeout:
+				raise TimeoutError("The search did not finish before the timeout") from None
 			except requests.exceptions.ConnectionError:
 				time.sleep(0.5)
 				retry_count += 1
+				registry.increment("full_search_with_ref_data", "retries")
 
 		raise TimeoutError("Unable to communicate with the search server.")
 
 	@require_init
+	@registry.instrument
 	def get_reference_data(self, spec_loc: int) -> ReferenceData:
 		"""
 		Get reference data from the library for the compound at the given location.
@@ -433,6 +880,150 @@ class Engine:
 
 			except requests.exceptions.ConnectionError:
 				time.sleep(0.5)
+				retry_count += 1
+				registry.increment("get_reference_data", "retries")
+
+		raise TimeoutError("Unable to communicate with the search server.")
+
+	@require_init
+	@registry.instrument
+	def get_reference_data_many(self, spec_locs: Iterable[int]) -> List[ReferenceData]:
+		"""
+		Get reference data from the library for the compounds at each of the given locations.
+
+		The reference data is retrieved from the search server in a single request,
+		or one request per location if the server does not support retrieving several at once.
+		Repeated locations are only retrieved once,
+		and the same :class:`~.ReferenceData` object is returned for each occurrence.
+
+		.. versionadded:: 0.9.0
+
+		:param spec_locs:
+
+		:return: The reference data for each location, in the same order as ``spec_locs``.
+
+		:raises requests.HTTPError: If the search server returns an error, for example for an invalid location.
+			Unlike connection errors, these are not retried.
+		"""
+
+		spec_locs = [int(spec_loc) for spec_loc in spec_locs]
+		unique_spec_locs = list(dict.fromkeys(spec_locs))
+
+		if not unique_spec_locs:
+			return []
+
+		retry_count = 0
+
+		# Keep trying until it works
+		while retry_count < 240:
+			try:
+				if "loc_many" in self._get_server_features():
+					res = requests.post(
+							"http://localhost:5001/search/loc_many/",
+							json=json.dumps(unique_spec_locs),
+							)
+					res.raise_for_status()
+					reference_data = {
+							spec_loc: ReferenceData(**ref_data)
+							for spec_loc, ref_data in zip(unique_spec_locs, json.loads(res.text))
+							}
+				else:
+					reference_data = {spec_loc: self.get_reference_data(spec_loc) for spec_loc in unique_spec_locs}
+
+				return [reference_data[spec_loc] for spec_loc in spec_locs]
+
+			except requests.exceptions.ConnectionError:
+				time.sleep(0.5)
+				retry_count += 1
+				registry.increment("get_reference_data_many", "retries")
+
+		raise TimeoutError("Unable to communicate with the search server.")
+
+	@require_init
+	def iter_library(self, lib_idx: Optional[int] = None, batch_size: int = 1000) -> Iterator[ReferenceData]:
+		"""
+		Iterate over every record in the library, in order of ID number.
+
+		The records are retrieved from the library in batches of ``batch_size``,
+		so only one batch is held in memory at a time.
+
+		.. versionadded:: 0.9.0
+
+		:param lib_idx: The (zero-based) index of the library to iterate over
+			(see :meth:`~.get_lib_paths`). If :py:obj:`None` every library is iterated over in turn.
+		:param batch_size: The number of records to retrieve at once.
+		"""
+
+		if batch_size < 1:
+			raise ValueError("`batch_size` must be at least 1.")
+
+		if lib_idx is None:
+			lib_indices: Iterable[int] = range(len(self.get_lib_paths()))
+		else:
+			lib_indices = [lib_idx]
+
+		for lib_idx in lib_indices:
+			first_id = 0
+
+			while True:
+				spec_locs = self._seq_id_search(lib_idx, first_id)
+				if not spec_locs:
+					break
+
+				for start in range(0, len(spec_locs), batch_size):
+					records = self.get_reference_data_many(spec_locs[start:start + batch_size])
+					yield from records
+
+				# Guard against looping forever if the library does not return the records in order.
+				next_id = int(records[-1].id) + 1
+				if next_id <= first_id:
+					raise ValueError(f"The records in library {lib_idx} are not in order of ID number.")
+				first_id = next_id
+
+	@require_init
+	def export_msp(self, filename: PathLike, lib_idx: Optional[int] = None) -> int:
+		"""
+		Export the library to an MSP file.
+
+		The records are written to the file as they are retrieved from the library,
+		so the whole library is never held in memory.
+
+		.. versionadded:: 0.9.0
+
+		:param filename: The file to write the library to.
+		:param lib_idx: The (zero-based) index of the library to export
+			(see :meth:`~.get_lib_paths`). If :py:obj:`None` every library is exported.
+
+		:return: The number of records written.
+		"""
+
+		with open(filename, 'w', encoding="UTF-8") as fp:
+			return write_msp(self.iter_library(lib_idx), fp)
+
+	def _seq_id_search(self, lib_idx: int, first_id: int) -> List[int]:
+		"""
+		Returns the locations of the next batch of spectra in the library with the given index.
+
+		The batch starts with the spectrum with the smallest ID number equal to or greater than ``first_id``.
+
+		:param lib_idx:
+		:param first_id:
+		"""
+
+		retry_count = 0
+
+		# Keep trying until it works
+		while retry_count < 240:
+			try:
+				self._require_server_feature("seq_id_search", "iterating over the library")
+				res = requests.post(f"http://localhost:5001/search/seq_id/{lib_idx}/{first_id}")
+				res.raise_for_status()
+				return res.json()
+
+			except requests.exceptions.ConnectionError:
+				time.sleep(0.5)
+				retry_count += 1
+				registry.increment("_seq_id_search", "retries")
 
 		raise TimeoutError("Unable to communicate with the search server.")
 
@@ -456,6 +1047,7 @@ class Engine:
 			except requests.exceptions.ConnectionError:
 				time.sleep(0.5)
 				retry_count += 1
+				registry.increment("get_lib_paths", "retries")
 
 		raise TimeoutError("Unable to communicate with the search server.")
 
@@ -479,9 +1071,148 @@ class Engine:
 			except requests.exceptions.ConnectionError:
 				time.sleep(0.5)
 				retry_count += 1
+				registry.increment("get_active_libs", "retries")
 
 		raise TimeoutError("Unable to communicate with the search server.")
 
+	@require_init
+	def get_search_stats(self) -> SearchStats:
+		"""
+		Returns statistics for the library searches made by the most recent spectrum search call.
+
+		These include the number of spectra which passed the pre-search and the time spent comparing spectra.
+
+		When searches are made concurrently (for example by :meth:`~.iter_full_spectrum_search`)
+		the statistics are for whichever search finished last.
+
+		.. versionadded:: 0.9.0
+		"""
+
+		retry_count = 0
+
+		# Keep trying until it works
+		while retry_count < 240:
+			try:
+				self._require_server_feature("search_stats", "search statistics")
+				res = requests.get("http://localhost:5001/info/search_stats")
+				res.raise_for_status()
+				return SearchStats.from_dict(res.json())
+			except requests.exceptions.ConnectionError:
+				time.sleep(0.5)
+				retry_count += 1
+				registry.increment("get_search_stats", "retries")
+
+		raise TimeoutError("Unable to communicate with the search server.")
+
+	def _check_search_options(
+			self,
+			controls: Optional[SearchControls],
+			constraints: Optional[SearchConstraints],
+			) -> None:
+		"""
+		Raise an error if the search server cannot honour the given ``controls`` or ``constraints``.
+
+		Search server images released before 0.9.0 ignore these options,
+		which would otherwise silently give the results of the default search.
+
+		:param controls:
+		:param constraints:
+		"""
+
+		if controls in (None, SearchControls()) and constraints in (None, SearchConstraints()):
+			return
+
+		self._require_server_feature("search_options", "search controls or constraints")
+
+	def _get_server_features(self) -> FrozenSet[str]:
+		"""
+		Returns the names of the optional features supported by the search server.
+
+		The search server is only asked the first time this is called.
+		Search server images released before 0.9.0 do not support any of the features.
+		"""
+
+		if self._server_features is None:
+			try:
+				res = requests.get("http://localhost:5001/info/features", timeout=SERVER_TIMEOUT_MARGIN)
+			except requests.exceptions.ReadTimeout:
+				raise TimeoutError("The search server did not respond.") from None
+
+			if res.status_code == 404:
+				self._server_features = frozenset()
+			else:
+				res.raise_for_status()
+				self._server_features = frozenset(res.json())
+
+		return self._server_features
+
+	def _require_server_feature(self, feature: str, description: str) -> None:
+		"""
+		Raise an :exc:`~.UnsupportedFeatureError` if the search server does not support the given feature.
+
+		:param feature: The name of the feature.
+		:param description: A description of the feature for the error message.
+		"""
+
+		if feature not in self._get_server_features():
+			raise UnsupportedFeatureError(
+					f"The search server does not support {description}. "
+					f"Please update the {self.image_name!r} docker image.",
+					)
+
+
+def _record_payload(method: str, request_json: str, response: requests.Response) -> None:
+	"""
+	Record the sizes of a search request and its response.
+
+	:param method: The name of the engine method.
+	:param request_json: The JSON sent in the body of the request.
+	:param response:
+	"""
+
+	if registry.enabled:
+		registry.increment(method, "request_bytes", len(request_json))
+		registry.increment(method, "response_bytes", len(response.content))
+
+
+def _request_timeout(controls: Optional[SearchControls]) -> Optional[float]:
+	"""
+	Returns the time to wait for the response to a spectrum search request.
+
+	This is the search's own timeout plus :py:data:`SERVER_TIMEOUT_MARGIN`, to allow for the time taken
+	to send the request and the response, or :py:obj:`None` to wait indefinitely if the search has no timeout.
+
+	:param controls:
+	"""
+
+	if controls is None or controls.timeout is None:
+		return None
+
+	return controls.timeout + SERVER_TIMEOUT_MARGIN
+
+
+def _search_params(
+		n_hits: int,
+		controls: Optional[SearchControls],
+		constraints: Optional[SearchConstraints],
+		) -> Dict[str, Union[int, str]]:
+	"""
+	Returns the query parameters for a spectrum search request.
+
+	:param n_hits:
+	:param controls:
+	:param constraints:
+	"""
+
+	params: Dict[str, Union[int, str]] = {"n_hits": n_hits}
+
+	if controls is not None:
+		params["controls"] = controls.to_json()
+	if constraints is not None:
+		params["constraints"] = constraints.to_json()
+
+	return params
+
 
 def hit_list_from_json(json_data: str) -> List[SearchResult]:
 	"""
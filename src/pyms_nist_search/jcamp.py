@@ -0,0 +1,335 @@
+#!/usr/bin/env python
+#
+#  jcamp.py
+"""
+Functions for reading JCAMP-DX files.
+
+.. versionadded:: 0.9.0
+"""
+#
+#  This file is part of PyMassSpec NIST Search
+#  Python interface to the NIST MS Search DLL
+#
+#  Copyright (c) 2020-2021 Dominic Davis-Foster <dominic@davis-foster.co.uk>
+#
+#  PyMassSpec NIST Search is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as
+#  published by the Free Software Foundation; either version 3 of
+#  the License, or (at your option) any later version.
+#
+#  PyMassSpec NIST Search is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public
+#  License along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+#  PyMassSpec NIST Search includes the redistributable binaries for NIST MS Search in
+#  the x86 and x64 directories. Available from
+#  ftp://chemdata.nist.gov/mass-spc/v1_7/NISTDLL3.zip .
+#  ctnt66.dll and ctnt66_64.dll copyright 1984-1996 FairCom Corporation.
+#  "FairCom" and "c-tree Plus" are trademarks of FairCom Corporation
+#  and are registered in the United States and other countries.
+#  All Rights Reserved.
+
+
+# stdlib
+import collections
+import multiprocessing
+import os
+import typing
+import warnings
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+# 3rd party
+import numpy
+from domdf_python_tools.paths import PathPlus
+from domdf_python_tools.typing import PathLike
+from pyms.Spectrum import MassSpectrum
+from pyms.Utils.jcamp import JcampTagWarning, header_info_fields, xydata_tags
+from pyms.Utils.Math import is_float
+from pyms.Utils.Utils import is_path
+
+# this package
+from pyms_nist_search.reference_data import ReferenceData
+
+__all__ = ("iter_jcamp", "read_jcamp", "load_jcamp_dir", "JcampLoadReport")
+
+_header_fields = frozenset(header_info_fields)
+_xydata_tags = frozenset(xydata_tags)
+
+# Mapping of JCAMP-DX header fields to ReferenceData fields.
+_reference_data_fields: Dict[str, str] = {
+		"TITLE": "name",
+		"CAS REGISTRY NO": "cas",
+		"$NIST MASS SPEC NO": "nist_no",
+		"ORIGIN": "contributor",
+		"MOLFORM": "formula",
+		"MW": "mw",
+		}
+
+
+def _parse_header_value(value: str) -> Union[int, float, str]:
+	"""
+	Parse the value of a JCAMP-DX header field, as an integer or float if possible.
+
+	:param value:
+	"""
+
+	if value.isdigit():
+		return int(value)
+	elif is_float(value):
+		return float(value)
+	else:
+		return value
+
+
+def _parse_xydata(xydata_lines: List[str]) -> MassSpectrum:
+	"""
+	Parse the XY data of a JCAMP-DX block into a mass spectrum.
+
+	:param xydata_lines: The lines of the XY data table.
+	"""
+
+	xydata = numpy.array(' '.join(xydata_lines).replace(',', ' ').split(), dtype=numpy.float64)
+
+	if xydata.size % 2:
+		raise ValueError("JCAMP-DX XY data is not in (m/z, intensity) pairs.")
+
+	return MassSpectrum(xydata[0::2], xydata[1::2])
+
+
+def _make_reference_data(header_info: Dict[str, Any], xydata_lines: List[str]) -> ReferenceData:
+	kwargs = {field: header_info[tag] for tag, field in _reference_data_fields.items() if tag in header_info}
+	return ReferenceData(**kwargs, mass_spec=_parse_xydata(xydata_lines))
+
+
+def _parse_jcamp(fp: Iterable[str], unknown_tag: Callable[[str], Any]) -> Iterator[ReferenceData]:
+	"""
+	Parse the spectra from the lines of a JCAMP-DX file.
+
+	:param fp: The lines of the file.
+	:param unknown_tag: Function called with the name of each tag which is not recognised.
+	"""
+
+	header_info: Dict[str, Any] = {}
+	xydata_lines: List[str] = []
+	last_tag = None
+
+	for line in fp:
+		if not line.strip() or line.startswith("$$"):
+			# Blank line or comment
+			continue
+
+		if line.startswith("##"):
+			tag, _, value = line[2:].partition('=')
+			last_tag = tag = tag.upper()
+
+			if tag.startswith("END"):
+				if header_info or xydata_lines:
+					yield _make_reference_data(header_info, xydata_lines)
+
+				header_info = {}
+				xydata_lines = []
+				last_tag = None
+
+			elif tag == "TITLE" and (header_info or xydata_lines):
+				# The start of a nested block. The enclosing block is a LINK block with no spectrum.
+				if xydata_lines:
+					yield _make_reference_data(header_info, xydata_lines)
+
+				header_info = {tag: _parse_header_value(value.strip())}
+				xydata_lines = []
+
+			elif tag in _xydata_tags:
+				continue
+
+			elif tag in _header_fields:
+				header_info[tag] = _parse_header_value(value.strip())
+
+			else:
+				unknown_tag(tag)
+
+		elif last_tag in _xydata_tags:
+			xydata_lines.append(line)
+
+		elif last_tag in header_info and isinstance(header_info[last_tag], str):
+			# Continuation of a header field
+			header_info[last_tag] += line.rstrip("\r\n")
+
+	if header_info or xydata_lines:
+		# The file is missing the final ``##END=``
+		yield _make_reference_data(header_info, xydata_lines)
+
+
+def _ignore_tag(tag: str) -> None:
+	pass
+
+
+def _warn_tag(tag: str) -> None:
+	warnings.warn(tag, JcampTagWarning)
+
+
+def iter_jcamp(file_name: PathLike, ignore_warnings: bool = True) -> Iterator[ReferenceData]:
+	"""
+	Iterate over the spectra in a JCAMP-DX file.
+
+	The header fields and XY data are read together in a single pass over the file.
+	Files with multiple blocks (e.g. a ``LINK`` block containing several spectra) yield one
+	:class:`~.ReferenceData` object per block. Blocks with neither header fields nor XY data are skipped.
+
+	:param file_name: Path of the file to read.
+	:param ignore_warnings: Whether warnings about invalid tags should be suppressed.
+	"""
+
+	if not is_path(file_name):
+		raise TypeError("'file_name' must be a string or a PathLike object")
+
+	with open(file_name, encoding="UTF-8") as fp:
+		yield from _parse_jcamp(fp, _ignore_tag if ignore_warnings else _warn_tag)
+
+
+def read_jcamp(file_name: PathLike, ignore_warnings: bool = True) -> ReferenceData:
+	"""
+	Read the first spectrum from a JCAMP-DX file.
+
+	:param file_name: Path of the file to read.
+	:param ignore_warnings: Whether warnings about invalid tags should be suppressed.
+	"""
+
+	for ref_data in iter_jcamp(file_name, ignore_warnings=ignore_warnings):
+		return ref_data
+
+	raise ValueError(f"No spectra found in JCAMP-DX file {file_name}")
+
+
+class JcampLoadReport:
+	"""
+	Summary of the files loaded by :func:`~.load_jcamp_dir`.
+	"""
+
+	#: The number of files read.
+	files: int
+
+	#: The number of spectra read.
+	spectra: int
+
+	#: The number of times each unrecognised tag was seen, across all files.
+	unknown_tags: typing.Counter[str]
+
+	#: Files which could not be read, mapped to a description of the error.
+	errors: Dict[PathPlus, str]
+
+	def __init__(self) -> None:
+		self.files = 0
+		self.spectra = 0
+		self.unknown_tags = collections.Counter()
+		self.errors = {}
+
+	def __repr__(self) -> str:
+		return f"<{self.__class__.__name__}(files={self.files}, spectra={self.spectra}, errors={len(self.errors)})>"
+
+	def summary(self) -> str:
+		"""
+		Returns a summary of the files loaded, the unrecognised tags and any errors.
+		"""
+
+		lines = [f"Read {self.spectra} spectra from {self.files} files."]
+
+		if self.unknown_tags:
+			tags = ", ".join(f"{tag} ({count})" for tag, count in self.unknown_tags.most_common())
+			lines.append(f"Unrecognised tags: {tags}")
+
+		if self.errors:
+			lines.append(f"{len(self.errors)} files could not be read:")
+			lines.extend(f"  {filename}: {error}" for filename, error in self.errors.items())
+
+		return '\n'.join(lines)
+
+
+def _load_jcamp_file(file_name: PathPlus) -> Tuple[List[ReferenceData], typing.Counter[str], Optional[str]]:
+	"""
+	Read all spectra from a JCAMP-DX file, collecting unrecognised tags and errors rather than raising them.
+
+	:param file_name:
+
+	:return: The spectra, the number of times each unrecognised tag was seen, and a description of the error,
+		or :py:obj:`None` if the file was read successfully.
+	"""
+
+	unknown_tags: typing.Counter[str] = collections.Counter()
+
+	def count_tag(tag: str) -> None:
+		unknown_tags[tag] += 1
+
+	try:
+		with file_name.open(encoding="UTF-8") as fp:
+			spectra = list(_parse_jcamp(fp, count_tag))
+	except Exception as e:  # pylint: disable=broad-except
+		return [], unknown_tags, f"{e.__class__.__name__}: {e}"
+
+	return spectra, unknown_tags, None
+
+
+def _collect_jcamp_results(
+		filenames: List[PathPlus],
+		results: Iterable[Tuple[List[ReferenceData], typing.Counter[str], Optional[str]]],
+		report: JcampLoadReport,
+		) -> Iterator[ReferenceData]:
+
+	for file_name, (spectra, unknown_tags, error) in zip(filenames, results):
+		report.files += 1
+		report.spectra += len(spectra)
+		report.unknown_tags.update(unknown_tags)
+
+		if error is not None:
+			report.errors[file_name] = error
+
+		yield from spectra
+
+
+def load_jcamp_dir(
+		path: PathLike,
+		workers: Optional[int] = None,
+		pattern: str = "*.jdx",
+		report: Optional[JcampLoadReport] = None,
+		) -> Iterator[ReferenceData]:
+	"""
+	Load the spectra from every JCAMP-DX file in a directory, using a pool of worker processes.
+
+	The spectra are yielded in the order of the sorted filenames, regardless of the number of workers.
+	Files which cannot be read are skipped and recorded in ``report``,
+	along with the number of times each unrecognised tag was seen.
+
+	.. versionadded:: 0.9.0
+
+	:param path: The directory containing the files.
+	:param workers: The number of worker processes. Defaults to the number of CPUs.
+		If ``1`` the files are read in the current process.
+	:param pattern: Glob pattern matching the files to load.
+	:param report: Collects the number of files read, unrecognised tags and errors.
+	"""
+
+	if workers is None:
+		workers = os.cpu_count() or 1
+
+	if workers < 1:
+		raise ValueError("`workers` must be at least 1.")
+
+	if report is None:
+		report = JcampLoadReport()
+
+	filenames = sorted(PathPlus(path).glob(pattern))
+
+	if workers == 1 or len(filenames) <= 1:
+		results: Iterable = map(_load_jcamp_file, filenames)
+		yield from _collect_jcamp_results(filenames, results, report)
+	else:
+		chunksize = max(1, min(64, len(filenames) // (workers * 4)))
+
+		with multiprocessing.Pool(workers) as pool:
+			results = pool.imap(_load_jcamp_file, filenames, chunksize=chunksize)
+			yield from _collect_jcamp_results(filenames, results, report)
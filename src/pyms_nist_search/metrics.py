@@ -0,0 +1,440 @@
+#!/usr/bin/env python
+#
+#  metrics.py
+"""
+Instrumentation of the search engines.
+
+When enabled, calls to the :class:`~.win_engine.Engine` and :class:`~.docker_engine.Engine` search methods
+record latency histograms, broken down into phases, as well as counts such as the number of retries.
+The metrics can be exported in the Prometheus text format or as JSON,
+and hooks can be registered to forward each observation to another system.
+
+Metrics are disabled by default, and cost only an attribute lookup per call while disabled.
+
+.. code-block:: python
+
+	from pyms_nist_search.metrics import registry
+
+	registry.enable()
+	search.full_spectrum_search(mass_spec)
+	print(registry.to_prometheus())
+
+The phases recorded are:
+
+* ``total`` -- the whole call.
+* ``encode`` -- converting the arguments into the form expected by the C extension or the search server.
+* ``dll`` -- the call to the C extension (:class:`~.win_engine.Engine` only).
+* ``transport`` -- the HTTP request to the search server, including the search itself
+  (:class:`~.docker_engine.Engine` only).
+* ``decode`` -- converting the results into Python objects.
+
+.. versionadded:: 0.9.0
+"""
+#
+#  This file is part of PyMassSpec NIST Search
+#  Python interface to the NIST MS Search DLL
+#
+#  Copyright (c) 2020-2021 Dominic Davis-Foster <dominic@davis-foster.co.uk>
+#
+#  PyMassSpec NIST Search is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as
+#  published by the Free Software Foundation; either version 3 of
+#  the License, or (at your option) any later version.
+#
+#  PyMassSpec NIST Search is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public
+#  License along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+#  PyMassSpec NIST Search includes the redistributable binaries for NIST MS Search in
+#  the x86 and x64 directories. Available from
+#  ftp://chemdata.nist.gov/mass-spc/v1_7/NISTDLL3.zip .
+#  ctnt66.dll and ctnt66_64.dll copyright 1984-1996 FairCom Corporation.
+#  "FairCom" and "c-tree Plus" are trademarks of FairCom Corporation
+#  and are registered in the United States and other countries.
+#  All Rights Reserved.
+
+# stdlib
+import bisect
+import functools
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple, TypeVar
+
+__all__ = [
+		"DEFAULT_BUCKETS",
+		"Histogram",
+		"MetricEvent",
+		"MetricsHook",
+		"MetricsRegistry",
+		"registry",
+		]
+
+_F = TypeVar("_F", bound=Callable[..., Any])
+
+DEFAULT_BUCKETS: Tuple[float, ...] = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+"""
+The default upper bounds, in seconds, of the buckets of a latency :class:`~.Histogram`.
+"""
+
+
+class Histogram:
+	"""
+	A histogram of observed values, with fixed bucket boundaries.
+
+	:param buckets: The upper bounds of the buckets, in increasing order.
+		Values greater than the last bound are counted in an additional overflow bucket.
+	"""
+
+	def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+		self.buckets: Tuple[float, ...] = tuple(sorted(buckets))
+		self.counts: List[int] = [0] * (len(self.buckets) + 1)
+		self.count: int = 0
+		self.sum: float = 0.0
+
+	def observe(self, value: float) -> None:
+		"""
+		Record a value in the histogram.
+
+		:param value:
+		"""
+
+		self.counts[bisect.bisect_left(self.buckets, value)] += 1
+		self.count += 1
+		self.sum += value
+
+	def cumulative_counts(self) -> List[int]:
+		"""
+		Returns the number of values less than or equal to each bucket's upper bound.
+
+		The total number of values is appended, as the count for the ``+Inf`` bucket.
+		"""
+
+		cumulative = []
+		total = 0
+
+		for count in self.counts:
+			total += count
+			cumulative.append(total)
+
+		return cumulative
+
+	def to_dict(self) -> Dict[str, Any]:
+		"""
+		Convert the object to a dictionary.
+		"""
+
+		return dict(buckets=list(self.buckets), counts=list(self.counts), count=self.count, sum=self.sum)
+
+
+class MetricEvent(NamedTuple):
+	"""
+	A single observation, as passed to a :data:`~.MetricsHook`.
+	"""
+
+	#: ``'latency'`` for the duration of a phase, or ``'counter'`` for an increment of a counter.
+	kind: str
+
+	#: The name of the engine method.
+	method: str
+
+	#: The name of the phase (for latencies) or of the counter.
+	name: str
+
+	#: The duration in seconds, or the amount the counter was incremented by.
+	value: float
+
+
+MetricsHook = Callable[[MetricEvent], None]
+"""
+The signature of a function which receives each :class:`~.MetricEvent` as it is recorded.
+"""
+
+
+class _NullPhase:
+	"""
+	A context manager which does nothing, used for phases while metrics are disabled.
+	"""
+
+	def __enter__(self) -> None:
+		return None
+
+	def __exit__(self, exc_type, exc_val, exc_tb) -> None:  # noqa: MAN001
+		return None
+
+
+_null_phase = _NullPhase()
+
+
+class _Phase:
+	"""
+	A context manager which records the time taken by its body.
+	"""
+
+	__slots__ = ("registry", "method", "phase", "start")
+
+	def __init__(self, registry: "MetricsRegistry", method: str, phase: str) -> None:
+		self.registry = registry
+		self.method = method
+		self.phase = phase
+		self.start = 0.0
+
+	def __enter__(self) -> None:
+		self.start = time.perf_counter()
+
+	def __exit__(self, exc_type, exc_val, exc_tb) -> None:  # noqa: MAN001
+		self.registry.observe(self.method, self.phase, time.perf_counter() - self.start)
+
+
+class MetricsRegistry:
+	"""
+	Collects latency histograms and counters for the search engine methods.
+
+	Most code should use the shared :data:`~.registry`, which the engines record into.
+
+	:param buckets: The upper bounds, in seconds, of the latency histogram buckets.
+	"""
+
+	def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+		self.enabled: bool = False
+		self.buckets: Tuple[float, ...] = tuple(buckets)
+		self._latencies: Dict[Tuple[str, str], Histogram] = {}
+		self._counters: Dict[Tuple[str, str], float] = {}
+		self._hooks: List[MetricsHook] = []
+		self._lock = threading.Lock()
+
+	def enable(self) -> None:
+		"""
+		Start recording metrics.
+		"""
+
+		self.enabled = True
+
+	def disable(self) -> None:
+		"""
+		Stop recording metrics. The metrics recorded so far are kept.
+		"""
+
+		self.enabled = False
+
+	def reset(self) -> None:
+		"""
+		Discard the metrics recorded so far.
+		"""
+
+		with self._lock:
+			self._latencies.clear()
+			self._counters.clear()
+
+	def add_hook(self, hook: MetricsHook) -> None:
+		"""
+		Register a function to be called with each :class:`~.MetricEvent` as it is recorded.
+
+		Hooks are called from the thread making the search, and should return quickly.
+
+		:param hook:
+		"""
+
+		self._hooks.append(hook)
+
+	def remove_hook(self, hook: MetricsHook) -> None:
+		"""
+		Unregister a function previously registered with :meth:`~.add_hook`.
+
+		:param hook:
+		"""
+
+		self._hooks.remove(hook)
+
+	def observe(self, method: str, phase: str, seconds: float) -> None:
+		"""
+		Record the time taken by a phase of a call.
+
+		:param method: The name of the engine method.
+		:param phase: The name of the phase.
+		:param seconds:
+		"""
+
+		if not self.enabled:
+			return
+
+		with self._lock:
+			key = (method, phase)
+			if key not in self._latencies:
+				self._latencies[key] = Histogram(self.buckets)
+			self._latencies[key].observe(seconds)
+
+		self._call_hooks(MetricEvent("latency", method, phase, seconds))
+
+	def increment(self, method: str, name: str, amount: float = 1) -> None:
+		"""
+		Increment a counter for a method.
+
+		:param method: The name of the engine method.
+		:param name: The name of the counter.
+		:param amount:
+		"""
+
+		if not self.enabled:
+			return
+
+		with self._lock:
+			key = (method, name)
+			self._counters[key] = self._counters.get(key, 0) + amount
+
+		self._call_hooks(MetricEvent("counter", method, name, amount))
+
+	def _call_hooks(self, event: MetricEvent) -> None:
+		for hook in self._hooks:
+			hook(event)
+
+	def phase(self, method: str, phase: str) -> Any:
+		"""
+		Returns a context manager which records the time taken by its body as a phase of a call.
+
+		:param method: The name of the engine method.
+		:param phase: The name of the phase.
+		"""
+
+		if not self.enabled:
+			return _null_phase
+
+		return _Phase(self, method, phase)
+
+	def instrument(self, func: _F) -> _F:
+		"""
+		Decorator to record the total time taken by calls to an engine method, and the number of errors it raises.
+
+		:param func:
+		"""
+
+		method = func.__name__
+
+		@functools.wraps(func)
+		def wrapper(*args, **kwargs):  # noqa: MAN002
+			if not self.enabled:
+				return func(*args, **kwargs)
+
+			start = time.perf_counter()
+			try:
+				return func(*args, **kwargs)
+			except Exception:
+				self.increment(method, "errors")
+				raise
+			finally:
+				self.observe(method, "total", time.perf_counter() - start)
+
+		return wrapper  # type: ignore[return-value]
+
+	def get_latency(self, method: str, phase: str = "total") -> Optional[Histogram]:
+		"""
+		Returns a copy of the latency histogram for a phase of a method.
+
+		If no calls have been recorded :py:obj:`None` is returned instead.
+
+		:param method: The name of the engine method.
+		:param phase: The name of the phase.
+		"""
+
+		with self._lock:
+			histogram = self._latencies.get((method, phase))
+			if histogram is None:
+				return None
+
+			copy = Histogram(histogram.buckets)
+			copy.counts = list(histogram.counts)
+			copy.count = histogram.count
+			copy.sum = histogram.sum
+
+		return copy
+
+	def get_counter(self, method: str, name: str) -> float:
+		"""
+		Returns the value of a counter for a method.
+
+		:param method: The name of the engine method.
+		:param name: The name of the counter.
+		"""
+
+		with self._lock:
+			return self._counters.get((method, name), 0)
+
+	def to_dict(self) -> Dict[str, Any]:
+		"""
+		Convert the recorded metrics to a dictionary, keyed by method name.
+		"""
+
+		output: Dict[str, Dict[str, Any]] = {}
+
+		with self._lock:
+			for (method, phase), histogram in sorted(self._latencies.items()):
+				output.setdefault(method, {"latency": {}, "counters": {}})["latency"][phase] = histogram.to_dict()
+			for (method, name), value in sorted(self._counters.items()):
+				output.setdefault(method, {"latency": {}, "counters": {}})["counters"][name] = value
+
+		return output
+
+	def to_json(self) -> str:
+		"""
+		Convert the recorded metrics to JSON.
+		"""
+
+		return json.dumps(self.to_dict())
+
+	def to_prometheus(self, prefix: str = "pyms_nist_search") -> str:
+		"""
+		Convert the recorded metrics to the Prometheus text exposition format.
+
+		Latencies are exported as the histogram ``<prefix>_latency_seconds``,
+		labelled by ``method`` and ``phase``, and each counter as ``<prefix>_<name>_total``,
+		labelled by ``method``.
+
+		:param prefix: The prefix for the metric names.
+		"""
+
+		lines = []
+
+		with self._lock:
+			latencies = sorted(self._latencies.items())
+			counters = sorted(self._counters.items())
+
+			if latencies:
+				metric = f"{prefix}_latency_seconds"
+				lines.append(f"# HELP {metric} Time taken by search engine calls, by method and phase.")
+				lines.append(f"# TYPE {metric} histogram")
+
+				for (method, phase), histogram in latencies:
+					labels = f'method="{method}",phase="{phase}"'
+					bounds = [repr(float(bound)) for bound in histogram.buckets] + ["+Inf"]
+
+					for bound, count in zip(bounds, histogram.cumulative_counts()):
+						lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {count}')
+
+					lines.append(f"{metric}_sum{{{labels}}} {histogram.sum!r}")
+					lines.append(f"{metric}_count{{{labels}}} {histogram.count}")
+
+			names = sorted({name for (method, name), value in counters})
+			for counter_name in names:
+				metric = f"{prefix}_{counter_name}_total"
+				lines.append(f"# TYPE {metric} counter")
+
+				for (method, name), value in counters:
+					if name == counter_name:
+						lines.append(f'{metric}{{method="{method}"}} {value!r}')
+
+		if not lines:
+			return ''
+
+		return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+"""
+The :class:`~.MetricsRegistry` which the search engines record into.
+"""
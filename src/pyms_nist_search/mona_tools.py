@@ -29,9 +29,17 @@ It could probably be its own package.
 #
 
 # stdlib
-from typing import Any, Dict, Iterable, List, Mapping, Set
+import collections
+import io
+import json
+import typing
+import zipfile
+from typing import IO, Any, Dict, FrozenSet, Iterable, Iterator, List, Mapping, Optional, Set, Tuple
 
 # 3rd party
+import numpy
+from domdf_python_tools.paths import PathPlus
+from domdf_python_tools.typing import PathLike
 from pyms.Spectrum import MassSpectrum
 
 __all__ = (
@@ -40,8 +48,11 @@ __all__ = (
 		"mona_skip_compound_props",
 		"mona_skip_categories",
 		"mona_skip_properties",
+		"MetadataDiagnostics",
 		"parse_metadata",
 		"mass_spec_from_mona",
+		"iter_json_array",
+		"iter_mona_json",
 		)
 
 
@@ -140,16 +151,127 @@ mona_skip_properties: Set[str] = prep_match_list([
 		])
 
 
-def parse_metadata(mona_data: Dict[str, Any]) -> Dict[str, Any]:
+# Maps casefolded property names to the key in the output of :func:`parse_metadata`,
+# or to ``None`` if the property is ignored.
+_compound_prop_dispatch: Dict[str, Optional[str]] = {
+		**dict.fromkeys(mona_skip_compound_props),
+		"molecular formula": "formula",
+		"total exact mass": "exact_mass",
+		"cas number": "cas",
+		"cas": "cas",
+		}
+
+_property_dispatch: Dict[str, Optional[str]] = {
+		**dict.fromkeys(mona_skip_properties),
+		**dict.fromkeys(prep_match_list(["data format", "institution", "formula", "ion type"])),
+		"accession": "id",
+		"exact mass": "exact_mass",
+		"author": "contributor",
+		"accurate mass": "exact_mass",
+		"license": "license",
+		}
+
+_skip_categories: FrozenSet[str] = frozenset(mona_skip_categories)
+
+
+class MetadataDiagnostics:
+	"""
+	Collects the compound and spectrum properties which :func:`~.parse_metadata` did not recognise.
+
+	Diagnostics from several workers can be combined with :meth:`~.MetadataDiagnostics.merge`,
+	and reported once at the end of a conversion with :meth:`~.MetadataDiagnostics.summary`.
+
+	.. versionadded:: 0.9.0
+
+	:param max_examples: The maximum number of example properties to keep for each unrecognised property name.
+	:param verbose: Whether to print each unrecognised property as it is encountered.
+	"""
+
+	#: The number of records parsed.
+	records: int
+
+	#: The number of times each unrecognised property name was seen,
+	#: keyed by ``(section, name)`` where ``section`` is ``'compound'`` or ``'spectrum'``.
+	unknown_properties: typing.Counter[Tuple[str, str]]
+
+	#: Example properties for each unrecognised property name.
+	examples: Dict[Tuple[str, str], List[Mapping[str, Any]]]
+
+	def __init__(self, max_examples: int = 3, verbose: bool = False):
+		self.max_examples = max_examples
+		self.verbose = verbose
+		self.records = 0
+		self.unknown_properties = collections.Counter()
+		self.examples = {}
+
+	def add_unknown(self, section: str, prop: Mapping[str, Any]) -> None:
+		"""
+		Record an unrecognised property.
+
+		:param section: The part of the record the property was found in, either ``'compound'`` or ``'spectrum'``.
+		:param prop: The property.
+		"""
+
+		key = (section, prop["name"])
+		self.unknown_properties[key] += 1
+
+		examples = self.examples.setdefault(key, [])
+		if len(examples) < self.max_examples:
+			examples.append(prop)
+
+		if self.verbose:
+			print(prop)
+
+	def merge(self, other: "MetadataDiagnostics") -> None:
+		"""
+		Add the diagnostics from ``other`` to this object.
+
+		:param other:
+		"""
+
+		self.records += other.records
+		self.unknown_properties.update(other.unknown_properties)
+
+		for key, other_examples in other.examples.items():
+			examples = self.examples.setdefault(key, [])
+			examples.extend(other_examples[:self.max_examples - len(examples)])
+
+	def __bool__(self) -> bool:
+		return bool(self.unknown_properties)
+
+	def summary(self) -> str:
+		"""
+		Returns a summary of the unrecognised properties, most common first.
+		"""
+
+		if not self.unknown_properties:
+			return f"No unrecognised properties in {self.records} records."
+
+		total = sum(self.unknown_properties.values())
+		lines = [f"{total} unrecognised properties in {self.records} records:"]
+
+		for (section, name), count in self.unknown_properties.most_common():
+			examples = ", ".join(repr(example["value"]) for example in self.examples.get((section, name), ()))
+			lines.append(f"  {section} property {name!r}: {count} (e.g. {examples})")
+
+		return '\n'.join(lines)
+
+
+def parse_metadata(
+		mona_data: Dict[str, Any],
+		diagnostics: Optional[MetadataDiagnostics] = None,
+		) -> Dict[str, Any]:
 	"""
 	Parse metadata for the compound.
 
 	:param mona_data:
+	:param diagnostics: Collects any properties which were not recognised.
+		If :py:obj:`None` unrecognised properties are ignored.
+
+	.. versionchanged:: 0.9.0  Unrecognised properties are collected in ``diagnostics`` rather than printed.
 	"""
 
 	compound: Dict = mona_data["compound"][0]
-	compound_metadata: List = compound["metaData"]
-	metadata: List = mona_data["metaData"]
 	submitter: Dict = mona_data["submitter"]
 
 	properties_dict: Dict[str, Any] = {
@@ -159,82 +281,38 @@ def parse_metadata(mona_data: Dict[str, Any]) -> Dict[str, Any]:
 			"cas": '',
 			"contributor": '',
 			"license": '',
+			"id": mona_data.get("id", ''),
 			}
 
-	if "id" in mona_data:
-		properties_dict["id"] = mona_data["id"]
-	else:
-		properties_dict["id"] = ''
-
-	prop_lookup: Dict[str, str] = {
-			"accession": "id",
-			"exact mass": "exact_mass",
-			"author": "contributor",
-			"molecular formula": "formula",
-			"total exact mass": "exact_mass",
-			"accurate mass": "exact_mass",
-			"cas number": "cas",
-			"cas": "cas",
-			"license": "license",
-			}
+	for prop in compound["metaData"]:
+		name = prop["name"].casefold()
 
-	def set_prop_value(property_name: str, prop_: Mapping[str, Any]) -> None:
-		if not properties_dict[property_name]:
-			properties_dict[property_name] = prop_["value"]
-
-	def parse_compound_prop(prop_: Mapping[str, Any]) -> None:
-		# Put props in order of priority
-		for prop_name in ["molecular formula", "total exact mass", "cas number", "cas"]:
-			if prop_["name"].casefold() == prop_name:
-				set_prop_value(prop_lookup[prop_name], prop_)
-				break
-		else:
-			print(prop_)
-
-	def parse_property(prop_: Mapping[str, Any]) -> None:
-		# Put props in order of priority
-		for prop_name in ["accession", "exact mass", "author", "institution", "accurate mass", "license"]:
-			if prop_["name"].casefold() == prop_name:
-				set_prop_value(prop_lookup[prop_name], prop_)
-				break
-		else:
-			print(prop_)
-
-	for prop in compound_metadata:
-		if prop["name"].casefold() in mona_skip_compound_props:
+		if name not in _compound_prop_dispatch:
+			if diagnostics is not None:
+				diagnostics.add_unknown("compound", prop)
 			continue
 
-		elif not prop["computed"]:
-			parse_compound_prop(prop)
-		# prioritise not computed
-		elif prop["computed"]:
-			parse_compound_prop(prop)
-		else:
-			# Unknown property
-			print(prop)
+		key = _compound_prop_dispatch[name]
+		if key is not None and not properties_dict[key]:
+			properties_dict[key] = prop["value"]
 
-	for prop in metadata:
-		if "category" in prop and prop["category"].casefold() in mona_skip_categories:
+	for prop in mona_data["metaData"]:
+		if "category" in prop and prop["category"].casefold() in _skip_categories:
 			continue
 
-		elif prop["name"].casefold() in prep_match_list((
-				*mona_skip_properties,
-				"data format",
-				"institution",
-				"formula",
-				"ion type",
-				)):
-			# todo: "data format"
+		name = prop["name"].casefold()
+
+		if name not in _property_dispatch:
+			if diagnostics is not None:
+				diagnostics.add_unknown("spectrum", prop)
 			continue
 
-		elif not prop["computed"]:
-			# prioritise not computed
-			parse_property(prop)
-		elif prop["computed"]:
-			parse_property(prop)
-		else:
-			# Unknown property
-			print(prop)
+		key = _property_dispatch[name]
+		if key is not None and not properties_dict[key]:
+			properties_dict[key] = prop["value"]
+
+	if diagnostics is not None:
+		diagnostics.records += 1
 
 	if not properties_dict["contributor"] and "institution" in submitter:
 		properties_dict["contributor"] = submitter["institution"]
@@ -261,5 +339,131 @@ def mass_spec_from_mona(mona_ms_string: str) -> MassSpectrum:
 	:param mona_ms_string:
 	"""
 
-	pairs = [val.split(':') for val in mona_ms_string.split(' ')]
-	return MassSpectrum.from_mz_int_pairs([(float(mz), float(int_)) for mz, int_ in pairs])
+	# The string is in the form ``mz:int mz:int ...``
+	num_peaks = mona_ms_string.count(' ') + 1
+
+	try:
+		values = numpy.fromstring(mona_ms_string.replace(':', ' '), dtype=numpy.float64, sep=' ')
+	except ValueError:
+		values = None
+
+	if values is None or mona_ms_string.count(':') != num_peaks or values.size != num_peaks * 2:
+		raise ValueError(f"Invalid MoNA spectrum: {mona_ms_string!r}")
+
+	return MassSpectrum(values[0::2], values[1::2])
+
+
+_number_chars = frozenset("0123456789+-.eE")
+
+
+def iter_json_array(fp: IO[str], chunk_size: int = 1 << 20) -> Iterator[Any]:
+	"""
+	Iterate over the elements of the JSON array in ``fp``, decoding one element at a time.
+
+	Only the element currently being decoded (and up to ``chunk_size`` characters of the file)
+	is held in memory, so arrays much larger than the available memory can be read.
+
+	.. versionadded:: 0.9.0
+
+	:param fp: A file opened for reading in text mode, containing a single JSON array.
+	:param chunk_size: The number of characters to read from the file at once.
+	"""
+
+	decoder = json.JSONDecoder()
+	buffer = ''
+	pos = 0
+	eof = False
+
+	def fill() -> bool:
+		# Read more data into the buffer, discarding what has already been decoded.
+		nonlocal buffer, pos, eof
+
+		if eof:
+			return False
+
+		data = fp.read(chunk_size)
+		if not data:
+			eof = True
+			return False
+
+		buffer = buffer[pos:] + data
+		pos = 0
+		return True
+
+	def next_char() -> str:
+		# Skip whitespace and return the next character, without consuming it.
+		nonlocal pos
+
+		while True:
+			while pos < len(buffer) and buffer[pos].isspace():
+				pos += 1
+
+			if pos < len(buffer):
+				return buffer[pos]
+
+			if not fill():
+				raise ValueError("Unexpected end of JSON data")
+
+	if next_char() != '[':
+		raise ValueError("JSON data is not an array")
+	pos += 1
+
+	if next_char() == ']':
+		return
+
+	while True:
+		next_char()
+
+		try:
+			element, end = decoder.raw_decode(buffer, pos)
+		except json.JSONDecodeError:
+			# The element is incomplete
+			if not fill():
+				raise
+			continue
+
+		if not eof and buffer[pos] in _number_chars and (end == len(buffer) or buffer[end] in _number_chars):
+			# The number may have been cut off at the end of the buffer (e.g. ``1.`` of ``1.25``).
+			fill()
+			continue
+
+		pos = end
+		yield element
+
+		char = next_char()
+		pos += 1
+
+		if char == ']':
+			return
+		elif char != ',':
+			raise ValueError(f"Expecting ',' delimiter in JSON array, got {char!r}")
+
+
+def iter_mona_json(filename: PathLike) -> Iterator[Dict[str, Any]]:
+	"""
+	Iterate over the compounds in a MoNA JSON export, yielding one compound at a time.
+
+	The export can be either the JSON file itself or the zip file it is distributed in.
+	The JSON data is read directly from the zip file without extracting it to disk.
+
+	.. versionadded:: 0.9.0
+
+	:param filename:
+	"""
+
+	filename = PathPlus(filename)
+
+	if zipfile.is_zipfile(filename):
+		with zipfile.ZipFile(filename) as zip_file:
+			for member in zip_file.namelist():
+				if member.endswith(".json"):
+					break
+			else:
+				raise FileNotFoundError(f"No JSON file found in {filename}")
+
+			with zip_file.open(member) as raw_fp, io.TextIOWrapper(raw_fp, encoding="UTF-8") as fp:
+				yield from iter_json_array(fp)
+
+	else:
+		with filename.open(encoding="UTF-8") as fp:
+			yield from iter_json_array(fp)
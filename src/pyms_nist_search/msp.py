@@ -0,0 +1,372 @@
+#!/usr/bin/env python
+#
+#  msp.py
+"""
+Functions for reading and writing MSP files.
+"""
+#
+#  This file is part of PyMassSpec NIST Search
+#  Python interface to the NIST MS Search DLL
+#
+#  Copyright (c) 2020-2021 Dominic Davis-Foster <dominic@davis-foster.co.uk>
+#
+#  PyMassSpec NIST Search is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as
+#  published by the Free Software Foundation; either version 3 of
+#  the License, or (at your option) any later version.
+#
+#  PyMassSpec NIST Search is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public
+#  License along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+#  PyMassSpec NIST Search includes the redistributable binaries for NIST MS Search in
+#  the x86 and x64 directories. Available from
+#  ftp://chemdata.nist.gov/mass-spc/v1_7/NISTDLL3.zip .
+#  ctnt66.dll and ctnt66_64.dll copyright 1984-1996 FairCom Corporation.
+#  "FairCom" and "c-tree Plus" are trademarks of FairCom Corporation
+#  and are registered in the United States and other countries.
+#  All Rights Reserved.
+
+# stdlib
+import mmap
+import re
+from typing import IO, Any, Dict, Iterable, Iterator, List, Optional, Sequence, Union
+
+# 3rd party
+import numpy
+from domdf_python_tools.typing import PathLike
+from pyms.Spectrum import MassSpectrum
+
+# this package
+from pyms_nist_search.reference_data import ReferenceData
+
+__all__ = ["format_msp_record", "write_msp", "iter_msp", "msp_fields"]
+
+msp_fields = frozenset({"name", "synonyms", "formula", "mw", "cas", "nist_no", "id", "contributor"})
+"""
+The :class:`~.ReferenceData` fields which can be read from MSP files by :func:`~.iter_msp`.
+
+.. versionadded:: 0.9.0
+"""
+
+# Mapping of (lowercase) MSP keys to ReferenceData fields.
+_msp_keys: Dict[bytes, str] = {
+		b"name": "name",
+		b"synon": "synonyms",
+		b"formula": "formula",
+		b"mw": "mw",
+		b"cas#": "cas",
+		b"casno": "cas",
+		b"nist#": "nist_no",
+		b"db#": "id",
+		b"id": "id",
+		b"comments": "contributor",
+		}
+
+# Keys whose values may contain semicolons
+_free_text_keys = frozenset({b"name", b"synon", b"comments"})
+
+_peak_separators = bytes.maketrans(b";,:\t()[]{}", b' ' * 10)
+_peak_annotations = re.compile(rb'"[^"]*"')
+
+
+def _as_strings(values: Union[Sequence, numpy.ndarray]) -> List[str]:
+	"""
+	Convert the given values to strings in the same way as formatting
+	the values of a :class:`pyms.Spectrum.MassSpectrum` with an f-string does.
+
+	:param values:
+	"""  # noqa: D400
+
+	array = numpy.asarray(values)
+
+	if not numpy.issubdtype(array.dtype, numpy.number):
+		array = array.astype(numpy.float64)
+
+	# Formatting a numpy scalar converts it to the equivalent Python type first.
+	return list(map(str, array.tolist()))
+
+
+# Whether the builtin round() returns an int for numpy floats (it returns a float with older numpy versions).
+_round_returns_int = isinstance(round(numpy.float64(0.5)), int)
+
+
+def _normalise_intensities(intensity_list: Sequence) -> Union[numpy.ndarray, List[int]]:
+	"""
+	Normalise the intensities to a maximum of 999, giving the same values
+	as ``normalize_mass_spec(mass_spec, max_intensity=999)``.
+
+	:param intensity_list:
+	"""  # noqa: D400
+
+	intensities = numpy.asarray(intensity_list)
+
+	# The vectorised calculation only gives identical results to the scalar calculation
+	# in normalize_mass_spec for these types.
+	if intensities.dtype.type in {numpy.float64, numpy.int64}:
+		normalised = (intensities / float(intensities.max())) * 999
+
+		if numpy.isfinite(normalised).all():
+			normalised = numpy.rint(normalised)
+			if _round_returns_int:
+				normalised = normalised.astype(numpy.int64)
+			return normalised
+
+	relative_to = float(max(intensity_list))
+	return [round((x / relative_to) * 999) for x in intensity_list]
+
+
+def format_msp_record(ref_data: ReferenceData) -> str:
+	"""
+	Format the given reference data as an MSP record.
+
+	The output is identical to that of :meth:`ReferenceData.to_msp() <.ReferenceData.to_msp>`,
+	but does not use a template or create intermediate :class:`~pyms.Spectrum.MassSpectrum` objects.
+
+	.. versionadded:: 0.9.0
+
+	:param ref_data:
+	"""
+
+	# Avoid copying the mass spectrum, as the public property does.
+	mass_spec = ref_data._mass_spec
+
+	if not mass_spec:
+		raise ValueError("No mass spectrum included in the reference data.")
+
+	masses = _as_strings(mass_spec.mass_list)
+	intensities = _as_strings(_normalise_intensities(mass_spec.intensity_list))
+
+	lines = [f"Name: {ref_data.name}"]
+	lines.extend(f"Synon: {synonym}" for synonym in ref_data.synonyms)
+	lines.append(f"Formula: {ref_data.formula}")
+	lines.append(f"MW: {ref_data.mw}")
+	lines.append(f"CAS#: {ref_data.cas}")
+	lines.append(f"NIST#: {ref_data.nist_no}")
+	lines.append(f"DB#: {ref_data.id}")
+	lines.append(f"Comments: {ref_data.contributor}")
+	lines.append(f"Num Peaks: {len(masses)}")
+
+	mz_int_pairs = [f"{mz} {intensity}" for mz, intensity in zip(masses, intensities)]
+
+	for start in range(0, len(mz_int_pairs), 5):
+		lines.append("; ".join(mz_int_pairs[start:start + 5]))
+
+	return '\n'.join(lines)
+
+
+def write_msp(records: Iterable[ReferenceData], fp: IO[str]) -> int:
+	"""
+	Write the given reference data to an MSP file.
+
+	Each record is identical to the output of :meth:`ReferenceData.to_msp() <.ReferenceData.to_msp>`,
+	and is followed by a blank line.
+	Records are written as they are formatted, so ``records`` may be a lazy iterable.
+
+	.. versionadded:: 0.9.0
+
+	:param records:
+	:param fp: A file opened for writing in text mode.
+
+	:return: The number of records written.
+	"""
+
+	count = 0
+
+	for ref_data in records:
+		fp.write(format_msp_record(ref_data))
+		fp.write("\n\n")
+		count += 1
+
+	return count
+
+
+def _parse_peak_column(tokens: List[bytes]) -> numpy.ndarray:
+	"""
+	Parse a column of peak values, as integers if possible and otherwise as floats.
+
+	:param tokens:
+	"""
+
+	text = b' '.join(tokens)
+
+	for dtype in (numpy.int64, numpy.float64):
+		if dtype is numpy.int64 and (b'.' in text or b'e' in text or b'E' in text):
+			continue
+
+		try:
+			values = numpy.fromstring(text, dtype=dtype, sep=' ')
+		except ValueError:
+			continue
+
+		if values.size == len(tokens):
+			return values
+
+	raise ValueError(f"Invalid value in MSP peak list: {text.decode('UTF-8', errors='replace')!r}")
+
+
+def _parse_peaks(peak_lines: List[bytes]) -> MassSpectrum:
+	"""
+	Parse the peak lines of an MSP record into a mass spectrum.
+
+	:param peak_lines:
+	"""
+
+	data = b' '.join(peak_lines)
+
+	if b'"' in data:
+		data = _peak_annotations.sub(b' ', data)
+
+	tokens = data.translate(_peak_separators).split()
+
+	if len(tokens) % 2:
+		raise ValueError(f"Unpaired mass/intensity value in MSP peak list: {tokens[-1]!r}")
+
+	return MassSpectrum(_parse_peak_column(tokens[0::2]), _parse_peak_column(tokens[1::2]))
+
+
+def _make_reference_data(
+		fields: Dict[str, Any],
+		synonyms: List[str],
+		peak_lines: Optional[List[bytes]],
+		) -> ReferenceData:
+	if synonyms:
+		fields["synonyms"] = synonyms
+
+	mw = fields.pop("mw", None)
+	if mw:
+		fields["mw"] = float(mw)
+
+	nist_no = fields.pop("nist_no", None)
+	if nist_no:
+		fields["nist_no"] = int(nist_no)
+
+	ref_data = ReferenceData(**fields)
+
+	if peak_lines:
+		# The spectrum is not shared with anything else, so there is no need for ReferenceData to copy it.
+		ref_data._mass_spec = _parse_peaks(peak_lines)
+
+	return ref_data
+
+
+def _iter_msp_lines(
+		lines: Iterable[bytes],
+		fields: frozenset,
+		spectra: bool,
+		encoding: str,
+		) -> Iterator[ReferenceData]:
+	record: Dict[str, Any] = {}
+	synonyms: List[str] = []
+	peak_lines: List[bytes] = []
+	in_record = False
+	in_peaks = False
+
+	for line in lines:
+		line = line.strip()
+
+		if not line:
+			# End of record
+			if in_record:
+				yield _make_reference_data(record, synonyms, peak_lines)
+				record, synonyms, peak_lines = {}, [], []
+				in_record = in_peaks = False
+			continue
+
+		if in_peaks:
+			if line[:5].lower() != b"name:":
+				if spectra:
+					peak_lines.append(line)
+				continue
+
+			# The next record started without a blank line
+			yield _make_reference_data(record, synonyms, peak_lines)
+			record, synonyms, peak_lines = {}, [], []
+			in_peaks = False
+
+		in_record = True
+
+		key, sep, value = line.partition(b':')
+		if not sep:
+			continue
+
+		key = key.strip().lower()
+
+		if key == b"num peaks":
+			in_peaks = True
+			continue
+
+		# NIST MS Search puts several values on a single line, e.g. ``CAS#: 50-00-0;  NIST#: 19016``
+		while b';' in value and key not in _free_text_keys:
+			value, _, remainder = value.partition(b';')
+			field = _msp_keys.get(key)
+			if field is not None and field in fields:
+				record[field] = value.strip().decode(encoding)
+
+			key, sep, value = remainder.partition(b':')
+			if not sep:
+				break
+			key = key.strip().lower()
+		else:
+			field = _msp_keys.get(key)
+			if field == "synonyms":
+				if field in fields:
+					synonyms.append(value.strip().decode(encoding))
+			elif field is not None and field in fields:
+				record[field] = value.strip().decode(encoding)
+
+	if in_record:
+		yield _make_reference_data(record, synonyms, peak_lines)
+
+
+def iter_msp(
+		filename: PathLike,
+		use_mmap: bool = False,
+		fields: Optional[Iterable[str]] = None,
+		spectra: bool = True,
+		encoding: str = "UTF-8",
+		) -> Iterator[ReferenceData]:
+	"""
+	Iterate over the records in an MSP file, yielding a :class:`~.ReferenceData` object for each.
+
+	The file is read line by line and records are parsed as they are reached,
+	so memory usage does not depend on the size of the file.
+
+	.. versionadded:: 0.9.0
+
+	:param filename: The MSP file to read.
+	:param use_mmap: Whether to memory-map the file rather than reading it through a buffered file object.
+		This may be faster for very large files.
+	:param fields: The fields to read (see :py:obj:`~.msp_fields`).
+		Other fields are skipped without being decoded and have their default values.
+		If :py:obj:`None` all fields are read.
+	:param spectra: Whether to read the mass spectra. If :py:obj:`False` the ``mass_spec`` of each record is :py:obj:`None`.
+	:param encoding: The encoding of the file.
+	"""
+
+	if fields is None:
+		wanted_fields = msp_fields
+	else:
+		wanted_fields = frozenset(fields)
+		unknown_fields = wanted_fields - msp_fields
+		if unknown_fields:
+			raise ValueError(f"Unknown MSP field(s): {', '.join(sorted(unknown_fields))}")
+
+	with open(filename, "rb") as fp:
+		if use_mmap:
+			try:
+				mapped_file = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+			except ValueError:
+				# Empty files cannot be memory-mapped
+				return
+
+			with mapped_file:
+				yield from _iter_msp_lines(iter(mapped_file.readline, b''), wanted_fields, spectra, encoding)
+		else:
+			yield from _iter_msp_lines(fp, wanted_fields, spectra, encoding)
@@ -67,6 +67,7 @@ This file is a modified version of the CALLDLL.C files from
 #include <string.h>
 #include <ctype.h>
 #include <memory.h>
+#include <time.h>
 #include <io.h>
 
 #include "NISTMS.H"
@@ -81,6 +82,32 @@ This file is a modified version of the CALLDLL.C files from
 /*  This value MUST be >= 120 */
 #endif
 
+#define MAX_SCREEN_LOCS NISTMS_MAX_FPOS /* 6000 = largest number of tentative hits from the screen search (pre-search) */
+#define MAX_HITS_RETURNED MAX_LIB_SRCH_HITS
+#define MAX_ANY_PEAKS 10 /* largest number of peaks in an any peak search */
+
+/* Reasons for the callback aborting a search */
+#define SEARCH_NOT_ABORTED 0
+#define SEARCH_TIMED_OUT 1
+#define SEARCH_CANCELLED 2
+
+/* Statistics for the library searches made by the most recent search call */
+typedef struct {
+	int presearch;			 /* the pre-search option used */
+	long num_searches;		 /* the number of spectra searched */
+	long num_candidates;	 /* the number of spectra passing the pre-search */
+	long num_compared;		 /* the number of spectra compared with the search spectrum, after the pre-search */
+	long num_hits;			 /* the number of hits found */
+	long num_callbacks;		 /* the number of times the DLL called CallBack */
+	clock_t presearch_time;	 /* time spent in the pre-search */
+	clock_t compare_time;	 /* time spent comparing spectra */
+} SEARCH_STATS;
+
+/* Pre-search (screen search) options */
+#define PRESEARCH_OFF 0		/* compare every spectrum in the libraries (NISTMS_NO_PRE_SRCH) */
+#define PRESEARCH_DEFAULT 1 /* screen the libraries, then compare the candidates */
+#define PRESEARCH_FAST 2	/* as PRESEARCH_DEFAULT, but with SEARCH_MODE_FLAG_FAST_PRESEARCH */
+
 /* Take a slice from an array of chars (`str`) between `start` and `end` and put it in `buffer` */
 void slice_str(const unsigned char *str, unsigned char *buffer, size_t start, size_t end) {
 	size_t j = 0;
@@ -96,15 +123,46 @@ void slice_str(const unsigned char *str, unsigned char *buffer, size_t start, si
 void NISTMS_C_EXPORT nistms_search(NISTMS_SEARCH_TYPE srch_type, NISTMS_IO *io);
 
 static PyObject *spec_search(PyObject *self, PyObject *args);
-static PyObject *spectrum_search(NISTMS_IO *pio, int search_type, char *spectrum);
+static PyObject *spectrum_search(
+	NISTMS_IO *pio, int presearch, char *spectrum, PyObject *py_controls, PyObject *py_constraints
+	);
 
 static PyObject *full_spec_search(PyObject *self, PyObject *args);
-static PyObject *full_spectrum_search(NISTMS_IO *pio, char *spectrum);
-
+static PyObject *screen_search(PyObject *self, PyObject *args);
+static PyObject *full_spec_search_batch(PyObject *self, PyObject *args);
+static PyObject *full_spectrum_search(
+	NISTMS_IO *pio, char *spectrum, PyObject *py_controls, PyObject *py_constraints, int screen_only
+	);
+static int run_library_search(
+	NISTMS_IO *pio, int presearch, NISTMS_CONSTRAINTS *constraints, int screen_only, double timeout
+	);
+static int search_library(
+	NISTMS_IO *pio, int presearch, NISTMS_CONSTRAINTS *constraints, int screen_only, double timeout
+	);
+static int do_search_library(NISTMS_IO *pio, int presearch, NISTMS_CONSTRAINTS *constraints, int screen_only);
+static void set_search_error(int error_code);
+static void reset_search_stats(int presearch);
+static PyObject *get_search_stats(PyObject *self, PyObject *args);
+static PyObject *cancel_search(PyObject *self, PyObject *args);
+
+static int apply_search_controls(PyObject *py_controls, NISTMS_SRCH_CONTROLS *cntls, int *presearch, double *timeout);
+static void clear_constraints(NISTMS_CONSTRAINTS *cons);
+static int parse_constraints(PyObject *py_constraints, NISTMS_CONSTRAINTS *cons);
+
+static int dict_set_item_steal(PyObject *dict, const char *key, PyObject *value);
+static int list_append_steal(PyObject *list, PyObject *value);
+static PyObject *build_hit_record(NISTMS_HIT_LIST *hits, int index, int cas_search);
+static PyObject *build_hit_list(NISTMS_HIT_LIST *hits, int cas_search);
+static PyObject *build_spec_loc_list(NISTMS_HIT_LIST *hits);
+
+static PyObject *build_reference_record(NISTMS_IO *pio, NISTMS_RECLOC input_spec_loc);
 static PyObject *get_reference_data(PyObject *self, PyObject *args);
+static PyObject *get_reference_data_many(PyObject *self, PyObject *args);
 
 // static PyObject *get_lib_paths(PyObject *self, PyObject *args);
 static PyObject *get_active_libs(PyObject *self, PyObject *args);
+static PyObject *seq_id_search(PyObject *self, PyObject *args);
+static PyObject *any_peak_search(PyObject *self, PyObject *args);
 
 /* loads a single spectrum from a string */
 static int parse_spectrum(NISTMS_MASS_SPECTRUM *ms, NISTMS_AUX_DATA *aux_data, char *spectrum);
@@ -129,6 +187,14 @@ NISTMS_CONSTRAINTS constraints;
 
 int g_bDisplayMsgLine; /* flag for the callback function */
 
+/* for aborting searches from the callback function */
+static volatile int g_bCancelSearch;  /* set by _cancel_search, possibly from another thread */
+static clock_t g_search_deadline;	  /* clock() value after which the search is aborted; 0 for no deadline */
+static int g_search_aborted;		  /* SEARCH_TIMED_OUT or SEARCH_CANCELLED if the callback aborted the search */
+
+/* statistics returned by _get_search_stats */
+static SEARCH_STATS g_search_stats;
+
 static unsigned char g_synonyms[NISTMS_MAXSYNONYMLEN]; /*  optional */
 
 static char g_contributor[NISTMS_MAXCONTRIBLEN];
@@ -158,6 +224,7 @@ Windows call is introduced here, it will allow task switching.
 void NISTMS_CALLBACK CallBack(IQ *p) {
 
 	extern int g_bDisplayMsgLine;
+	g_search_stats.num_callbacks++;
 	switch (p->WhatToDo) {
 		case WRITE_MSGLINE_:
 			/* show progess using string in p->String; */
@@ -166,6 +233,13 @@ void NISTMS_CALLBACK CallBack(IQ *p) {
 			break;
 		case TEST_CANCEL_:
 			/* set p->ReturnValue=1 to abort processing */
+			if (g_bCancelSearch) {
+				g_search_aborted = SEARCH_CANCELLED;
+				p->ReturnValue = 1;
+			} else if (g_search_deadline && clock() > g_search_deadline) {
+				g_search_aborted = SEARCH_TIMED_OUT;
+				p->ReturnValue = 1;
+			}
 			break;
 	}
 	return;
@@ -180,9 +254,18 @@ static PyObject *spec_search(PyObject *self, PyObject *args) {
 	char *my_test;
 	int test_len;
 	PyObject *py_hit_list;
+	PyObject *py_controls = Py_None;
+	PyObject *py_constraints = Py_None;
+
+	if (!PyArg_ParseTuple(args, "s|OO", &test, &py_controls, &py_constraints)) {
+		return NULL;
+	}
 
-	int ok = PyArg_ParseTuple(args, "s", &test);
-	my_test = (char *)malloc(strlen(test) * sizeof('a'));
+	// Allow space for the terminating null byte
+	my_test = (char *)malloc((strlen(test) + 1) * sizeof('a'));
+	if (my_test == NULL) {
+		return PyErr_NoMemory();
+	}
 	strcpy(my_test, test);
 	test_len = strlen(my_test);
 
@@ -192,12 +275,14 @@ static PyObject *spec_search(PyObject *self, PyObject *args) {
 		}
 	}
 
-	py_hit_list = spectrum_search(&io, NISTMS_NO_PRE_SRCH, my_test);
+	py_hit_list = spectrum_search(&io, PRESEARCH_OFF, my_test, py_controls, py_constraints);
 	free(my_test);
 	return py_hit_list;
 }
 
-static PyObject *spectrum_search(NISTMS_IO *pio, int search_type, char *spectrum) {
+static PyObject *spectrum_search(
+	NISTMS_IO *pio, int presearch, char *spectrum, PyObject *py_controls, PyObject *py_constraints
+	) {
 
 	static NISTMS_CONSTRAINTS constraints;
 	static NISTMS_MASS_SPECTRUM userms; /*  contains unknown spectrum */
@@ -223,7 +308,7 @@ static PyObject *spectrum_search(NISTMS_IO *pio, int search_type, char *spectrum
 	3) to receive an ordered hit list
 	*/
 
-	static NISTMS_RECLOC fpos_array[MAX_NOPRESRCH_HITS];
+	static NISTMS_RECLOC fpos_array[MAX_SCREEN_LOCS];
 
 	/*     REQUIRED for library search */
 	static int sim_num[MAX_NOPRESRCH_HITS];
@@ -246,6 +331,7 @@ static PyObject *spectrum_search(NISTMS_IO *pio, int search_type, char *spectrum
 	//	static long *casnos[MAX_HITS_RETURNED];
 
 	int i;
+	double timeout = 0;
 	//	int best_score = 0 ;
 
 	/* OPTIONAL; for finding hits satisfying constraints */
@@ -331,6 +417,10 @@ static PyObject *spectrum_search(NISTMS_IO *pio, int search_type, char *spectrum
 	cntls.pep_bNumReplicates = 0; /* Use number of Replicates = No */
 	cntls.pep_bQ_TOF = 0;
 
+	if (apply_search_controls(py_controls, &cntls, &presearch, &timeout) < 0) {
+		return NULL;
+	}
+
 	/*  attach allocated buffers to input/output structure */
 	pio->userms = &userms; /*  input mass spectrum */
 	pio->cntls = &cntls;   /*  type of search */
@@ -338,8 +428,6 @@ static PyObject *spectrum_search(NISTMS_IO *pio, int search_type, char *spectrum
 	/* prepare hit list to receive spectrum pointers */
 	pio->hit_list = &hit_list;			   /* hit list */
 	pio->hit_list->spec_locs = fpos_array; /* spectrum pointers */
-	pio->hit_list->max_spec_locs = MAX_NOPRESRCH_HITS;
-	pio->hit_list->max_hits_desired = MAX_NOPRESRCH_HITS;
 
 	/* prepare hit list to receive spectrum compare results */
 	pio->hit_list->sim_num = sim_num;
@@ -358,100 +446,476 @@ static PyObject *spectrum_search(NISTMS_IO *pio, int search_type, char *spectrum
 	hit_list.stru_pos = NULL; /* no structures available in Peptide libraries */
 	hit_list.casnos = NULL;	  /* no CAS r.n. available in Peptide libraries */
 
-	pio->constraints = NULL; /*  no constraints */
+	if (py_constraints != Py_None && parse_constraints(py_constraints, &constraints) < 0) {
+		return NULL;
+	}
 
 	/* if these were uncommented, hits would be subject to various peptide-specific constraints*/
-	// io.constraints = &constraints;
-	// clear_constraints(io.constraints);              // disable all constraints
 	// set_pep_constraints(io.constraints); // add peptide-specific constraints
-	// printf("%d is the search_type\n",search_type) ;
 
-	nistms_search(search_type, pio);
+	if (run_library_search(pio, presearch, py_constraints == Py_None ? NULL : &constraints, 0, timeout) < 0) {
+		return NULL;
+	}
+
+	return build_hit_list(pio->hit_list, 0);
+}
+
+/*
+Searches the active libraries for the spectrum in `pio->userms`, raising an exception if the search failed.
+See search_library for details.
+Returns -1 with an exception set if the search failed.
+*/
+static int run_library_search(
+	NISTMS_IO *pio, int presearch, NISTMS_CONSTRAINTS *constraints, int screen_only, double timeout
+	) {
+	int error_code;
+
+	if (presearch == PRESEARCH_OFF && screen_only) {
+		PyErr_SetString(PyExc_ValueError, "The pre-search cannot be turned off for a screen search");
+		return -1;
+	}
+
+	g_bCancelSearch = 0;
+	reset_search_stats(presearch);
+	error_code = search_library(pio, presearch, constraints, screen_only, timeout);
+	if (error_code != 0 || g_search_aborted != SEARCH_NOT_ABORTED) {
+		set_search_error(error_code);
+		return -1;
+	}
+
+	return 0;
+}
+
+/*
+Sets the exception for a failed library search: TimeoutError if the deadline passed,
+or RuntimeError if the search was cancelled or the DLL returned an error.
+*/
+static void set_search_error(int error_code) {
+	switch (g_search_aborted) {
+		case SEARCH_TIMED_OUT:
+			PyErr_SetString(PyExc_TimeoutError, "The search did not finish before the timeout");
+			break;
+		case SEARCH_CANCELLED:
+			PyErr_SetString(PyExc_RuntimeError, "The search was cancelled");
+			break;
+		default:
+			PyErr_Format(PyExc_RuntimeError, "Spectrum search returned error code %d\n", error_code);
+	}
+}
+
+/*
+Clears the search statistics, ready for a new search call.
+*/
+static void reset_search_stats(int presearch) {
+	memset(&g_search_stats, 0, sizeof(g_search_stats));
+	g_search_stats.presearch = presearch;
+}
+
+/*
+Returns the statistics for the most recent search call as a dictionary.
+The counts and times are totals for all of the spectra searched by that call.
+`num_candidates` and `num_compared` are None if the pre-search was off, as the DLL does not report them.
+*/
+static PyObject *get_search_stats(PyObject *self, PyObject *Py_UNUSED(args)) {
+	static const char *presearch_names[] = { "off", "default", "fast" };
+	PyObject *py_num_candidates;
+	PyObject *py_num_compared;
+
+	if (g_search_stats.presearch == PRESEARCH_OFF) {
+		py_num_candidates = Py_None;
+		py_num_compared = Py_None;
+		Py_INCREF(Py_None);
+		Py_INCREF(Py_None);
+	} else {
+		py_num_candidates = PyLong_FromLong(g_search_stats.num_candidates);
+		py_num_compared = PyLong_FromLong(g_search_stats.num_compared);
+	}
+
+	// Py_BuildValue steals the references with "N"
+	return Py_BuildValue(
+		"{s:s,s:l,s:N,s:N,s:l,s:l,s:d,s:d}",
+		"presearch",
+		presearch_names[g_search_stats.presearch],
+		"num_searches",
+		g_search_stats.num_searches,
+		"num_candidates",
+		py_num_candidates,
+		"num_compared",
+		py_num_compared,
+		"num_hits",
+		g_search_stats.num_hits,
+		"num_callbacks",
+		g_search_stats.num_callbacks,
+		"presearch_time",
+		(double)g_search_stats.presearch_time / CLOCKS_PER_SEC,
+		"compare_time",
+		(double)g_search_stats.compare_time / CLOCKS_PER_SEC
+		);
+}
+
+/*
+Cancels the library search in progress, if any.
+
+The GIL is held for the whole of most searches, so only searches which release it
+(such as _full_spectrum_search_batch with `release_gil`) can be cancelled from another thread.
+*/
+static PyObject *cancel_search(PyObject *self, PyObject *Py_UNUSED(args)) {
+	g_bCancelSearch = 1;
+	Py_RETURN_NONE;
+}
+
+/*
+Searches the active libraries for the spectrum in `pio->userms` using the controls in `pio->cntls`.
+The buffers of `pio->hit_list` must already be attached, and be able to hold MAX_NOPRESRCH_HITS hits.
+
+With the pre-search off every spectrum in the libraries is compared with the search spectrum (NISTMS_NO_PRE_SRCH).
+Otherwise the screen search first selects the candidate spectra, and only those are compared.
+If `screen_only` is set the candidates are left in `pio->hit_list->spec_locs` without being compared.
+
+Hits which do not satisfy `constraints` (if not NULL) are discarded when the spectra are compared.
+
+If `timeout` is positive the search is aborted by the callback after that many seconds,
+and it is also aborted if _cancel_search is called. g_search_aborted gives the reason.
+
+The counts and times for the search are added to g_search_stats.
+
+This does not use the Python API, so may be called with the GIL released.
+Returns the error code of the search if it failed, otherwise 0.
+*/
+static int search_library(
+	NISTMS_IO *pio, int presearch, NISTMS_CONSTRAINTS *constraints, int screen_only, double timeout
+	) {
+	int error_code;
+
+	/* CallBack is registered with the DLL by do_init_api, and reads the deadline from here */
+	g_search_aborted = SEARCH_NOT_ABORTED;
+	g_search_deadline = timeout > 0 ? clock() + (clock_t)(timeout * CLOCKS_PER_SEC) : 0;
+
+	error_code = do_search_library(pio, presearch, constraints, screen_only);
+
+	g_search_deadline = 0;
+
+	return error_code;
+}
+
+/*
+Performs the search steps for search_library.
+*/
+static int do_search_library(NISTMS_IO *pio, int presearch, NISTMS_CONSTRAINTS *constraints, int screen_only) {
+	clock_t start_time = clock();
+
+	g_search_stats.num_searches++;
+
+	if (presearch == PRESEARCH_OFF) {
+		pio->hit_list->max_spec_locs = MAX_NOPRESRCH_HITS;
+		pio->hit_list->max_hits_desired = MAX_NOPRESRCH_HITS;
+		pio->constraints = constraints;
+
+		nistms_search(NISTMS_NO_PRE_SRCH, pio);
+
+		g_search_stats.compare_time += clock() - start_time;
+		if (!pio->error_code) {
+			g_search_stats.num_hits += pio->hit_list->num_hits_found;
+		}
+		return pio->error_code;
+	}
+
+	pio->hit_list->max_spec_locs = MAX_SCREEN_LOCS;
+	pio->hit_list->max_hits_desired = MAX_HITS_RETURNED;
+
+	/* Constraints are applied when the spectra are compared */
+	pio->constraints = NULL;
+
+	/*  Screen ("pre-search") retrieves set of tentative hits */
+	nistms_search(NISTMS_SCREEN_SRCH, pio);
+	g_search_stats.presearch_time += clock() - start_time;
 
 	switch (pio->error_code) {
 		case 0:
 			break;
+
+		case WRN_TOO_MANY_HITS:
+			/* pre-search cannot return more than 6000 hits */
+			/* This warning may occur if the spectrum has only few peaks. */
+		case ERR_MAX_SPEC_LOCS_TOO_SMALL:
+			/* To lose less hits increase pio->hit_list->spec_locs length*/
+			printf(
+				"Warning: Too many hits after pre-search. Only %d will be compared.\n",
+				pio->hit_list->num_hits_found
+				);
+			break;
 		default:
-			PyErr_Format(PyExc_RuntimeError, "Spectrum search returned error code %d\n", pio->error_code);
-			return NULL;
+			return pio->error_code;
 	};
 
-	PyObject *py_hit_list = PyList_New(0);
+	g_search_stats.num_candidates += pio->hit_list->num_hits_found;
+
+	if (screen_only) {
+		return 0;
+	}
+
+	g_search_stats.num_compared += pio->hit_list->num_hits_found;
+
+	/* only hits satisfying the constraints are retrieved */
+	pio->constraints = constraints;
 
-	if (pio->hit_list->num_hits_found) {
-		int best_score = pio->hit_list->sim_num[0];
+	/*  compare complete user and library spectra found by pre-search */
+	start_time = clock();
+	nistms_search(NISTMS_COMPARE_SPECTRA_SRCH, pio);
 
-		// printf("%d\n", best_score);
-		// printf("%d\n", pio->hit_list->num_hits_found);
+	g_search_stats.compare_time += clock() - start_time;
+	if (!pio->error_code) {
+		g_search_stats.num_hits += pio->hit_list->num_hits_found;
+	}
+	return pio->error_code;
+}
 
-		int name_len = pio->hit_list->max_one_lib_name_len;
-		unsigned char *raw_hit_names = pio->hit_list->lib_names;
+/*
+Overrides the search controls, the pre-search option in `presearch` and the timeout (in seconds) in `timeout`
+with the values in the `py_controls` dictionary.
+Keys which are not present in the dictionary are left unchanged.
+Returns -1 with an exception set if the controls are invalid.
+*/
+static int apply_search_controls(PyObject *py_controls, NISTMS_SRCH_CONTROLS *cntls, int *presearch, double *timeout) {
+	static const char *keys[] = { "min_mass", "max_mass", "min_abund", "user_mw", "impure" };
+	int *fields[] = { &cntls->min_mass, &cntls->max_mass, &cntls->min_abund, &cntls->user_mw, &cntls->impure };
+	PyObject *py_option;
+	const char *option;
+
+	if (py_controls == Py_None) {
+		return 0;
+	}
 
-		for (int i = 0; i < pio->hit_list->num_hits_found; i++) {
-			PyObject *d = PyDict_New();
+	if (!PyDict_Check(py_controls)) {
+		PyErr_SetString(PyExc_TypeError, "Search controls must be a dictionary");
+		return -1;
+	}
 
-			// printf("%d, ", i);
+	// The search mode letter is replaced, but any search mode flags are kept
+	py_option = PyDict_GetItemString(py_controls, "search_mode"); // borrowed reference
+	if (py_option != NULL) {
+		option = PyUnicode_AsUTF8(py_option);
+		if (option == NULL) {
+			return -1;
+		}
 
-			PyObject *py_sim_num = PyLong_FromLong(pio->hit_list->sim_num[i]);
-			PyDict_SetItemString(d, "sim_num", py_sim_num);
-			// printf("%d, ", pio->hit_list->sim_num[i]);
+		if (strlen(option) != 1 || strchr("IQSHLM", option[0]) == NULL) {
+			PyErr_Format(PyExc_ValueError, "Unsupported search mode '%s'", option);
+			return -1;
+		}
 
-			PyObject *py_rev_sim_num = PyLong_FromLong(pio->hit_list->rev_sim_num[i]);
-			PyDict_SetItemString(d, "rev_sim_num", py_rev_sim_num);
-			// printf("%d, ", pio->hit_list->rev_sim_num[i]);
+		cntls->search_mode = (cntls->search_mode & ~SEARCH_MODE_CHAR_MASK) | option[0];
+	}
 
-			PyObject *py_hit_prob = PyLong_FromLong(pio->hit_list->hit_prob[i]);
-			PyDict_SetItemString(d, "hit_prob", py_hit_prob);
-			// printf("%d, ", pio->hit_list->hit_prob[i]);
+	py_option = PyDict_GetItemString(py_controls, "presearch"); // borrowed reference
+	if (py_option != NULL) {
+		option = PyUnicode_AsUTF8(py_option);
+		if (option == NULL) {
+			return -1;
+		}
 
-			// PyObject *py_in_library_prob = PyLong_FromLong(pio->hit_list->in_library_prob[i]);
-			// PyDict_SetItemString(d, "in_library_prob", py_in_library_prob);
-			// printf("%d, ", pio->hit_list->in_library_prob[i]);
+		if (strcmp(option, "off") == 0) {
+			*presearch = PRESEARCH_OFF;
+		} else if (strcmp(option, "default") == 0) {
+			*presearch = PRESEARCH_DEFAULT;
+		} else if (strcmp(option, "fast") == 0) {
+			*presearch = PRESEARCH_FAST;
+		} else {
+			PyErr_Format(PyExc_ValueError, "Unsupported pre-search option '%s'", option);
+			return -1;
+		}
+	}
 
-			int start_byte = i * name_len;
-			int end_byte = start_byte + name_len;
-			unsigned char buffer[MAX_NAME_LEN]; // Should be much larger than needed
-												//			slice_str(raw_hit_names, buffer, start_byte, end_byte);
+	py_option = PyDict_GetItemString(py_controls, "timeout"); // borrowed reference
+	if (py_option != NULL) {
+		*timeout = PyFloat_AsDouble(py_option);
+		if (*timeout == -1.0 && PyErr_Occurred()) {
+			return -1;
+		}
+	}
 
-			PyObject *py_hit_name_char_list = PyList_New(0);
+	if (*presearch == PRESEARCH_FAST) {
+		cntls->search_mode |= SEARCH_MODE_FLAG_FAST_PRESEARCH;
+	} else {
+		cntls->search_mode &= ~SEARCH_MODE_FLAG_FAST_PRESEARCH;
+	}
 
-			// Fix for Wine crash
-			for (size_t i = start_byte; i <= end_byte; ++i) {
-				PyList_Append(py_hit_name_char_list, PyLong_FromLong(raw_hit_names[i]));
-			}
+	for (int i = 0; i < 5; i++) {
+		PyObject *py_value = PyDict_GetItemString(py_controls, keys[i]); // borrowed reference
+		long value;
 
-			// for (int i = 0; i <= MAX_NAME_LEN; i++) {
-			// 	PyList_Append(py_hit_name_char_list, PyLong_FromLong(buffer[i]));
-			// }
+		if (py_value == NULL) {
+			continue;
+		}
 
-			PyDict_SetItemString(d, "hit_name_chars", py_hit_name_char_list);
+		value = PyLong_AsLong(py_value);
+		if (value == -1 && PyErr_Occurred()) {
+			return -1;
+		}
 
-			// PyObject *py_hit_name = PyUnicode_FromFormat("%s", buffer);
-			// PyDict_SetItemString(d, "hit_name", py_hit_name);
+		*fields[i] = (int)value;
+	}
 
-			// printf("%ld, ", pio->hit_list->stru_pos[i]);
+	return 0;
+}
 
-			// printf("%ld, ", pio->hit_list->spec_locs[i]);
+/*
+Disables all constraints.
+*/
+static void clear_constraints(NISTMS_CONSTRAINTS *cons) {
+	memset((void *)cons, '\0', sizeof(*cons));
+
+	cons->mw_min = NO_VALUE;
+	cons->mw_max = NO_VALUE;
+	cons->mode_el_list = NISTMS_ELS_IN_LIST;
+	cons->mode_peaks = NISTMS_ABS_PEAKS;
+
+	#if (MSTXTDATA == 1)
+	cons->pep_min_charge = NO_VALUE;
+	cons->pep_max_charge = NO_VALUE;
+	cons->pep_min_protons = NO_VALUE;
+	cons->pep_max_protons = NO_VALUE;
+	cons->pep_min_residues = NO_VALUE;
+	cons->pep_max_residues = NO_VALUE;
+	#endif
+}
 
-			PyObject *py_spec_loc = PyLong_FromLong(pio->hit_list->spec_locs[i]);
-			PyDict_SetItemString(d, "spec_loc", py_spec_loc);
+/*
+Returns a new reference to the sequence in `py_constraints` under `key` as a fast sequence,
+or NULL with an exception set.
+*/
+static PyObject *get_constraint_sequence(PyObject *py_constraints, const char *key) {
+	PyObject *py_value = PyDict_GetItemString(py_constraints, key); // borrowed reference
+	PyObject *py_seq;
 
-			PyObject *py_lib_idx = PyLong_FromLong(NISTMS_LIB_NUM(hit_list.spec_locs[i]));
-			PyDict_SetItemString(d, "lib_idx", py_lib_idx);
+	if (py_value == NULL) {
+		return PyList_New(0);
+	}
 
-			if (pio->hit_list->casnos) {
-				PyDict_SetItemString(d, "cas_no", PyLong_FromLong(pio->hit_list->casnos[i]));
-			} else {
-				PyDict_SetItemString(d, "cas_no", PyLong_FromLong(0));
-			}
+	py_seq = PySequence_Fast(py_value, "Constraint values must be sequences");
+	if (py_seq == NULL) {
+		return NULL;
+	}
+
+	if (PySequence_Fast_GET_SIZE(py_seq) > NISTMS_NUM_CONSTR_EL) {
+		PyErr_Format(PyExc_ValueError, "At most %d values may be given for the '%s' constraint", NISTMS_NUM_CONSTR_EL, key);
+		Py_DECREF(py_seq);
+		return NULL;
+	}
+
+	return py_seq;
+}
+
+/*
+Fills `cons` from the `py_constraints` dictionary (see SearchConstraints.to_pynist).
+Returns -1 with an exception set if the constraints are invalid.
+*/
+static int parse_constraints(PyObject *py_constraints, NISTMS_CONSTRAINTS *cons) {
+	PyObject *py_value;
+	PyObject *py_seq;
+	Py_ssize_t num_items;
+
+	if (!PyDict_Check(py_constraints)) {
+		PyErr_SetString(PyExc_TypeError, "Search constraints must be a dictionary");
+		return -1;
+	}
+
+	clear_constraints(cons);
+
+	// Molecular weight range
+	if ((py_value = PyDict_GetItemString(py_constraints, "mw_min")) != NULL) {
+		cons->mw_min = (unsigned int)PyLong_AsUnsignedLong(py_value);
+		if (PyErr_Occurred()) {
+			return -1;
+		}
+	}
+
+	if ((py_value = PyDict_GetItemString(py_constraints, "mw_max")) != NULL) {
+		cons->mw_max = (unsigned int)PyLong_AsUnsignedLong(py_value);
+		if (PyErr_Occurred()) {
+			return -1;
+		}
+	}
+
+	// Permitted elements
+	if ((py_value = PyDict_GetItemString(py_constraints, "elements_mode")) != NULL) {
+		cons->mode_el_list = (int)PyLong_AsLong(py_value);
+		if (PyErr_Occurred()) {
+			return -1;
+		}
+	}
+
+	if ((py_seq = get_constraint_sequence(py_constraints, "elements")) == NULL) {
+		return -1;
+	}
+
+	num_items = PySequence_Fast_GET_SIZE(py_seq);
+	for (Py_ssize_t i = 0; i < num_items; i++) {
+		const char *symbol = PyUnicode_AsUTF8(PySequence_Fast_GET_ITEM(py_seq, i));
+		if (symbol == NULL) {
+			Py_DECREF(py_seq);
+			return -1;
+		}
+		strncpy(cons->el_list[i], symbol, NISTMS_LEN_CONSTR_EL);
+	}
+	cons->num_el_list = (int)num_items;
+	Py_DECREF(py_seq);
+
+	// Numbers of atoms of each element
+	if ((py_seq = get_constraint_sequence(py_constraints, "element_counts")) == NULL) {
+		return -1;
+	}
+
+	num_items = PySequence_Fast_GET_SIZE(py_seq);
+	for (Py_ssize_t i = 0; i < num_items; i++) {
+		const char *symbol;
+		const char *sign;
+		int count;
+
+		if (!PyArg_ParseTuple(PySequence_Fast_GET_ITEM(py_seq, i), "ssi", &symbol, &sign, &count)) {
+			Py_DECREF(py_seq);
+			return -1;
+		}
+
+		strncpy(cons->comp_list[i], symbol, NISTMS_LEN_CONSTR_EL);
+		cons->sign[i] = sign[0];
+		cons->num_each_el[i] = count;
+	}
+	cons->num_atom_comp = (int)num_items;
+	Py_DECREF(py_seq);
+
+	// Required peaks
+	if ((py_value = PyDict_GetItemString(py_constraints, "peaks_mode")) != NULL) {
+		cons->mode_peaks = (int)PyLong_AsLong(py_value);
+		if (PyErr_Occurred()) {
+			return -1;
+		}
+	}
+
+	if ((py_seq = get_constraint_sequence(py_constraints, "peaks")) == NULL) {
+		return -1;
+	}
 
-			// printf("\n");
+	num_items = PySequence_Fast_GET_SIZE(py_seq);
+	for (Py_ssize_t i = 0; i < num_items; i++) {
+		unsigned int mass;
+		unsigned int abmin;
+		unsigned int abmax;
 
-			PyList_Append(py_hit_list, d);
+		if (!PyArg_ParseTuple(PySequence_Fast_GET_ITEM(py_seq, i), "III", &mass, &abmin, &abmax)) {
+			Py_DECREF(py_seq);
+			return -1;
 		}
+
+		cons->mass[i] = mass;
+		cons->abmin[i] = abmin;
+		cons->abmax[i] = abmax;
+		cons->peak_type[i] = 'N'; /* normal peak */
 	}
+	cons->num_other_peaks = (int)num_items;
+	Py_DECREF(py_seq);
 
-	return (py_hit_list);
+	return 0;
 }
 
 /****************************************************************************
@@ -486,83 +950,43 @@ static void build_hitlist(NISTMS_IO *pio) {
 	nistms_search(NISTMS_BUILD_HITLIST_SRCH, pio);
 }
 
-static PyObject *nist_cas_search(NISTMS_IO *pio, char query[]) {
+/*
+Performs a search of the library indices which takes a query string and fills the hit list,
+such as a CAS number, formula or molecular weight search, across all active libraries.
+*/
+static PyObject *nist_index_search(NISTMS_IO *pio, int search_type, char query[]) {
 
 	static NISTMS_HIT_LIST hit_list;
 	#define MAX_NUM_OF_OFFSETS MAX_FINAL_HITS /*  must be no more than current system limit of NISTMS_MAX_FPOS=6000 */
 
 	static NISTMS_RECLOC fpos_array[MAX_NUM_OF_OFFSETS];
-	int num_hits_found = 0;
 
 	pio->string_in = query;
+	pio->constraints = NULL;
 
 	memset((void *)&hit_list, '\0', sizeof(hit_list));
 	hit_list.spec_locs = fpos_array;
 	hit_list.max_spec_locs = MAX_NUM_OF_OFFSETS;
 	pio->hit_list = &hit_list;
 
-	nistms_search(NISTMS_CASNO_SRCH, pio);
+	nistms_search(search_type, pio);
 
 	if (pio->error_code) {
-		PyErr_Format(PyExc_RuntimeError, "Spectrum search returned error code %d\n", pio->error_code);
+		PyErr_Format(PyExc_RuntimeError, "Index search returned error code %d\n", pio->error_code);
 		return NULL;
 	}
 
-	if (pio->hit_list->num_hits_found) {
+	if (pio->hit_list->num_hits_found > 0) {
 		/*  get compound identification information for compounds retrieved above */
 		pio->hit_list->max_hits_desired = pio->hit_list->num_hits_found;
 		build_hitlist(pio);
-
-		num_hits_found = pio->hit_list->num_hits_found;
-	} else {
-		num_hits_found = -1; // no more spectra in sequential search
-	}
-
-	PyObject *py_hit_list = PyList_New(0);
-
-	if (pio->hit_list->num_hits_found) {
-
-		int name_len = pio->hit_list->max_one_lib_name_len;
-		unsigned char *raw_hit_names = pio->hit_list->lib_names;
-
-		for (int i = 0; i < pio->hit_list->num_hits_found; i++) {
-			PyObject *d = PyDict_New();
-
-			PyDict_SetItemString(d, "sim_num", PyLong_FromLong(0));
-			PyDict_SetItemString(d, "rev_sim_num", PyLong_FromLong(0));
-			PyDict_SetItemString(d, "hit_prob", PyLong_FromLong(0));
-
-			int start_byte = i * name_len;
-			int end_byte = start_byte + name_len;
-			unsigned char buffer[MAX_NAME_LEN]; // Should be much larger than needed
-
-			PyObject *py_hit_name_char_list = PyList_New(0);
-
-			// Fix for Wine crash
-			for (size_t i = start_byte; i <= end_byte; ++i) {
-				PyList_Append(py_hit_name_char_list, PyLong_FromLong(raw_hit_names[i]));
-			}
-
-			PyDict_SetItemString(d, "hit_name_chars", py_hit_name_char_list);
-
-			PyObject *py_spec_loc = PyLong_FromLong(pio->hit_list->spec_locs[i]);
-			PyDict_SetItemString(d, "spec_loc", py_spec_loc);
-
-			if (pio->hit_list->casnos) {
-				PyDict_SetItemString(d, "cas_no", PyLong_FromLong(pio->hit_list->casnos[i]));
-			} else {
-				PyDict_SetItemString(d, "cas_no", PyLong_FromLong(0));
-			}
-
-			PyList_Append(py_hit_list, d);
-		}
 	}
 
-	return (py_hit_list);
+	return build_hit_list(pio->hit_list, 1);
 }
 
 /*
-Takes Python objects as input and prepares them for passing to nist_cas_search
+Takes Python objects as input and prepares them for passing to nist_index_search
 */
 static PyObject *cas_search(PyObject *self, PyObject *args) {
 	char *query;
@@ -570,82 +994,435 @@ static PyObject *cas_search(PyObject *self, PyObject *args) {
 	if (!PyArg_ParseTuple(args, "s", &query))
 		return NULL;
 
-	return nist_cas_search(&io, query);
+	return nist_index_search(&io, NISTMS_CASNO_SRCH, query);
 }
 
 /*
-Takes Python objects as input and prepares them for passing to full_spectrum_search
+Searches the library indices with the given search type.
+Only the search types which return a hit list for a query string are permitted.
 */
-static PyObject *full_spec_search(PyObject *self, PyObject *args) {
-	int counter;
-	char *test;
-	char *my_test;
-	int test_len;
-	PyObject *py_hit_list;
+static PyObject *index_search(PyObject *self, PyObject *args) {
+	int search_type;
+	char *query;
 
-	int ok = PyArg_ParseTuple(args, "s", &test);
-	my_test = (char *)malloc(strlen(test) * sizeof('a'));
-	strcpy(my_test, test);
-	test_len = strlen(my_test);
+	if (!PyArg_ParseTuple(args, "is", &search_type, &query))
+		return NULL;
 
-	for (counter = 0; counter < test_len; counter += 1) {
-		if (my_test[counter] == '*') {
-			my_test[counter] = '\000';
-		}
+	switch (search_type) {
+		case NISTMS_CASNO_SRCH:
+		case NISTMS_CASNO_SRCH2:
+		case NISTMS_FORMULA_SRCH:
+		case NISTMS_MW_SRCH:
+		case NISTMS_NISTNO_SRCH:
+			break;
+		default:
+			PyErr_Format(PyExc_ValueError, "Unsupported index search type %d", search_type);
+			return NULL;
 	}
 
-	py_hit_list = full_spectrum_search(&io, my_test);
-	free(my_test);
-	return py_hit_list;
+	return nist_index_search(&io, search_type, query);
 }
 
-// /*
-// Returns the current list of libraries (delimited by NISTMS_PATH_SEPARATOR)
-// */
-// static PyObject *get_lib_paths(PyObject *self, PyObject *Py_UNUSED(args)) {
-// 	PyObject *py_lib_names = PyUnicode_FromString(lib_paths);
-// 	return py_lib_names;
-// }
-
 /*
-Returns the currently active libraries (in search order)
+Searches the name index of the library with the given (zero-based) index for compounds
+whose name or synonym matches `name`.
+
+Names are compared using the DLL's name keys, which ignore case, punctuation and spaces,
+and only consider the first 18 characters.
+The DLL only searches the name index of the first active library,
+so the active libraries are temporarily replaced for the duration of the search.
 */
-static PyObject *get_active_libs(PyObject *self, PyObject *Py_UNUSED(args)) {
-	PyObject *py_active_libs = PyList_New(0);
+static PyObject *name_search(PyObject *self, PyObject *args) {
+	int lib_idx;
+	char *query;
 
-	for (int pos = 0; pos < NISTMS_MAX_LIBS; pos++) {
-		PyList_Append(py_active_libs, PyLong_FromLong(active_libs[pos]));
+	#define MAX_NAME_HITS 100
+	#define NAME_KEY_LEN 32 /*  must be at least 20 */
+
+	static NISTMS_HIT_LIST hit_list;
+	static NISTMS_RECLOC fpos_array[MAX_NAME_HITS];
+	static char names[MAX_NAME_HITS * MAX_NAME_LEN];
+	static unsigned long id_nums[MAX_NAME_HITS];
+	static int name_pos[MAX_NAME_HITS];
+
+	NISTMS_INC_NAME_INFO name_info;
+	char query_key[NAME_KEY_LEN];
+	char name_key[NAME_KEY_LEN];
+	char id_string[32];
+	char name_active_libs[NISTMS_MAX_LIBS + 1];
+	int num_hits = 0;
+
+	if (!PyArg_ParseTuple(args, "is", &lib_idx, &query)) {
+		return NULL;
 	}
 
-	return py_active_libs;
-}
+	if (lib_idx < 0 || lib_idx >= NISTMS_MAX_LIBS || active_libs[lib_idx] == 0) {
+		PyErr_Format(PyExc_ValueError, "Invalid library index %d", lib_idx);
+		return NULL;
+	}
 
-// TODO: allow active libs to be changed without reinit
+	memset(name_active_libs, '\0', sizeof(name_active_libs));
+	name_active_libs[0] = active_libs[lib_idx];
+
+	memset((void *)&name_info, '\0', sizeof(name_info));
+	name_info.alpha_only = 0;
+	name_info.num_names_desired = MAX_NAME_HITS;
+	name_info.one_name_len = MAX_NAME_LEN;
+	name_info.names = names;
+	name_info.id_nums = id_nums;
+	name_info.name_pos = name_pos;
+
+	io.constraints = NULL;
+	io.active_libs = name_active_libs;
+	io.name_info = &name_info;
+
+	/* Convert the query into a name key */
+	memset(query_key, '\0', sizeof(query_key));
+	name_info.name_key = query_key;
+	io.string_in = query;
+	nistms_search(NISTMS_INC_GET_NAME_KEY, &io);
+	if (io.error_code) {
+		goto error;
+	}
 
-/****************************************************************************
+	if (query_key[0] != '\0') {
+		/* Retrieve names starting with the one just before the query */
+		io.string_in = query_key;
+		nistms_search(NISTMS_INC_FIRST_NAME_SRCH, &io);
+		if (io.error_code) {
+			goto error;
+		}
 
-   This function illustrates a full-featured library search.
+		for (int i = 0; i < name_info.num_names && num_hits < MAX_NAME_HITS; i++) {
+			int seen = 0;
 
-* New (since July 2008): "fast presearch" is initiated if cntls.search_mode |=
-SRCH_CONTROLS.SEARCH_MODE_FLAG_FAST_PRESEARCH
-* New (since July 2008): MS/MS search (type='E') with presearch may be executed the same way as the Identity (type='I')
-search
+			memset(name_key, '\0', sizeof(name_key));
+			name_info.name_key = name_key;
+			io.string_in = &names[i * MAX_NAME_LEN];
+			nistms_search(NISTMS_INC_GET_NAME_KEY, &io);
+			if (io.error_code) {
+				goto error;
+			}
 
-   These searches are always conducted in two stages:
-	 1) screen search (pre-search) to find a set of possible hits
-	 2) comparison of user spectrum to each library spectrum identified in the
-		screen search.  The screen search stores locations of possible
-		hits in buffer fpos_array.  These are transmitted to the comparison
-		search ranked hits (the hit list) and returned in the same array
-		with similarity values in sim_num[], rev_sim_num[] and hit_prob[].
+			if (strcmp(name_key, query_key) != 0) {
+				if (num_hits) {
+					break; /* names are sorted, so there are no more matches */
+				}
+				continue;
+			}
 
-	Search mode
-	Four types of library searches are available (see Documentation for details)
-   For compound IDENTIFICATION
-	 1) 'Q'uick: 98% retrieval efficiency
-	 2) 'I'dentity: 99+% retrieval effieiency, about 3x slower than 'Q'uick
-   For finding SIMILAR compounds
-	 3) 'S'imilarity: uses only conventional peaks, input MW not needed
+			snprintf(id_string, sizeof(id_string), "%lu", id_nums[i]);
+			io.string_in = id_string;
+			nistms_search(NISTMS_ID_SRCH, &io);
+			if (io.error_code) {
+				goto error;
+			}
+
+			if (!io.output_spec_loc) {
+				continue;
+			}
+
+			/* A compound may match by both its name and a synonym */
+			for (int j = 0; j < num_hits; j++) {
+				if (fpos_array[j] == io.output_spec_loc) {
+					seen = 1;
+					break;
+				}
+			}
+
+			if (!seen) {
+				fpos_array[num_hits++] = io.output_spec_loc;
+			}
+		}
+	}
+
+	io.active_libs = active_libs;
+	io.name_info = NULL;
+
+	memset((void *)&hit_list, '\0', sizeof(hit_list));
+	hit_list.spec_locs = fpos_array;
+	hit_list.max_spec_locs = MAX_NAME_HITS;
+	hit_list.num_hits_found = num_hits;
+	io.hit_list = &hit_list;
+
+	if (num_hits) {
+		/*  get compound identification information for compounds retrieved above */
+		hit_list.max_hits_desired = num_hits;
+		build_hitlist(&io);
+	}
+
+	return build_hit_list(&hit_list, 1);
+
+error:
+	io.active_libs = active_libs;
+	io.name_info = NULL;
+	PyErr_Format(PyExc_RuntimeError, "Name search returned error code %d\n", io.error_code);
+	return NULL;
+}
+
+/*
+Retrieves the locations of up to MAX_FINAL_HITS spectra in the library with the given (zero-based) index,
+in order of their ID number, starting with the smallest ID number equal to or greater than `first_id`.
+
+The DLL only performs sequential searches of the first active library,
+so the active libraries are temporarily replaced for the duration of the search.
+*/
+static PyObject *seq_id_search(PyObject *self, PyObject *args) {
+	int lib_idx;
+	long first_id;
+
+	static NISTMS_HIT_LIST hit_list;
+	static NISTMS_RECLOC fpos_array[MAX_FINAL_HITS];
+	char seq_active_libs[NISTMS_MAX_LIBS + 1];
+
+	if (!PyArg_ParseTuple(args, "il", &lib_idx, &first_id)) {
+		return NULL;
+	}
+
+	if (lib_idx < 0 || lib_idx >= NISTMS_MAX_LIBS || active_libs[lib_idx] == 0) {
+		PyErr_Format(PyExc_ValueError, "Invalid library index %d", lib_idx);
+		return NULL;
+	}
+
+	memset(seq_active_libs, '\0', sizeof(seq_active_libs));
+	seq_active_libs[0] = active_libs[lib_idx];
+
+	snprintf(StringIn, sizeof(StringIn), "%ld", first_id);
+	io.string_in = StringIn;
+	io.constraints = NULL;
+	io.active_libs = seq_active_libs;
+
+	memset((void *)&hit_list, '\0', sizeof(hit_list));
+	hit_list.spec_locs = fpos_array;
+	hit_list.max_spec_locs = MAX_FINAL_HITS;
+	io.hit_list = &hit_list;
+
+	nistms_search(NISTMS_SEQ_ID_SRCH, &io);
+
+	io.active_libs = active_libs;
+
+	if (io.error_code) {
+		PyErr_Format(PyExc_RuntimeError, "Sequential search returned error code %d\n", io.error_code);
+		return NULL;
+	}
+
+	return build_spec_loc_list(&hit_list);
+}
+
+/*
+Finds the spectra in the active libraries which contain at least `min_matches` of the given peaks,
+using the libraries' peak index rather than comparing spectra.
+Each peak is a (m/z, min abundance, max abundance) tuple, with the abundances as percentages of the base peak.
+Returns the locations of the matching spectra.
+*/
+static PyObject *any_peak_search(PyObject *self, PyObject *args) {
+	PyObject *py_peaks;
+	PyObject *py_seq;
+	int min_matches;
+	int num_peaks;
+	int peaks[MAX_ANY_PEAKS][3];
+
+	static NISTMS_PEAK_INFO peak_info;
+	static NISTMS_HIT_LIST hit_list;
+	static NISTMS_RECLOC fpos_array[MAX_SCREEN_LOCS];
+
+	if (!PyArg_ParseTuple(args, "Oi", &py_peaks, &min_matches)) {
+		return NULL;
+	}
+
+	py_seq = PySequence_Fast(py_peaks, "Peaks must be a sequence");
+	if (py_seq == NULL) {
+		return NULL;
+	}
+
+	num_peaks = (int)PySequence_Fast_GET_SIZE(py_seq);
+	if (num_peaks < 1 || num_peaks > MAX_ANY_PEAKS) {
+		Py_DECREF(py_seq);
+		PyErr_Format(PyExc_ValueError, "Between 1 and %d peaks must be given", MAX_ANY_PEAKS);
+		return NULL;
+	}
+
+	// The peaks are all read before the search starts, as the DLL only frees its memory once the hits are retrieved
+	for (int i = 0; i < num_peaks; i++) {
+		if (!PyArg_ParseTuple(PySequence_Fast_GET_ITEM(py_seq, i), "iii", &peaks[i][0], &peaks[i][1], &peaks[i][2])) {
+			Py_DECREF(py_seq);
+			return NULL;
+		}
+	}
+
+	Py_DECREF(py_seq);
+
+	if (min_matches < 1 || min_matches > num_peaks) {
+		PyErr_Format(PyExc_ValueError, "The number of matching peaks must be between 1 and %d", num_peaks);
+		return NULL;
+	}
+
+	memset((void *)&peak_info, '\0', sizeof(peak_info));
+	memset((void *)&hit_list, '\0', sizeof(hit_list));
+	hit_list.spec_locs = fpos_array;
+	hit_list.max_spec_locs = MAX_SCREEN_LOCS;
+
+	io.peak_info = &peak_info;
+	io.hit_list = &hit_list;
+	io.constraints = NULL;
+
+	nistms_search(NISTMS_ANYPEAK_INIT_SRCH, &io);
+
+	for (int i = 0; i < num_peaks && io.error_code == 0; i++) {
+		peak_info.type = NISTMS_ANY_PEAK;
+		peak_info.mass = peaks[i][0];
+		peak_info.abmin = peaks[i][1];
+		peak_info.abmax = peaks[i][2];
+		nistms_search(NISTMS_ANYPEAK_ONE_PEAK_SRCH, &io);
+	}
+
+	// The hits are always retrieved, as that frees the memory allocated for the search
+	if (io.error_code == 0) {
+		peak_info.num_matches_required = min_matches;
+		nistms_search(NISTMS_ANYPEAK_GET_HITS_SRCH, &io);
+	} else {
+		int error_code = io.error_code;
+		nistms_search(NISTMS_ANYPEAK_GET_HITS_SRCH, &io);
+		io.error_code = error_code;
+	}
+
+	io.peak_info = NULL;
+
+	if (io.error_code) {
+		PyErr_Format(PyExc_RuntimeError, "Any peak search returned error code %d\n", io.error_code);
+		return NULL;
+	}
+
+	return build_spec_loc_list(&hit_list);
+}
+
+/*
+Takes Python objects as input and prepares them for passing to full_spectrum_search
+*/
+static PyObject *full_spec_search(PyObject *self, PyObject *args) {
+	int counter;
+	char *test;
+	char *my_test;
+	int test_len;
+	PyObject *py_hit_list;
+	PyObject *py_controls = Py_None;
+	PyObject *py_constraints = Py_None;
+
+	if (!PyArg_ParseTuple(args, "s|OO", &test, &py_controls, &py_constraints)) {
+		return NULL;
+	}
+
+	// Allow space for the terminating null byte
+	my_test = (char *)malloc((strlen(test) + 1) * sizeof('a'));
+	if (my_test == NULL) {
+		return PyErr_NoMemory();
+	}
+	strcpy(my_test, test);
+	test_len = strlen(my_test);
+
+	for (counter = 0; counter < test_len; counter += 1) {
+		if (my_test[counter] == '*') {
+			my_test[counter] = '\000';
+		}
+	}
+
+	py_hit_list = full_spectrum_search(&io, my_test, py_controls, py_constraints, 0);
+	free(my_test);
+	return py_hit_list;
+}
+
+/*
+Takes Python objects as input and prepares them for passing to full_spectrum_search,
+which only performs the screen search (pre-search).
+Returns the locations of the candidate spectra.
+*/
+static PyObject *screen_search(PyObject *self, PyObject *args) {
+	int counter;
+	char *test;
+	char *my_test;
+	int test_len;
+	PyObject *py_spec_locs;
+	PyObject *py_controls = Py_None;
+
+	if (!PyArg_ParseTuple(args, "s|O", &test, &py_controls)) {
+		return NULL;
+	}
+
+	// Allow space for the terminating null byte
+	my_test = (char *)malloc((strlen(test) + 1) * sizeof('a'));
+	if (my_test == NULL) {
+		return PyErr_NoMemory();
+	}
+	strcpy(my_test, test);
+	test_len = strlen(my_test);
+
+	for (counter = 0; counter < test_len; counter += 1) {
+		if (my_test[counter] == '*') {
+			my_test[counter] = '\000';
+		}
+	}
+
+	py_spec_locs = full_spectrum_search(&io, my_test, py_controls, Py_None, 1);
+	free(my_test);
+	return py_spec_locs;
+}
+
+// /*
+// Returns the current list of libraries (delimited by NISTMS_PATH_SEPARATOR)
+// */
+// static PyObject *get_lib_paths(PyObject *self, PyObject *Py_UNUSED(args)) {
+// 	PyObject *py_lib_names = PyUnicode_FromString(lib_paths);
+// 	return py_lib_names;
+// }
+
+/*
+Returns the currently active libraries (in search order)
+*/
+static PyObject *get_active_libs(PyObject *self, PyObject *Py_UNUSED(args)) {
+	PyObject *py_active_libs = PyList_New(NISTMS_MAX_LIBS);
+	if (py_active_libs == NULL) {
+		return NULL;
+	}
+
+	for (int pos = 0; pos < NISTMS_MAX_LIBS; pos++) {
+		PyObject *py_lib = PyLong_FromLong(active_libs[pos]);
+		if (py_lib == NULL) {
+			Py_DECREF(py_active_libs);
+			return NULL;
+		}
+
+		PyList_SET_ITEM(py_active_libs, pos, py_lib);
+	}
+
+	return py_active_libs;
+}
+
+// TODO: allow active libs to be changed without reinit
+
+/****************************************************************************
+
+   This function illustrates a full-featured library search.
+
+* New (since July 2008): "fast presearch" is initiated if cntls.search_mode |=
+SRCH_CONTROLS.SEARCH_MODE_FLAG_FAST_PRESEARCH
+* New (since July 2008): MS/MS search (type='E') with presearch may be executed the same way as the Identity (type='I')
+search
+
+   These searches are always conducted in two stages:
+	 1) screen search (pre-search) to find a set of possible hits
+	 2) comparison of user spectrum to each library spectrum identified in the
+		screen search.  The screen search stores locations of possible
+		hits in buffer fpos_array.  These are transmitted to the comparison
+		search ranked hits (the hit list) and returned in the same array
+		with similarity values in sim_num[], rev_sim_num[] and hit_prob[].
+
+	Search mode
+	Four types of library searches are available (see Documentation for details)
+   For compound IDENTIFICATION
+	 1) 'Q'uick: 98% retrieval efficiency
+	 2) 'I'dentity: 99+% retrieval effieiency, about 3x slower than 'Q'uick
+   For finding SIMILAR compounds
+	 3) 'S'imilarity: uses only conventional peaks, input MW not needed
 	 4) 'L'oss: uses only "neutral loss" peaks, REQUIRES input MW
 	 5) 'H'ybrid: wses both normal and neutral loss peaks, REQUIRES input MW
 
@@ -679,7 +1456,9 @@ search
 
 *****************************************************************************/
 
-static PyObject *full_spectrum_search(NISTMS_IO *pio, char *spectrum) {
+static PyObject *full_spectrum_search(
+	NISTMS_IO *pio, char *spectrum, PyObject *py_controls, PyObject *py_constraints, int screen_only
+	) {
 
 	static NISTMS_CONSTRAINTS constraints;
 	static NISTMS_MASS_SPECTRUM userms; /*  contains unknown spectrum */
@@ -687,13 +1466,8 @@ static PyObject *full_spectrum_search(NISTMS_IO *pio, char *spectrum) {
 	static NISTMS_HIT_LIST hit_list;   /*  returns hits */
 	static NISTMS_SRCH_CONTROLS cntls; /*  specifies search type */
 
-	int search_type = NISTMS_SCREEN_SRCH;
-
-	#define MAX_SCREEN_LOCS                                                                                                \
-	NISTMS_MAX_FPOS /* 6000 = largest number of tentative hits from the                                                \
-					   screen search (pre-search) */
-
-	#define MAX_HITS_RETURNED MAX_LIB_SRCH_HITS
+	int presearch = PRESEARCH_DEFAULT;
+	double timeout = 0;
 
 	/*
 		The following seven buffers are attached to the NISTMS_HIT_LIST structure
@@ -705,33 +1479,32 @@ static PyObject *full_spectrum_search(NISTMS_IO *pio, char *spectrum) {
 		2) to send possible hit locations for spectral comparison
 		3) to receive an ordered hit list
 
-		Note: in case search_type=NISTMS_NO_PRE_SRCH,
-			  MAX_HITS_RETURNED may be increased to MAX_NOPRESRCH_HITS
+		The hit buffers hold MAX_NOPRESRCH_HITS hits, in case the pre-search is turned off.
 	*/
 
 	static NISTMS_RECLOC fpos_array[MAX_SCREEN_LOCS];
 
 	/*     REQUIRED for library search */
 	/*     In case of ms/ms search, this contains Score */
-	static int sim_num[MAX_HITS_RETURNED];
+	static int sim_num[MAX_NOPRESRCH_HITS];
 
 	/*     REQUIRED for reverse (impure) search, OPTIONAL for forward search */
 	/*     In case of any ms/ms search, this contains dot-product */
-	static int rev_sim_num[MAX_HITS_RETURNED];
+	static int rev_sim_num[MAX_NOPRESRCH_HITS];
 
 	/*     OPTIONAL for forward (pure compound) 'Q', 'I', 'P', or 'E' search mode,  */
 	/*     Not meaningful for reverse (impure), 'S', 'H' or 'L' search modes  */
-	static int hit_prob[MAX_HITS_RETURNED];
+	static int hit_prob[MAX_NOPRESRCH_HITS];
 
 	//	/*     Meaningful only for Peptide search */
 	//	static float pep_scores[NUM_ADD_SPEC_MATCHFACT][MAX_NOPRESRCH_HITS];
 
 	/*     OPTIONAL; for (possibly truncated) name retrieval for hit list presentation */
 	static unsigned char *lib_names = LibNamesBuffer;
-	static NISTMS_RECLOC *stru_pos[MAX_HITS_RETURNED];
+	static NISTMS_RECLOC *stru_pos[MAX_NOPRESRCH_HITS];
 
 	/*     OPTIONAL; for CAS reg. nos. retrieval for hit list presentation */
-	long *casnos[MAX_HITS_RETURNED];
+	long *casnos[MAX_NOPRESRCH_HITS];
 
 	int i;
 	int best_score = 0;
@@ -807,6 +1580,14 @@ static PyObject *full_spectrum_search(NISTMS_IO *pio, char *spectrum) {
 
 	cntls.min_abund = 1; // ignored by ms/ms search  // This got replaced by 0 (auto: min possible) later on
 
+	if (apply_search_controls(py_controls, &cntls, &presearch, &timeout) < 0) {
+		return NULL;
+	}
+
+	if (py_constraints != Py_None && parse_constraints(py_constraints, &constraints) < 0) {
+		return NULL;
+	}
+
 	/*  attach allocated buffers to input/output structure */
 	pio->userms = &userms; /*  input mass spectrum */
 	pio->cntls = &cntls;   /*  type of search */
@@ -814,252 +1595,624 @@ static PyObject *full_spectrum_search(NISTMS_IO *pio, char *spectrum) {
 	/* prepare hit list to receive spectrum pointers */
 	pio->hit_list = &hit_list;			   /* hit list */
 	pio->hit_list->spec_locs = fpos_array; /* spectrum pointers */
-	pio->hit_list->max_spec_locs = search_type == NISTMS_SCREEN_SRCH ? MAX_SCREEN_LOCS : MAX_NOPRESRCH_HITS;
 
-	/*  Screen ("pre-search") retrieves set of tentative hits */
-	nistms_search(search_type, pio);
-	switch (pio->error_code) {
-		case 0:
-			break;
+	/*
+	prepare for comparing spectra referred to in
+	io->hit_list->spec_locs with your spectrum
+	Each array must be able to contain io->hit_list->max_hits_desired hits >= 100
+	*/
+	pio->hit_list->sim_num = sim_num;
+	pio->hit_list->rev_sim_num = rev_sim_num;
+	pio->hit_list->hit_prob = hit_prob;
 
-		case WRN_TOO_MANY_HITS:
-			/* pre-search cannot return more than 6000 hits */
-			/* This warning may occur if the spectrum has only few peaks. */
-		case ERR_MAX_SPEC_LOCS_TOO_SMALL:
-			/* To lose less hits increase pio->hit_list->spec_locs length*/
-			printf(
-				"Warning: Too many hits after pre-search. Only %d will be compared.\n",
-				pio->hit_list->num_hits_found
-				);
-			break;
-		default:
-			printf("Screen search returned error code %d\n", pio->error_code);
+	/*
+	Returning of names and structure pointers is optional:
+	hit_list.lib_names == NULL or hit_list.stru_loc == NULL
+	associated data will simply not be returned.  This information
+	may be obtained later in individual retrievals of spectra
+	*/
+
+	hit_list.lib_names = lib_names;
+	hit_list.lib_names_len = sizeof(LibNamesBuffer);
+	hit_list.max_one_lib_name_len = MAX_NAME_LEN;
+	hit_list.stru_pos = stru_pos;
+	hit_list.casnos = casnos;
+
+	if (run_library_search(pio, presearch, py_constraints == Py_None ? NULL : &constraints, screen_only, timeout) < 0) {
+		return NULL;
+	}
+
+	if (screen_only) {
+		return build_spec_loc_list(pio->hit_list);
+	}
+
+	return build_hit_list(pio->hit_list, 0);
+}
+
+/*
+A hit from a batch of full spectrum searches.
+*/
+typedef struct {
+	int query_idx;
+	NISTMS_RECLOC spec_loc;
+	int sim_num;
+	int rev_sim_num;
+	int hit_prob;
+	long cas_no;
+	unsigned char name[MAX_NAME_LEN + 1];
+} BATCH_HIT;
+
+#define NUM_BATCH_COLUMNS 7 /* number of integer columns in the hit table */
+
+/*
+Performs a full spectrum search for each spectrum in a batch, without returning to Python between searches.
+
+The spectra are concatenated in `buffer`, each in the format produced by pyms_nist_search.utils.pack,
+and spectrum `i` runs from `offsets[i]` up to `offsets[i + 1]`.
+The search controls and constraints are applied to every search, and the timeout applies to each spectrum.
+
+If `release_gil` is true the GIL is released while the spectra are searched.
+The DLL and the buffers used here are shared by all searches,
+so no other _core function may be called from another thread in the meantime.
+
+Returns a columnar hit table: a dictionary of equal-length lists, with one entry per hit,
+ordered by query and then by rank. "query_idx" gives the index of the spectrum the hit belongs to.
+The names of the hits are in "hit_names", a bytes object of "name_width" bytes per hit.
+*/
+static PyObject *full_spec_search_batch(PyObject *self, PyObject *args) {
+	static NISTMS_CONSTRAINTS constraints;
+	static NISTMS_MASS_SPECTRUM userms; /*  contains unknown spectrum */
+	static NISTMS_AUX_DATA aux;
+	static NISTMS_HIT_LIST hit_list;   /*  returns hits */
+	static NISTMS_SRCH_CONTROLS cntls; /*  specifies search type */
+
+	static NISTMS_RECLOC fpos_array[MAX_SCREEN_LOCS];
+	static int sim_num[MAX_NOPRESRCH_HITS];
+	static int rev_sim_num[MAX_NOPRESRCH_HITS];
+	static int hit_prob[MAX_NOPRESRCH_HITS];
+	static NISTMS_RECLOC stru_pos[MAX_NOPRESRCH_HITS];
+	static long casnos[MAX_NOPRESRCH_HITS];
+
+	static const char *columns[NUM_BATCH_COLUMNS] = {
+		"query_idx", "spec_loc", "lib_idx", "sim_num", "rev_sim_num", "hit_prob", "cas_no",
 	};
 
-	if (search_type == NISTMS_SCREEN_SRCH) {
-		/*
-		Now prepare for comparing spectra referred to in
-		io->hit_list->spec_locs with your spectrum
-		Each array must be able to contain io->hit_list->max_hits_desired hits >= 100
-		*/
+	Py_buffer buffer;
+	PyObject *py_offsets;
+	PyObject *py_offsets_seq = NULL;
+	PyObject *py_controls = Py_None;
+	PyObject *py_constraints = Py_None;
+	PyObject *py_table = NULL;
+	PyObject *py_columns[NUM_BATCH_COLUMNS] = { NULL };
+	PyObject *py_names;
+	NISTMS_CONSTRAINTS *search_constraints = NULL;
+	PyThreadState *thread_state = NULL;
+
+	int n_hits = 5;
+	int release_gil = 0;
+	int presearch = PRESEARCH_DEFAULT;
+	double timeout = 0;
+	Py_ssize_t num_spectra;
+	Py_ssize_t num_rows = 0;
+	Py_ssize_t failed_query = -1;
+	int error_code = 0;
+
+	Py_ssize_t *starts = NULL;
+	char *spectra = NULL;
+	BATCH_HIT *rows = NULL;
+
+	if (!PyArg_ParseTuple(
+			args, "y*O|iOOp", &buffer, &py_offsets, &n_hits, &py_controls, &py_constraints, &release_gil
+			)) {
+		return NULL;
+	}
+
+	if (n_hits < 1 || n_hits > MAX_HITS_RETURNED) {
+		PyErr_Format(PyExc_ValueError, "The number of hits must be between 1 and %d", MAX_HITS_RETURNED);
+		goto finally;
+	}
+
+	py_offsets_seq = PySequence_Fast(py_offsets, "Offsets must be a sequence");
+	if (py_offsets_seq == NULL) {
+		goto finally;
+	}
+
+	num_spectra = PySequence_Fast_GET_SIZE(py_offsets_seq) - 1;
+	if (num_spectra < 0) {
+		PyErr_SetString(PyExc_ValueError, "At least one offset must be given");
+		goto finally;
+	}
+
+	/*
+	Each spectrum is copied into `spectra` followed by an extra null byte,
+	as parse_spectrum reads peaks until it finds an empty one.
+	*/
+	starts = (Py_ssize_t *)malloc((num_spectra + 1) * sizeof(Py_ssize_t));
+	spectra = (char *)malloc(buffer.len + num_spectra + 1);
+	rows = (BATCH_HIT *)malloc((num_spectra * n_hits + 1) * sizeof(BATCH_HIT));
+	if (starts == NULL || spectra == NULL || rows == NULL) {
+		PyErr_NoMemory();
+		goto finally;
+	}
 
-		pio->hit_list->max_hits_desired = MAX_HITS_RETURNED;
-		pio->hit_list->sim_num = sim_num;
-		pio->hit_list->rev_sim_num = rev_sim_num;
-		pio->hit_list->hit_prob = hit_prob;
+	{
+		Py_ssize_t previous_offset = 0;
+		Py_ssize_t position = 0;
+
+		for (Py_ssize_t i = 0; i <= num_spectra; i++) {
+			Py_ssize_t offset = PyLong_AsSsize_t(PySequence_Fast_GET_ITEM(py_offsets_seq, i));
+			if (offset == -1 && PyErr_Occurred()) {
+				goto finally;
+			}
+
+			if (offset < previous_offset || offset > buffer.len || (i == 0 && offset != 0)) {
+				PyErr_Format(PyExc_ValueError, "Invalid offset %zd at position %zd", offset, i);
+				goto finally;
+			}
+
+			if (i > 0) {
+				starts[i - 1] = position;
+				for (Py_ssize_t j = previous_offset; j < offset; j++) {
+					char c = ((char *)buffer.buf)[j];
+					spectra[position++] = c == '*' ? '\0' : c;
+				}
+				spectra[position++] = '\0';
+			}
 
-		/*
-		Returning of names and structure pointers is optional:
-		hit_list.lib_names == NULL or hit_list.stru_loc == NULL
-		associated data will simply not be returned.  This information
-		may be obtained later in individual retrievals of spectra
-		*/
+			previous_offset = offset;
+		}
 
-		hit_list.lib_names = lib_names;
-		hit_list.lib_names_len = sizeof(LibNamesBuffer);
-		hit_list.max_one_lib_name_len = MAX_NAME_LEN;
-		hit_list.stru_pos = stru_pos;
-		hit_list.casnos = casnos;
+		spectra[position] = '\0';
+	}
 
-		pio->constraints = NULL; /*  no constraints */
+	memset((void *)&cntls, '\0', sizeof(cntls));
+	memset((void *)&hit_list, '\0', sizeof(hit_list));
 
-		/* if these were uncommented, hits would be subjected to various constraints*/
+	/* The same defaults as full_spectrum_search */
+	cntls.search_mode = 'I';
+	cntls.user_mw = 1;
+	cntls.impure = 0;
+	cntls.min_mass = -1;
+	cntls.max_mass = -1;
+	cntls.min_abund = 1;
 
-		// pio.constraints = &constraints;
-		// clear_constraints(pio.constraints);
-		// #ifdef PEPTIDE_VERSION
-		// 	set_pep_constraints( pio.constraints );
-		// #endif
-		// 	set_constraints( pio.constraints );
-		//    pio.constraints.other_dbs=65;
+	if (apply_search_controls(py_controls, &cntls, &presearch, &timeout) < 0) {
+		goto finally;
+	}
 
-		/*  compare complete user and library spectra found by pre-search */
-		nistms_search(NISTMS_COMPARE_SPECTRA_SRCH, pio);
+	if (py_constraints != Py_None) {
+		if (parse_constraints(py_constraints, &constraints) < 0) {
+			goto finally;
+		}
+		search_constraints = &constraints;
 	}
 
-	PyObject *py_hit_list = PyList_New(0);
+	io.userms = &userms;
+	io.cntls = &cntls;
+	io.hit_list = &hit_list;
 
-	if (pio->hit_list->num_hits_found) {
-		int best_score = pio->hit_list->sim_num[0];
+	hit_list.spec_locs = fpos_array;
+	hit_list.sim_num = sim_num;
+	hit_list.rev_sim_num = rev_sim_num;
+	hit_list.hit_prob = hit_prob;
+	hit_list.lib_names = (unsigned char *)LibNamesBuffer;
+	hit_list.lib_names_len = sizeof(LibNamesBuffer);
+	hit_list.max_one_lib_name_len = MAX_NAME_LEN;
+	hit_list.stru_pos = stru_pos;
+	hit_list.casnos = casnos;
 
-		// printf("%d\n", best_score);
-		// printf("%d\n", pio->hit_list->num_hits_found);
+	g_bCancelSearch = 0;
+	reset_search_stats(presearch);
 
-		int name_len = pio->hit_list->max_one_lib_name_len;
-		unsigned char *raw_hit_names = pio->hit_list->lib_names;
+	if (release_gil) {
+		thread_state = PyEval_SaveThread();
+	}
 
-		for (int i = 0; i < pio->hit_list->num_hits_found; i++) {
-			PyObject *d = PyDict_New();
+	for (Py_ssize_t query = 0; query < num_spectra; query++) {
+		int num_hits;
 
-			printf("%d, ", i);
+		if (0 >= parse_spectrum(&userms, &aux, spectra + starts[query])) {
+			failed_query = query;
+			break;
+		}
 
-			PyObject *py_sim_num = PyLong_FromLong(hit_list.sim_num[i]);
-			PyDict_SetItemString(d, "sim_num", py_sim_num);
-			printf("%d, ", pio->hit_list->sim_num[i]);
+		error_code = search_library(&io, presearch, search_constraints, 0, timeout);
+		if (error_code != 0 || g_search_aborted != SEARCH_NOT_ABORTED) {
+			failed_query = query;
+			break;
+		}
 
-			PyObject *py_rev_sim_num = PyLong_FromLong(hit_list.rev_sim_num[i]);
-			PyDict_SetItemString(d, "rev_sim_num", py_rev_sim_num);
-			printf("%d, ", pio->hit_list->rev_sim_num[i]);
+		num_hits = hit_list.num_hits_found < n_hits ? hit_list.num_hits_found : n_hits;
+		for (int i = 0; i < num_hits; i++) {
+			BATCH_HIT *row = &rows[num_rows++];
+			row->query_idx = (int)query;
+			row->spec_loc = hit_list.spec_locs[i];
+			row->sim_num = hit_list.sim_num[i];
+			row->rev_sim_num = hit_list.rev_sim_num[i];
+			row->hit_prob = hit_list.hit_prob[i];
+			row->cas_no = hit_list.casnos[i];
+			memcpy(row->name, LibNamesBuffer + i * MAX_NAME_LEN, MAX_NAME_LEN + 1);
+		}
+	}
 
-			PyObject *py_hit_prob = PyLong_FromLong(hit_list.hit_prob[i]);
-			PyDict_SetItemString(d, "hit_prob", py_hit_prob);
-			printf("%d, ", pio->hit_list->hit_prob[i]);
+	if (thread_state != NULL) {
+		PyEval_RestoreThread(thread_state);
+	}
 
-			// PyObject *py_in_library_prob = PyLong_FromLong(hit_list.in_library_prob[i]);
-			// PyDict_SetItemString(d, "in_library_prob", py_in_library_prob);
-			// printf("%d, ", pio->hit_list->in_library_prob[i]);
+	if (failed_query >= 0) {
+		if (error_code != 0 || g_search_aborted != SEARCH_NOT_ABORTED) {
+			set_search_error(error_code);
+		} else {
+			PyErr_Format(PyExc_RuntimeError, "Could not read spectrum %zd", failed_query);
+		}
+		goto finally;
+	}
 
-			int start_byte = i * name_len;
-			int end_byte = start_byte + name_len;
-			unsigned char buffer[MAX_NAME_LEN]; // Should be much larger than needed
-			// slice_str(raw_hit_names, buffer, start_byte, end_byte);
+	py_table = PyDict_New();
+	if (py_table == NULL) {
+		goto finally;
+	}
 
-			PyObject *py_hit_name_char_list = PyList_New(0);
+	for (int c = 0; c < NUM_BATCH_COLUMNS; c++) {
+		py_columns[c] = PyList_New(num_rows);
+		// The dictionary holds a reference to each list, so they stay alive while they are filled.
+		if (py_columns[c] == NULL || PyDict_SetItemString(py_table, columns[c], py_columns[c]) < 0) {
+			Py_XDECREF(py_columns[c]);
+			goto error;
+		}
+		Py_DECREF(py_columns[c]);
+	}
 
-			// Fix for Wine crash
-			for (size_t i = start_byte; i <= end_byte; ++i) {
-				PyList_Append(py_hit_name_char_list, PyLong_FromLong(raw_hit_names[i]));
+	for (Py_ssize_t r = 0; r < num_rows; r++) {
+		long values[NUM_BATCH_COLUMNS] = {
+			rows[r].query_idx, rows[r].spec_loc,	 NISTMS_LIB_NUM(rows[r].spec_loc),
+			rows[r].sim_num,   rows[r].rev_sim_num, rows[r].hit_prob,
+			rows[r].cas_no,
+		};
+
+		for (int c = 0; c < NUM_BATCH_COLUMNS; c++) {
+			PyObject *py_value = PyLong_FromLong(values[c]);
+			if (py_value == NULL) {
+				goto error;
 			}
 
-			// for (int i = 0; i <= MAX_NAME_LEN; i++) {
-			// 	PyList_Append(py_hit_name_char_list, PyLong_FromLong(buffer[i]));
-			// }
+			// PyList_SET_ITEM steals the reference to the value
+			PyList_SET_ITEM(py_columns[c], r, py_value);
+		}
+	}
 
-			PyDict_SetItemString(d, "hit_name_chars", py_hit_name_char_list);
+	py_names = PyBytes_FromStringAndSize(NULL, num_rows * (MAX_NAME_LEN + 1));
+	if (py_names == NULL) {
+		goto error;
+	}
 
-			// PyObject *py_hit_name = PyUnicode_FromFormat("%s", buffer);
-			// PyDict_SetItemString(d, "hit_name", py_hit_name);
+	for (Py_ssize_t r = 0; r < num_rows; r++) {
+		memcpy(PyBytes_AS_STRING(py_names) + r * (MAX_NAME_LEN + 1), rows[r].name, MAX_NAME_LEN + 1);
+	}
 
-			// printf("%ld, ", pio->hit_list->stru_pos[i]);
+	if (dict_set_item_steal(py_table, "hit_names", py_names) < 0) {
+		goto error;
+	}
 
-			PyObject *py_spec_loc = PyLong_FromLong(hit_list.spec_locs[i]);
-			PyDict_SetItemString(d, "spec_loc", py_spec_loc);
-			// printf("%ld, ", pio->hit_list->spec_locs[i]);
+	if (dict_set_item_steal(py_table, "name_width", PyLong_FromLong(MAX_NAME_LEN + 1)) < 0) {
+		goto error;
+	}
 
-			PyObject *py_lib_idx = PyLong_FromLong(NISTMS_LIB_NUM(hit_list.spec_locs[i]));
-			PyDict_SetItemString(d, "lib_idx", py_lib_idx);
+	goto finally;
 
-			PyObject *py_cas_no = PyLong_FromLong(hit_list.casnos[i]);
-			PyDict_SetItemString(d, "cas_no", py_cas_no);
-			// printf("%ld, ", pio->hit_list->casnos[i]);
+error:
+	Py_CLEAR(py_table);
 
-			// printf("\n");
+finally:
+	PyBuffer_Release(&buffer);
+	Py_XDECREF(py_offsets_seq);
+	free(starts);
+	free(spectra);
+	free(rows);
+	return py_table;
+}
 
-			PyList_Append(py_hit_list, d);
-		}
+/*
+Sets `key` in the dictionary to `value`, and releases the caller's reference to `value`
+(PyDict_SetItemString does not steal the reference).
+Returns -1 with an exception set if `value` is NULL or the item could not be set.
+*/
+static int dict_set_item_steal(PyObject *dict, const char *key, PyObject *value) {
+	int result;
+
+	if (value == NULL) {
+		return -1;
 	}
 
-	return (py_hit_list);
+	result = PyDict_SetItemString(dict, key, value);
+	Py_DECREF(value);
+	return result;
 }
 
 /*
-Finds and returns the information about the spectrum at the given location in the library
+Appends `value` to the list, and releases the caller's reference to `value`
+(PyList_Append does not steal the reference).
+Returns -1 with an exception set if `value` is NULL or it could not be appended.
 */
-static PyObject *get_reference_data(PyObject *self, PyObject *args) {
-	NISTMS_RECLOC input_spec_loc;
-	PyObject *record = PyDict_New();
-	PyObject *py_mass_list = PyList_New(0);
-	PyObject *py_intensity_list = PyList_New(0);
-	// PyObject *py_synonym_list = PyList_New(0);
-	PyObject *py_synonyms_char_list = PyList_New(0);
+static int list_append_steal(PyObject *list, PyObject *value) {
+	int result;
 
-	int ok = PyArg_ParseTuple(args, "l", &input_spec_loc);
-	// printf("Parsed Args\n");
-	// printf("input_spec_locs = %ld", input_spec_loc);
+	if (value == NULL) {
+		return -1;
+	}
 
-	get_spectrum(&io, input_spec_loc);
+	result = PyList_Append(list, value);
+	Py_DECREF(value);
+	return result;
+}
 
-	// printf("Search Complete\n");
+/*
+Builds a dictionary describing the hit at `index` in the hit list.
+For index searches (such as CAS number searches) there are no scores, so they are zero.
+*/
+static PyObject *build_hit_record(NISTMS_HIT_LIST *hits, int index, int cas_search) {
+	int name_len = hits->max_one_lib_name_len;
+	unsigned char *raw_hit_names = hits->lib_names;
+	int start_byte = index * name_len;
+	int end_byte = start_byte + name_len;
+	PyObject *py_hit_name_char_list;
+
+	PyObject *d = PyDict_New();
+	if (d == NULL) {
+		return NULL;
+	}
 
-	PyObject *py_lib_idx = PyLong_FromLong(NISTMS_LIB_NUM(input_spec_loc));
-	PyDict_SetItemString(record, "lib_idx", py_lib_idx);
+	if (dict_set_item_steal(d, "sim_num", PyLong_FromLong(cas_search ? 0 : hits->sim_num[index])) < 0
+		|| dict_set_item_steal(d, "rev_sim_num", PyLong_FromLong(cas_search ? 0 : hits->rev_sim_num[index])) < 0
+		|| dict_set_item_steal(d, "hit_prob", PyLong_FromLong(cas_search ? 0 : hits->hit_prob[index])) < 0) {
+		goto error;
+	}
 
-	// printf("Name: %s\n", io.aux_data->name);
-	PyObject *py_name = PyUnicode_FromFormat("%s", io.aux_data->name);
-	PyDict_SetItemString(record, "name", py_name);
+	py_hit_name_char_list = PyList_New(0);
+	if (dict_set_item_steal(d, "hit_name_chars", py_hit_name_char_list) < 0) {
+		goto error;
+	}
 
-	PyObject *py_name_char_list = PyList_New(0);
+	// Fix for Wine crash
+	// The dictionary holds a reference to the list, so it stays alive while it is filled.
+	for (size_t i = start_byte; i <= end_byte; ++i) {
+		if (list_append_steal(py_hit_name_char_list, PyLong_FromLong(raw_hit_names[i])) < 0) {
+			goto error;
+		}
+	}
 
-	for (int i = 0; i <= MAX_NAME_LEN; i++) {
-		// printf("%d ", io.aux_data->name[i]);
-		PyList_Append(py_name_char_list, PyLong_FromLong(io.aux_data->name[i]));
+	if (dict_set_item_steal(d, "spec_loc", PyLong_FromLong(hits->spec_locs[index])) < 0) {
+		goto error;
 	}
 
-	PyDict_SetItemString(record, "name_chars", py_name_char_list);
+	if (dict_set_item_steal(d, "lib_idx", PyLong_FromLong(NISTMS_LIB_NUM(hits->spec_locs[index]))) < 0) {
+		goto error;
+	}
+
+	if (dict_set_item_steal(d, "cas_no", PyLong_FromLong(hits->casnos ? hits->casnos[index] : 0)) < 0) {
+		goto error;
+	}
 
-	// printf("CAS: %ld\n", io.aux_data->casno);
-	PyObject *py_cas = PyLong_FromLong(io.aux_data->casno);
-	PyDict_SetItemString(record, "cas", py_cas);
+	return d;
 
-	// printf("NIST Num: %ld\n", io.aux_data->specno);
-	PyObject *py_nist_no = PyLong_FromLong(io.aux_data->specno);
-	PyDict_SetItemString(record, "nist_no", py_nist_no);
+error:
+	Py_DECREF(d);
+	return NULL;
+}
+
+/*
+Builds a list of dictionaries describing the hits in the hit list
+*/
+static PyObject *build_hit_list(NISTMS_HIT_LIST *hits, int cas_search) {
+	int num_hits = hits->num_hits_found > 0 ? hits->num_hits_found : 0;
+
+	PyObject *py_hit_list = PyList_New(num_hits);
+	if (py_hit_list == NULL) {
+		return NULL;
+	}
+
+	for (int i = 0; i < num_hits; i++) {
+		PyObject *d = build_hit_record(hits, i, cas_search);
+		if (d == NULL) {
+			Py_DECREF(py_hit_list);
+			return NULL;
+		}
 
-	// printf("ID: %ld\n", io.aux_data->ident);
-	PyObject *py_id = PyLong_FromLong(io.aux_data->ident);
-	PyDict_SetItemString(record, "id", py_id);
+		// PyList_SET_ITEM steals the reference to the dictionary
+		PyList_SET_ITEM(py_hit_list, i, d);
+	}
 
-	// printf("MW: %d\n", io.aux_data->mw);
-	PyObject *py_mw = PyLong_FromLong(io.aux_data->mw);
-	PyDict_SetItemString(record, "mw", py_mw);
+	return py_hit_list;
+}
 
-	// printf("Exact Mass: %f##\n", io.aux_data->exact_mw);
+/*
+Builds a list of the spectrum locations in the hit list
+*/
+static PyObject *build_spec_loc_list(NISTMS_HIT_LIST *hits) {
+	int num_hits = hits->num_hits_found > 0 ? hits->num_hits_found : 0;
 
-	// printf("Formula: %s\n", io.aux_data->formula);
-	PyObject *py_formula = PyUnicode_FromString(io.aux_data->formula);
-	PyDict_SetItemString(record, "formula", py_formula);
+	PyObject *py_spec_locs = PyList_New(num_hits);
+	if (py_spec_locs == NULL) {
+		return NULL;
+	}
 
-	// printf("Contributor: %s\n", io.aux_data->contributor);
-	PyObject *py_contributor = PyUnicode_FromString(io.aux_data->contributor);
-	PyDict_SetItemString(record, "contributor", py_contributor);
+	for (int i = 0; i < num_hits; i++) {
+		PyObject *py_spec_loc = PyLong_FromLong(hits->spec_locs[i]);
+		if (py_spec_loc == NULL) {
+			Py_DECREF(py_spec_locs);
+			return NULL;
+		}
 
-	// printf("MS Num Peaks: %d\n", io.libms->num_peaks);
-	for (int i = 0; i < io.libms->num_peaks; i++) {
-		// printf("\tmz, Intensity: %d %d\n", io.libms->mass[i], io.libms->abund[i]);
-		// printf("%d\n", PyLong_FromLong(io.libms->mass[i]));
-		PyList_Append(py_mass_list, PyLong_FromLong(io.libms->mass[i]));
-		PyList_Append(py_intensity_list, PyLong_FromLong(io.libms->abund[i]));
-		// printf("%d, %d\n", i, io.libms->num_peaks);
+		// PyList_SET_ITEM steals the reference to the location
+		PyList_SET_ITEM(py_spec_locs, i, py_spec_loc);
 	}
 
-	PyDict_SetItemString(record, "mass_list", py_mass_list);
-	PyDict_SetItemString(record, "intensity_list", py_intensity_list);
+	return py_spec_locs;
+}
 
-	// Get synonyms in a list
+/*
+Builds a dictionary containing the information about the spectrum at the given location in the library
+*/
+static PyObject *build_reference_record(NISTMS_IO *pio, NISTMS_RECLOC input_spec_loc) {
+	PyObject *py_name_char_list;
+	PyObject *py_mass_list;
+	PyObject *py_intensity_list;
+	PyObject *py_synonyms_char_list;
+	PyObject *py_synonym_char_list;
 	int start_byte = 0;
-	unsigned char buffer[MAX_NAME_LEN]; // Should be much larger than needed
 
-	for (int i = 0; i <= io.aux_data->synonyms_len; i++) {
-		if (io.aux_data->synonyms[i] == 0) {
-			if (i - start_byte > 0) {
-				// slice_str(io.aux_data->synonyms, buffer, start_byte, i);
-				// printf("%s#\n", buffer);
-				// printf("%s\n", PyUnicode_FromString(buffer));
-				// PyList_Append(py_synonym_list, PyUnicode_FromFormat("%s", buffer));
+	PyObject *record = PyDict_New();
+	if (record == NULL) {
+		return NULL;
+	}
 
-				PyObject *py_synonym_char_list = PyList_New(0);
+	get_spectrum(pio, input_spec_loc);
 
-				// for (int i = 0; i <= MAX_NAME_LEN; i++) {
-				// 	PyList_Append(py_synonym_char_list, PyLong_FromLong(buffer[i]));
-				// }
+	if (dict_set_item_steal(record, "lib_idx", PyLong_FromLong(NISTMS_LIB_NUM(input_spec_loc))) < 0
+		|| dict_set_item_steal(record, "name", PyUnicode_FromFormat("%s", pio->aux_data->name)) < 0) {
+		goto error;
+	}
+
+	// The dictionary holds a reference to each list below, so they stay alive while they are filled.
+	py_name_char_list = PyList_New(0);
+	if (dict_set_item_steal(record, "name_chars", py_name_char_list) < 0) {
+		goto error;
+	}
+
+	for (int i = 0; i <= MAX_NAME_LEN; i++) {
+		if (list_append_steal(py_name_char_list, PyLong_FromLong(pio->aux_data->name[i])) < 0) {
+			goto error;
+		}
+	}
+
+	if (dict_set_item_steal(record, "cas", PyLong_FromLong(pio->aux_data->casno)) < 0
+		|| dict_set_item_steal(record, "nist_no", PyLong_FromLong(pio->aux_data->specno)) < 0
+		|| dict_set_item_steal(record, "id", PyLong_FromLong(pio->aux_data->ident)) < 0
+		|| dict_set_item_steal(record, "mw", PyLong_FromLong(pio->aux_data->mw)) < 0
+		|| dict_set_item_steal(record, "formula", PyUnicode_FromString(pio->aux_data->formula)) < 0
+		|| dict_set_item_steal(record, "contributor", PyUnicode_FromString(pio->aux_data->contributor)) < 0) {
+		goto error;
+	}
+
+	py_mass_list = PyList_New(pio->libms->num_peaks);
+	if (dict_set_item_steal(record, "mass_list", py_mass_list) < 0) {
+		goto error;
+	}
+
+	py_intensity_list = PyList_New(pio->libms->num_peaks);
+	if (dict_set_item_steal(record, "intensity_list", py_intensity_list) < 0) {
+		goto error;
+	}
+
+	for (int i = 0; i < pio->libms->num_peaks; i++) {
+		PyObject *py_mass = PyLong_FromLong(pio->libms->mass[i]);
+		PyObject *py_abund = PyLong_FromLong(pio->libms->abund[i]);
+
+		if (py_mass == NULL || py_abund == NULL) {
+			Py_XDECREF(py_mass);
+			Py_XDECREF(py_abund);
+			goto error;
+		}
+
+		// PyList_SET_ITEM steals the references
+		PyList_SET_ITEM(py_mass_list, i, py_mass);
+		PyList_SET_ITEM(py_intensity_list, i, py_abund);
+	}
+
+	// Get synonyms in a list
+	py_synonyms_char_list = PyList_New(0);
+	if (dict_set_item_steal(record, "synonyms_chars", py_synonyms_char_list) < 0) {
+		goto error;
+	}
+
+	for (int i = 0; i <= pio->aux_data->synonyms_len; i++) {
+		if (pio->aux_data->synonyms[i] == 0) {
+			if (i - start_byte > 0) {
+				py_synonym_char_list = PyList_New(0);
+				if (py_synonym_char_list == NULL) {
+					goto error;
+				}
 
 				// Fix for Wine crash
 				for (size_t j = start_byte; j <= i; ++j) {
-					PyList_Append(py_synonym_char_list, PyLong_FromLong(io.aux_data->synonyms[j]));
+					if (list_append_steal(py_synonym_char_list, PyLong_FromLong(pio->aux_data->synonyms[j])) < 0) {
+						Py_DECREF(py_synonym_char_list);
+						goto error;
+					}
 				}
 
-				PyList_Append(py_synonyms_char_list, py_synonym_char_list);
+				if (list_append_steal(py_synonyms_char_list, py_synonym_char_list) < 0) {
+					goto error;
+				}
 			}
 
 			start_byte = i + 1;
-			char buffer[MAX_NAME_LEN];
 		}
 	}
 
-	// PyDict_SetItemString(record, "synonyms", py_synonym_list);
-	PyDict_SetItemString(record, "synonyms_chars", py_synonyms_char_list);
-
 	return record;
+
+error:
+	Py_DECREF(record);
+	return NULL;
+}
+
+/*
+Finds and returns the information about the spectrum at the given location in the library
+*/
+static PyObject *get_reference_data(PyObject *self, PyObject *args) {
+	NISTMS_RECLOC input_spec_loc;
+
+	if (!PyArg_ParseTuple(args, "l", &input_spec_loc)) {
+		return NULL;
+	}
+
+	return build_reference_record(&io, input_spec_loc);
+}
+
+/*
+Finds and returns the information about the spectra at each of the given locations in the library
+*/
+static PyObject *get_reference_data_many(PyObject *self, PyObject *args) {
+	PyObject *py_spec_locs;
+
+	if (!PyArg_ParseTuple(args, "O", &py_spec_locs)) {
+		return NULL;
+	}
+
+	PyObject *py_spec_locs_seq = PySequence_Fast(py_spec_locs, "spec_locs must be a sequence of integers");
+	if (py_spec_locs_seq == NULL) {
+		return NULL;
+	}
+
+	Py_ssize_t num_locs = PySequence_Fast_GET_SIZE(py_spec_locs_seq);
+	PyObject *records = PyList_New(num_locs);
+	if (records == NULL) {
+		Py_DECREF(py_spec_locs_seq);
+		return NULL;
+	}
+
+	for (Py_ssize_t i = 0; i < num_locs; i++) {
+		NISTMS_RECLOC spec_loc = PyLong_AsLong(PySequence_Fast_GET_ITEM(py_spec_locs_seq, i));
+		if (spec_loc == -1 && PyErr_Occurred()) {
+			Py_DECREF(records);
+			Py_DECREF(py_spec_locs_seq);
+			return NULL;
+		}
+
+		PyObject *record = build_reference_record(&io, spec_loc);
+		if (record == NULL) {
+			Py_DECREF(records);
+			Py_DECREF(py_spec_locs_seq);
+			return NULL;
+		}
+
+		// PyList_SET_ITEM steals the reference to the record
+		PyList_SET_ITEM(records, i, record);
+	}
+
+	Py_DECREF(py_spec_locs_seq);
+	return records;
 }
 
 /* loads a single spectrum from a string */
@@ -1258,7 +2411,6 @@ static void get_spectrum_int_or_accurate_mz(NISTMS_IO *pio, NISTMS_RECLOC *fpos,
 		}
 	#endif
 
-	printf("Gathering Data for spectrum at location %ld\n", fpos);
 	pio->input_spec_loc = fpos; /* most significant 4 bits=lib number, the rest=file offset */
 
 	pio->libms = &ms;
@@ -1430,11 +2582,20 @@ static PyObject *init_api(PyObject *self, PyObject *args) {
 static PyMethodDef Methods[] = { { "_spectrum_search", spec_search, METH_VARARGS,
 								   "Searches the library with search type 'NISTMS_NO_PRE_SRCH'" },
 								 { "_full_spectrum_search", full_spec_search, METH_VARARGS, "" },
+								 { "_screen_search", screen_search, METH_VARARGS, "" },
+								 { "_full_spectrum_search_batch", full_spec_search_batch, METH_VARARGS, "" },
 								 { "_get_reference_data", get_reference_data, METH_VARARGS, "" },
+								 { "_get_reference_data_many", get_reference_data_many, METH_VARARGS, "" },
 								 { "_init_api", init_api, METH_VARARGS, "" },
 								 { "_cas_search", cas_search, METH_VARARGS, "" },
+								 { "_index_search", index_search, METH_VARARGS, "" },
+								 { "_name_search", name_search, METH_VARARGS, "" },
 								 // {"_get_lib_paths", get_lib_paths, METH_VARARGS, ""},
 								 { "_get_active_libs", get_active_libs, METH_VARARGS, "" },
+								 { "_seq_id_search", seq_id_search, METH_VARARGS, "" },
+								 { "_any_peak_search", any_peak_search, METH_VARARGS, "" },
+								 { "_cancel_search", cancel_search, METH_NOARGS, "" },
+								 { "_get_search_stats", get_search_stats, METH_NOARGS, "" },
 								 { NULL, NULL } };
 
 static struct PyModuleDef _core = { PyModuleDef_HEAD_INIT, "_core",
@@ -36,26 +36,22 @@ Class to store reference data from NIST MS Search.
 # stdlib
 import copy
 import json
-import warnings
-from typing import Any, Dict, List, Optional, Sequence, Type, Union
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Type, Union
 
 # 3rd party
 import sdjson
 from domdf_python_tools.doctools import prettify_docstrings
 from domdf_python_tools.iterative import chunks
-from domdf_python_tools.paths import PathPlus
 from domdf_python_tools.typing import PathLike
 from pyms.Spectrum import MassSpectrum, normalize_mass_spec
-from pyms.Utils.jcamp import JcampTagWarning, header_info_fields, xydata_tags
-from pyms.Utils.Math import is_float
 
 # this package
 from pyms_nist_search.base import NISTBase
-from pyms_nist_search.mona_tools import mass_spec_from_mona, parse_metadata
+from pyms_nist_search.mona_tools import MetadataDiagnostics, mass_spec_from_mona, parse_metadata
 from pyms_nist_search.templates import *
 from pyms_nist_search.utils import parse_name_chars
 
-__all__ = ("ReferenceData", )
+__all__ = ("ReferenceData", "LazyReferenceData")
 
 
 @prettify_docstrings
@@ -256,61 +252,17 @@ class ReferenceData(NISTBase):
 		:param ignore_warnings: Whether warnings about invalid tags should be shown.
 
 		:authors: Qiao Wang, Andrew Isaac, Vladimir Likic, David Kainer, Dominic Davis-Foster
-		"""
-
-		with warnings.catch_warnings():
-
-			if ignore_warnings:
-				warnings.simplefilter("ignore", JcampTagWarning)
-
-			file_name = PathPlus(file_name)
-
-			# Commented this line because it also gets printed when the MassSpectrum is created
-			# print(f" -> Reading JCAMP file '{file_name}'")
-			lines_list = file_name.read_lines()
-			last_tag = None
-
-			header_info: Dict[str, Any] = {}  # Dictionary containing header information
 
-			for line in lines_list:
+		.. versionchanged:: 0.9.0
 
-				if len(line.strip()):
-					if line.startswith("##"):
-						# key word or information
-						fields = line.split('=', 1)
-						current_tag = fields[0] = fields[0].lstrip("##").upper()
-						last_tag = fields[0]
-						fields[1] = fields[1].strip()
-
-						if current_tag.upper().startswith("END"):
-							break
-
-						elif current_tag in xydata_tags:
-							continue
-
-						elif current_tag in header_info_fields:
-							if fields[1].isdigit():
-								header_info[current_tag] = int(fields[1])
-							elif is_float(fields[1]):
-								header_info[current_tag] = float(fields[1])
-							else:
-								header_info[current_tag] = fields[1]
-						else:
-							warnings.warn(current_tag, JcampTagWarning)
+			The file is now read in a single pass by :func:`pyms_nist_search.jcamp.read_jcamp`.
+			For files with multiple blocks the first spectrum is returned.
+		"""
 
-					else:
-						if last_tag in header_info:
-							header_info[last_tag] += f"{line}"
+		# this package
+		from pyms_nist_search.jcamp import read_jcamp
 
-			return cls(
-					name=header_info["TITLE"],
-					cas=header_info["CAS REGISTRY NO"],
-					nist_no=header_info["$NIST MASS SPEC NO"],
-					contributor=header_info["ORIGIN"],
-					formula=header_info["MOLFORM"],
-					mw=header_info["MW"],
-					mass_spec=MassSpectrum.from_jcamp(file_name),
-					)
+		return read_jcamp(file_name, ignore_warnings=ignore_warnings)
 
 	def to_json(self) -> str:
 		"""
@@ -332,12 +284,20 @@ class ReferenceData(NISTBase):
 		return cls.from_dict(peak_dict)
 
 	@classmethod
-	def from_mona_dict(cls, mona_data: Dict) -> "ReferenceData":
+	def from_mona_dict(
+			cls,
+			mona_data: Dict,
+			diagnostics: Optional[MetadataDiagnostics] = None,
+			) -> "ReferenceData":
 		"""
 		Construct an object from Massbank of North America json data
 		that has been loaded into a dictionary.
 
 		:param mona_data: dict
+		:param diagnostics: Collects any properties which were not recognised.
+			See :func:`pyms_nist_search.mona_tools.parse_metadata` for details.
+
+		.. versionchanged:: 0.9.0  Added the ``diagnostics`` argument.
 		"""  # noqa: D400
 
 		compound: Dict = mona_data["compound"][0]
@@ -345,7 +305,7 @@ class ReferenceData(NISTBase):
 		name: str = names[0]["name"]
 		synonyms: List = [name for name in names[1:]]
 
-		properties_dict = parse_metadata(mona_data)
+		properties_dict = parse_metadata(mona_data, diagnostics)
 
 		# Remove unwanted properties
 		del properties_dict["license"]
@@ -386,6 +346,89 @@ class ReferenceData(NISTBase):
 
 		return msp_text
 
+	@classmethod
+	def iter_msp(
+			cls,
+			filename: PathLike,
+			use_mmap: bool = False,
+			fields: Optional[Iterable[str]] = None,
+			spectra: bool = True,
+			) -> Iterator["ReferenceData"]:
+		"""
+		Iterate over the records in an MSP file.
+
+		See :func:`pyms_nist_search.msp.iter_msp` for details.
+
+		.. versionadded:: 0.9.0
+
+		:param filename: The MSP file to read.
+		:param use_mmap: Whether to memory-map the file rather than reading it through a buffered file object.
+		:param fields: The fields to read. If :py:obj:`None` all fields are read.
+		:param spectra: Whether to read the mass spectra.
+		"""
+
+		# this package
+		from pyms_nist_search.msp import iter_msp
+
+		return iter_msp(filename, use_mmap=use_mmap, fields=fields, spectra=spectra)
+
+
+class LazyReferenceData(ReferenceData):
+	"""
+	:class:`~.ReferenceData` which is only retrieved from the library when it is first accessed.
+
+	The ``loader`` is called the first time any of the object's data is accessed,
+	and the data it returns are then stored in the object.
+	The loader is not called if the object is never accessed.
+
+	.. versionadded:: 0.9.0
+
+	:param loader: A function taking no arguments which returns the :class:`~.ReferenceData`.
+	"""
+
+	def __init__(self, loader: Callable[[], ReferenceData]) -> None:
+		self._loader: Optional[Callable[[], ReferenceData]] = loader
+		self._resolved: bool = False
+
+	def __getattr__(self, item: str) -> Any:
+		# Only called when the attribute has not been set, i.e. the data has not yet been loaded.
+		if item.startswith("__") or item in {"_loader", "_resolved"} or not item.startswith('_'):
+			raise AttributeError(item)
+
+		if self._resolved:
+			raise AttributeError(item)
+
+		self.resolve()
+		return object.__getattribute__(self, item)
+
+	def resolve(self) -> None:
+		"""
+		Retrieve the reference data from the library, if it has not already been retrieved.
+		"""
+
+		if self._resolved:
+			return
+
+		assert self._loader is not None
+		ref_data = self._loader()
+		ReferenceData.__init__(self, **ref_data.to_dict())
+
+		self._loader = None
+		self._resolved = True
+
+	@property
+	def resolved(self) -> bool:
+		"""
+		Returns whether the reference data has been retrieved from the library.
+		"""
+
+		return self._resolved
+
+	def __setstate__(self, state) -> None:  # noqa: MAN001
+		ReferenceData.__init__(self, **state)
+		self._loader = None
+		self._resolved = True
+
 
 @sdjson.register_encoder(ReferenceData)
 def encode_reference_data(obj: ReferenceData) -> Dict[str, Any]:
@@ -0,0 +1,364 @@
+#!/usr/bin/env python
+#
+#  search_controls.py
+"""
+Options controlling how the library is searched, and constraints on the hits returned.
+
+The controls and constraints are passed to the NIST DLL, so hits which do not satisfy
+the constraints are discarded during the library search rather than afterwards.
+
+.. versionadded:: 0.9.0
+"""
+#
+#  This file is part of PyMassSpec NIST Search
+#  Python interface to the NIST MS Search DLL
+#
+#  Copyright (c) 2020-2021 Dominic Davis-Foster <dominic@davis-foster.co.uk>
+#
+#  PyMassSpec NIST Search is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as
+#  published by the Free Software Foundation; either version 3 of
+#  the License, or (at your option) any later version.
+#
+#  PyMassSpec NIST Search is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public
+#  License along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+#  PyMassSpec NIST Search includes the redistributable binaries for NIST MS Search in
+#  the x86 and x64 directories. Available from
+#  ftp://chemdata.nist.gov/mass-spc/v1_7/NISTDLL3.zip .
+#  ctnt66.dll and ctnt66_64.dll copyright 1984-1996 FairCom Corporation.
+#  "FairCom" and "c-tree Plus" are trademarks of FairCom Corporation
+#  and are registered in the United States and other countries.
+#  All Rights Reserved.
+#
+
+# stdlib
+import json
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+# this package
+from . import _core  # type: ignore[attr-defined]
+
+__all__ = ("SearchControls", "SearchConstraints")
+
+#: The maximum number of elements, element counts, or peaks in a set of constraints.
+MAX_CONSTRAINTS = 10
+
+#: The supported search modes.
+SEARCH_MODES = ('I', 'Q', 'S', 'H', 'L', 'M')
+
+#: The search modes which require the molecular weight of the search spectrum.
+MW_SEARCH_MODES = ('H', 'L', 'M')
+
+#: The supported pre-search options.
+PRESEARCH_OPTIONS = ("default", "fast", "off")
+
+
+class SearchControls:
+	"""
+	Options controlling how spectra are compared in a library search.
+
+	Options which are :py:obj:`None` take the default value for the type of search.
+
+	:param min_mass: The lowest m/z used in the comparison.
+		``-1`` uses the larger of the lowest m/z in the library and search spectra.
+	:param max_mass: The highest m/z used in the comparison. ``-1`` means there is no upper limit.
+	:param min_abund: The lowest abundance used in the comparison, where the base peak has an abundance of 999.
+	:param search_mode: The type of search. One of:
+
+		* ``'I'`` -- Identity search.
+		* ``'Q'`` -- Quick identity search, which is faster but slightly less accurate than ``'I'``.
+		* ``'S'`` -- Similarity search, using the peaks in the spectrum.
+		* ``'L'`` -- Similarity search using neutral losses from the molecular ion.
+		* ``'H'`` -- Hybrid similarity search, using both peaks and neutral losses.
+		* ``'M'`` -- Search for an MS/MS spectrum in an EI library.
+
+		The ``'L'``, ``'H'`` and ``'M'`` searches require ``user_mw``.
+	:param user_mw: The nominal molecular weight of the compound which produced the search spectrum.
+	:param reverse: If :py:obj:`True`, the hits are ranked by their reverse match factors,
+		which ignore peaks in the search spectrum that are absent from the library spectrum.
+		This is useful for spectra containing peaks from impurities.
+	:param presearch: Whether the libraries are screened for candidate spectra before the spectra are compared.
+		``'default'`` compares only the spectra which pass the screen, ``'fast'`` uses a faster screen which passes fewer spectra,
+		and ``'off'`` compares every spectrum in the libraries.
+	:param timeout: The time in seconds after which the search is abandoned and :exc:`TimeoutError` is raised.
+		The search engine checks the time periodically, so the search may run for slightly longer.
+
+	.. versionchanged:: 0.9.0  Added the ``search_mode``, ``user_mw``, ``reverse``, ``presearch`` and ``timeout`` options.
+	"""
+
+	def __init__(
+			self,
+			min_mass: Optional[int] = None,
+			max_mass: Optional[int] = None,
+			min_abund: Optional[int] = None,
+			search_mode: Optional[str] = None,
+			user_mw: Optional[int] = None,
+			reverse: Optional[bool] = None,
+			presearch: Optional[str] = None,
+			timeout: Optional[float] = None,
+			) -> None:
+
+		if min_mass is not None and min_mass < -1:
+			raise ValueError("`min_mass` must be -1 or greater.")
+		if max_mass is not None and max_mass < -1:
+			raise ValueError("`max_mass` must be -1 or greater.")
+		if min_mass is not None and max_mass is not None and 0 < max_mass < min_mass:
+			raise ValueError("`max_mass` cannot be less than `min_mass`.")
+		if min_abund is not None and not 0 <= min_abund <= 999:
+			raise ValueError("`min_abund` must be between 0 and 999.")
+		if search_mode is not None and search_mode not in SEARCH_MODES:
+			raise ValueError(f"Unsupported search mode {search_mode!r}: must be one of {', '.join(SEARCH_MODES)}.")
+		if user_mw is not None and user_mw < 1:
+			raise ValueError("`user_mw` must be 1 or greater.")
+		if search_mode in MW_SEARCH_MODES and user_mw is None:
+			raise ValueError(f"`user_mw` is required for the {search_mode!r} search mode.")
+		if presearch is not None and presearch not in PRESEARCH_OPTIONS:
+			raise ValueError(f"Unsupported pre-search option {presearch!r}: must be one of {', '.join(PRESEARCH_OPTIONS)}.")
+		if timeout is not None and timeout <= 0:
+			raise ValueError("`timeout` must be greater than 0.")
+
+		self.min_mass: Optional[int] = None if min_mass is None else int(min_mass)
+		self.max_mass: Optional[int] = None if max_mass is None else int(max_mass)
+		self.min_abund: Optional[int] = None if min_abund is None else int(min_abund)
+		self.search_mode: Optional[str] = search_mode
+		self.user_mw: Optional[int] = None if user_mw is None else int(user_mw)
+		self.reverse: Optional[bool] = None if reverse is None else bool(reverse)
+		self.presearch: Optional[str] = presearch
+		self.timeout: Optional[float] = None if timeout is None else float(timeout)
+
+	def to_dict(self) -> Dict[str, Any]:
+		"""
+		Convert the object to a dictionary.
+		"""
+
+		return dict(
+				min_mass=self.min_mass,
+				max_mass=self.max_mass,
+				min_abund=self.min_abund,
+				search_mode=self.search_mode,
+				user_mw=self.user_mw,
+				reverse=self.reverse,
+				presearch=self.presearch,
+				timeout=self.timeout,
+				)
+
+	@classmethod
+	def from_dict(cls, dictionary: Dict[str, Any]) -> "SearchControls":
+		"""
+		Construct an object from a dictionary.
+
+		:param dictionary:
+		"""
+
+		return cls(**dictionary)
+
+	def to_json(self) -> str:
+		"""
+		Convert the object to json.
+		"""
+
+		return json.dumps(self.to_dict())
+
+	def to_pynist(self) -> Dict[str, Union[int, float, str]]:
+		"""
+		Convert the object to the form expected by the C extension.
+
+		Options which are :py:obj:`None` are omitted.
+		"""
+
+		controls = self.to_dict()
+		controls["impure"] = controls.pop("reverse")
+
+		return {key: int(value) if isinstance(value, bool) else value for key, value in controls.items() if value is not None}
+
+	def __eq__(self, other) -> bool:  # noqa: MAN001
+		if isinstance(other, self.__class__):
+			return self.to_dict() == other.to_dict()
+
+		return NotImplemented
+
+	def __repr__(self) -> str:
+		args = ", ".join(f"{key}={value!r}" for key, value in self.to_dict().items() if value is not None)
+		return f"{self.__class__.__name__}({args})"
+
+
+class SearchConstraints:
+	"""
+	Constraints on the hits returned by a library search.
+
+	:param min_mw: The minimum nominal molecular weight of the hits.
+	:param max_mw: The maximum nominal molecular weight of the hits.
+	:param elements: The elements permitted in the hits.
+	:param exact_elements: If :py:obj:`True`, each hit must contain exactly the elements in ``elements``.
+		Otherwise each hit may contain any subset of those elements.
+	:param element_counts: Constraints on the number of atoms of each element,
+		as ``(<symbol>, <comparison>, <count>)`` tuples where ``<comparison>`` is one of ``'<'``, ``'='`` or ``'>'``.
+		For example ``("Cl", ">", 1)`` requires more than one chlorine atom.
+	:param peaks: Peaks which must be present in the spectra of the hits,
+		as ``(<m/z>, <min abundance>, <max abundance>)`` tuples.
+		The abundances are percentages of the base peak.
+	:param relative_peaks: If :py:obj:`True`, the abundances of all but the first peak in ``peaks``
+		are percentages of the first peak rather than of the base peak.
+
+	At most 10 elements, element counts and peaks may be given.
+	"""
+
+	def __init__(
+			self,
+			min_mw: Optional[int] = None,
+			max_mw: Optional[int] = None,
+			elements: Optional[Iterable[str]] = None,
+			exact_elements: bool = False,
+			element_counts: Iterable[Tuple[str, str, int]] = (),
+			peaks: Iterable[Tuple[int, int, int]] = (),
+			relative_peaks: bool = False,
+			) -> None:
+
+		if min_mw is not None and min_mw < 0:
+			raise ValueError("`min_mw` cannot be negative.")
+		if max_mw is not None and max_mw < 0:
+			raise ValueError("`max_mw` cannot be negative.")
+		if min_mw is not None and max_mw is not None and max_mw < min_mw:
+			raise ValueError("`max_mw` cannot be less than `min_mw`.")
+
+		self.min_mw: Optional[int] = None if min_mw is None else int(min_mw)
+		self.max_mw: Optional[int] = None if max_mw is None else int(max_mw)
+
+		self.elements: Optional[List[str]] = None
+		if elements is not None:
+			self.elements = [_check_element(symbol) for symbol in elements]
+			_check_length(self.elements, "elements")
+
+		self.exact_elements: bool = bool(exact_elements)
+
+		self.element_counts: List[Tuple[str, str, int]] = []
+		for symbol, comparison, count in element_counts:
+			if comparison not in {'<', '=', '>'}:
+				raise ValueError(f"Invalid comparison {comparison!r} for element {symbol!r}: must be one of '<', '=', '>'.")
+			if count < 0:
+				raise ValueError(f"The count for element {symbol!r} cannot be negative.")
+			self.element_counts.append((_check_element(symbol), comparison, int(count)))
+		_check_length(self.element_counts, "element_counts")
+
+		self.relative_peaks: bool = bool(relative_peaks)
+
+		self.peaks: List[Tuple[int, int, int]] = []
+		for idx, (mass, min_abund, max_abund) in enumerate(peaks):
+			if mass < 1:
+				raise ValueError(f"Invalid m/z for peak: {mass!r}")
+			if not 0 <= min_abund <= max_abund:
+				raise ValueError(f"Invalid abundance range for m/z {mass}: {min_abund!r}-{max_abund!r}")
+			if max_abund > 100 and not (self.relative_peaks and idx):
+				raise ValueError(f"The maximum abundance for m/z {mass} cannot be greater than 100%.")
+			self.peaks.append((int(mass), int(min_abund), int(max_abund)))
+		_check_length(self.peaks, "peaks")
+
+	def to_dict(self) -> Dict[str, Any]:
+		"""
+		Convert the object to a dictionary.
+		"""
+
+		return dict(
+				min_mw=self.min_mw,
+				max_mw=self.max_mw,
+				elements=self.elements,
+				exact_elements=self.exact_elements,
+				element_counts=[list(count) for count in self.element_counts],
+				peaks=[list(peak) for peak in self.peaks],
+				relative_peaks=self.relative_peaks,
+				)
+
+	@classmethod
+	def from_dict(cls, dictionary: Dict[str, Any]) -> "SearchConstraints":
+		"""
+		Construct an object from a dictionary.
+
+		:param dictionary:
+		"""
+
+		return cls(**dictionary)
+
+	def to_json(self) -> str:
+		"""
+		Convert the object to json.
+		"""
+
+		return json.dumps(self.to_dict())
+
+	def to_pynist(self) -> Dict[str, Any]:
+		"""
+		Convert the object to the form expected by the C extension.
+		"""
+
+		return dict(
+				mw_min=_core.NO_VALUE if self.min_mw is None else self.min_mw,
+				mw_max=_core.NO_VALUE if self.max_mw is None else self.max_mw,
+				elements=self.elements or [],
+				elements_mode=_core.NISTMS_EXACT if self.exact_elements else _core.NISTMS_ELS_IN_LIST,
+				element_counts=self.element_counts,
+				peaks=self.peaks,
+				peaks_mode=_core.NISTMS_REL_PEAKS if self.relative_peaks else _core.NISTMS_ABS_PEAKS,
+				)
+
+	def __eq__(self, other) -> bool:  # noqa: MAN001
+		if isinstance(other, self.__class__):
+			return self.to_dict() == other.to_dict()
+
+		return NotImplemented
+
+	def __repr__(self) -> str:
+		args = ", ".join(f"{key}={value!r}" for key, value in self.to_dict().items() if value)
+		return f"{self.__class__.__name__}({args})"
+
+
+def _check_element(symbol: str) -> str:
+	symbol = str(symbol)
+
+	if not (1 <= len(symbol) <= 2 and symbol.isalpha() and symbol[0].isupper() and symbol[1:] == symbol[1:].lower()):
+		raise ValueError(f"Invalid element symbol {symbol!r}")
+
+	return symbol
+
+
+def _check_length(values: Sequence, name: str) -> None:
+	if len(values) > MAX_CONSTRAINTS:
+		raise ValueError(f"At most {MAX_CONSTRAINTS} `{name}` may be given.")
+
+
+def _any_peak_query(
+		peaks: Iterable[Tuple[int, int, int]],
+		min_matches: Optional[int],
+		) -> Tuple[List[Tuple[int, int, int]], int]:
+	"""
+	Validate the arguments to an any peak search.
+
+	:param peaks:
+	:param min_matches: If :py:obj:`None`, all of the peaks must match.
+	"""
+
+	checked_peaks: List[Tuple[int, int, int]] = []
+	for mass, min_abund, max_abund in peaks:
+		if mass < 1:
+			raise ValueError(f"Invalid m/z for peak: {mass!r}")
+		if not 1 <= min_abund <= max_abund <= 100:
+			raise ValueError(f"Invalid abundance range for m/z {mass}: {min_abund!r}-{max_abund!r}")
+		checked_peaks.append((int(mass), int(min_abund), int(max_abund)))
+
+	if not checked_peaks:
+		raise ValueError("At least one peak must be given.")
+	_check_length(checked_peaks, "peaks")
+
+	if min_matches is None:
+		min_matches = len(checked_peaks)
+	elif not 1 <= min_matches <= len(checked_peaks):
+		raise ValueError(f"`min_matches` must be between 1 and the number of peaks ({len(checked_peaks)}).")
+
+	return checked_peaks, int(min_matches)
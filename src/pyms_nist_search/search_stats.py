@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+#
+#  search_stats.py
+"""
+Statistics describing where the time in a library search was spent.
+
+.. versionadded:: 0.9.0
+"""
+#
+#  This file is part of PyMassSpec NIST Search
+#  Python interface to the NIST MS Search DLL
+#
+#  Copyright (c) 2020-2021 Dominic Davis-Foster <dominic@davis-foster.co.uk>
+#
+#  PyMassSpec NIST Search is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as
+#  published by the Free Software Foundation; either version 3 of
+#  the License, or (at your option) any later version.
+#
+#  PyMassSpec NIST Search is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public
+#  License along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+#  PyMassSpec NIST Search includes the redistributable binaries for NIST MS Search in
+#  the x86 and x64 directories. Available from
+#  ftp://chemdata.nist.gov/mass-spc/v1_7/NISTDLL3.zip .
+#  ctnt66.dll and ctnt66_64.dll copyright 1984-1996 FairCom Corporation.
+#  "FairCom" and "c-tree Plus" are trademarks of FairCom Corporation
+#  and are registered in the United States and other countries.
+#  All Rights Reserved.
+#
+
+# stdlib
+import json
+from typing import Any, Dict, Optional
+
+__all__ = ["SearchStats"]
+
+
+class SearchStats:
+	"""
+	Statistics for the library searches made by the most recent search call.
+
+	For calls which search several spectra, such as :meth:`~.win_engine.Engine.full_spectrum_search_many`,
+	the counts and times are totals for all of the spectra.
+
+	:param presearch: The pre-search option used for the searches.
+	:param num_searches: The number of spectra searched.
+	:param num_candidates: The number of library spectra which passed the pre-search.
+		:py:obj:`None` if the pre-search was off, as the search engine does not report it.
+	:param num_compared: The number of library spectra compared with the search spectra after the pre-search.
+		:py:obj:`None` if the pre-search was off.
+	:param num_hits: The number of hits found, before the hit list was truncated to the number of hits requested.
+	:param num_callbacks: The number of times the search engine reported its progress.
+	:param presearch_time: The time in seconds spent in the pre-search.
+	:param compare_time: The time in seconds spent comparing spectra.
+	"""
+
+	def __init__(
+			self,
+			presearch: str = "default",
+			num_searches: int = 0,
+			num_candidates: Optional[int] = None,
+			num_compared: Optional[int] = None,
+			num_hits: int = 0,
+			num_callbacks: int = 0,
+			presearch_time: float = 0.0,
+			compare_time: float = 0.0,
+			) -> None:
+
+		self.presearch: str = str(presearch)
+		self.num_searches: int = int(num_searches)
+		self.num_candidates: Optional[int] = None if num_candidates is None else int(num_candidates)
+		self.num_compared: Optional[int] = None if num_compared is None else int(num_compared)
+		self.num_hits: int = int(num_hits)
+		self.num_callbacks: int = int(num_callbacks)
+		self.presearch_time: float = float(presearch_time)
+		self.compare_time: float = float(compare_time)
+
+	@property
+	def total_time(self) -> float:
+		"""
+		The total time in seconds spent searching the library.
+		"""
+
+		return self.presearch_time + self.compare_time
+
+	def to_dict(self) -> Dict[str, Any]:
+		"""
+		Convert the object to a dictionary.
+		"""
+
+		return dict(
+				presearch=self.presearch,
+				num_searches=self.num_searches,
+				num_candidates=self.num_candidates,
+				num_compared=self.num_compared,
+				num_hits=self.num_hits,
+				num_callbacks=self.num_callbacks,
+				presearch_time=self.presearch_time,
+				compare_time=self.compare_time,
+				)
+
+	@classmethod
+	def from_dict(cls, dictionary: Dict[str, Any]) -> "SearchStats":
+		"""
+		Construct an object from a dictionary.
+
+		:param dictionary:
+		"""
+
+		return cls(**dictionary)
+
+	def to_json(self) -> str:
+		"""
+		Convert the object to json.
+		"""
+
+		return json.dumps(self.to_dict())
+
+	def __eq__(self, other) -> bool:  # noqa: MAN001
+		if isinstance(other, self.__class__):
+			return self.to_dict() == other.to_dict()
+
+		return NotImplemented
+
+	def __repr__(self) -> str:
+		args = ", ".join(f"{key}={value!r}" for key, value in self.to_dict().items())
+		return f"{self.__class__.__name__}({args})"
@@ -37,13 +37,21 @@ General utilities.
 # stdlib
 import ntpath
 import warnings
-from typing import Sequence
+from typing import Sequence, Union
 
 # 3rd party
 from domdf_python_tools.typing import PathLike
-from pyms.Spectrum import MassSpectrum
+from pyms.Peak.Class import Peak
+from pyms.Spectrum import MassSpectrum, Scan
 
-__all__ = ["pack", "parse_name_chars", "lib_name_from_path"]
+__all__ = ["pack", "parse_name_chars", "lib_name_from_path", "SpectrumLike", "as_mass_spectrum"]
+
+SpectrumLike = Union[MassSpectrum, Scan, Peak]
+"""
+Objects which can be converted into a :class:`pyms.Spectrum.MassSpectrum` by :func:`~.as_mass_spectrum`.
+
+.. versionadded:: 0.9.0
+"""
 
 
 def pack(mass_spec: MassSpectrum, top: int = 20) -> str:
@@ -135,3 +143,25 @@ def lib_name_from_path(lib_path: PathLike) -> str:
 	"""
 
 	return ntpath.split(lib_path)[-1]
+
+
+def as_mass_spectrum(spectrum: SpectrumLike) -> MassSpectrum:
+	"""
+	Returns a :class:`pyms.Spectrum.MassSpectrum` for the given spectrum, scan or peak.
+
+	This allows the scans of a :class:`pyms.GCMS.Class.GCMS_data` object, or a list of peaks,
+	to be passed directly to the search engine.
+
+	.. versionadded:: 0.9.0
+
+	:param spectrum:
+	"""
+
+	if isinstance(spectrum, MassSpectrum):
+		return spectrum
+	elif isinstance(spectrum, Peak):
+		return spectrum.mass_spectrum
+	elif isinstance(spectrum, Scan):
+		return MassSpectrum(spectrum.mass_list, spectrum.intensity_list)
+	else:
+		raise TypeError("`spectrum` must be a pyms.Spectrum.MassSpectrum, pyms.Spectrum.Scan or pyms.Peak.Class.Peak object.")
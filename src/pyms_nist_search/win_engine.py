@@ -35,18 +35,24 @@ Search engine for Windows systems.
 
 # stdlib
 import atexit
+import functools
+import itertools
 import os
 import pathlib
-from typing import List, Optional, Sequence, Tuple, Union
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
 
 # 3rd party
 from domdf_python_tools.typing import PathLike
 from pyms.Spectrum import MassSpectrum
 
 # this package
-from pyms_nist_search.reference_data import ReferenceData
+from pyms_nist_search.metrics import MetricsRegistry, registry
+from pyms_nist_search.msp import write_msp
+from pyms_nist_search.reference_data import LazyReferenceData, ReferenceData
+from pyms_nist_search.search_controls import SearchConstraints, SearchControls, _any_peak_query
 from pyms_nist_search.search_result import SearchResult
-from pyms_nist_search.utils import pack
+from pyms_nist_search.search_stats import SearchStats
+from pyms_nist_search.utils import SpectrumLike, as_mass_spectrum, pack, parse_name_chars
 
 # this package
 from . import _core  # type: ignore[attr-defined]
@@ -58,8 +64,6 @@ class Engine:
 	"""
 	Search engine for Windows systems.
 
-	.. TODO:: Search by Name. See page 13 of the documentation.
-
 	.. versionchanged:: 0.6.0  Added context manager support.
 	.. versionchanged:: 0.8.0  Add support for searching multiple libraries.
 
@@ -69,6 +73,9 @@ class Engine:
 	:param debug: Display debugging messages.
 	"""
 
+	#: The :class:`~.MetricsRegistry` which calls to the search methods are recorded in. Disabled by default.
+	metrics: MetricsRegistry = registry
+
 	def __init__(
 			self,
 			lib_path: Union[PathLike, Sequence[Tuple[PathLike, int]]],
@@ -145,12 +152,25 @@ class Engine:
 		"""
 
 	@staticmethod
-	def spectrum_search(mass_spec: MassSpectrum, n_hits: int = 5) -> List[SearchResult]:
+	@registry.instrument
+	def spectrum_search(
+			mass_spec: MassSpectrum,
+			n_hits: int = 5,
+			controls: Optional[SearchControls] = None,
+			constraints: Optional[SearchConstraints] = None,
+			) -> List[SearchResult]:
 		"""
 		Perform a Quick Spectrum Search of the mass spectral library.
 
+		Unless overridden by ``controls``, every spectrum in the library is compared
+		with ``mass_spec`` using the Quick identity search (search mode ``'Q'``).
+
+		.. versionchanged:: 0.9.0  Added the ``controls`` and ``constraints`` arguments.
+
 		:param mass_spec: The mass spectrum to search against the library.
 		:param n_hits: The number of hits to return.
+		:param controls: Options controlling how the spectra are compared.
+		:param constraints: Constraints on the hits returned, which are applied during the library search.
 
 		:return: List of possible identities for the mass spectrum.
 		"""
@@ -158,11 +178,19 @@ class Engine:
 		if not isinstance(mass_spec, MassSpectrum):
 			raise TypeError("`mass_spec` must be a pyms.Spectrum.MassSpectrum object.")
 
-		hit_list = _core._spectrum_search(pack(mass_spec, len(mass_spec)))[:n_hits]
+		with registry.phase("spectrum_search", "encode"):
+			packed_spectrum = pack(mass_spec, len(mass_spec))
+			pynist_controls = None if controls is None else controls.to_pynist()
+			pynist_constraints = None if constraints is None else constraints.to_pynist()
+
+		with registry.phase("spectrum_search", "dll"):
+			hit_list = _core._spectrum_search(packed_spectrum, pynist_controls, pynist_constraints)[:n_hits]
 
-		return [SearchResult.from_pynist(hit) for hit in hit_list]
+		with registry.phase("spectrum_search", "decode"):
+			return [SearchResult.from_pynist(hit) for hit in hit_list]
 
 	@staticmethod
+	@registry.instrument
 	def cas_search(cas: str) -> List[SearchResult]:
 		"""
 		Search for a compound by CAS number.
@@ -178,12 +206,107 @@ class Engine:
 
 		return [SearchResult.from_pynist(hit) for hit in _core._cas_search(cas)]
 
-	def full_spectrum_search(self, mass_spec: MassSpectrum, n_hits: int = 5) -> List[SearchResult]:
+	@registry.instrument
+	def name_search(self, name: str, lib_idx: Optional[int] = None) -> List[SearchResult]:
+		"""
+		Search for a compound by name, using the name index of the library.
+
+		Synonyms are searched as well as the primary name of each compound.
+		Names are compared ignoring case, spaces and punctuation,
+		and only the first 18 letters and digits are considered.
+
+		.. versionadded:: 0.9.0
+
+		:param name:
+		:param lib_idx: The (zero-based) index of the library to search
+			(see :meth:`~.get_lib_paths`). If :py:obj:`None` every library is searched in turn.
+
+		:return: List of compounds with the given name.
+		"""
+
+		if lib_idx is None:
+			lib_indices: Iterable[int] = range(len(self.get_lib_paths()))
+		else:
+			lib_indices = [lib_idx]
+
+		return [SearchResult.from_pynist(hit) for idx in lib_indices for hit in _core._name_search(idx, name)]
+
+	@staticmethod
+	@registry.instrument
+	def formula_search(formula: str) -> List[SearchResult]:
+		"""
+		Search for compounds by chemical formula, using the formula index of the library.
+
+		Elements may be given in any order. A semi-structural formula,
+		such as ``C6H3(CH3)2(C4H9)``, is converted to the net formula before searching.
+
+		.. versionadded:: 0.9.0
+
+		:param formula:
+
+		:return: List of compounds with the given formula.
+		"""
+
+		return [SearchResult.from_pynist(hit) for hit in _core._index_search(_core.NISTMS_FORMULA_SRCH, formula)]
+
+	@staticmethod
+	@registry.instrument
+	def mw_search(mw: int) -> List[SearchResult]:
+		"""
+		Search for compounds by nominal molecular weight, using the molecular weight index of the library.
+
+		.. versionadded:: 0.9.0
+
+		:param mw:
+
+		:return: List of compounds with the given molecular weight.
+		"""
+
+		if mw < 0:
+			raise ValueError("`mw` cannot be negative.")
+
+		return [SearchResult.from_pynist(hit) for hit in _core._index_search(_core.NISTMS_MW_SRCH, str(int(mw)))]
+
+	@staticmethod
+	@registry.instrument
+	def nist_no_search(nist_no: int) -> List[SearchResult]:
+		"""
+		Search for a compound by NIST registry number.
+
+		.. note:: This requires the ``SPECNO.INU`` index, which is not present in all user libraries.
+
+		.. versionadded:: 0.9.0
+
+		:param nist_no:
+
+		:return: List of results for the NIST number (usually just one result).
+		"""
+
+		return [
+				SearchResult.from_pynist(hit)
+				for hit in _core._index_search(_core.NISTMS_NISTNO_SRCH, str(int(nist_no)))
+				]
+
+	@registry.instrument
+	def full_spectrum_search(
+			self,
+			mass_spec: MassSpectrum,
+			n_hits: int = 5,
+			controls: Optional[SearchControls] = None,
+			constraints: Optional[SearchConstraints] = None,
+			) -> List[SearchResult]:
 		"""
 		Perform a Full Spectrum Search of the mass spectral library.
 
+		Unless overridden by ``controls``, the library is screened for candidate spectra
+		which are then compared with ``mass_spec`` using the Identity search (search mode ``'I'``).
+
+		.. versionchanged:: 0.9.0  Added the ``controls`` and ``constraints`` arguments.
+
 		:param mass_spec: The mass spectrum to search against the library.
 		:param n_hits: The number of hits to return.
+		:param controls: Options controlling how the spectra are compared.
+		:param constraints: Constraints on the hits returned, which are applied during the library search.
 
 		:return: List of possible identities for the mass spectrum.
 		"""
@@ -191,20 +314,190 @@ class Engine:
 		if not isinstance(mass_spec, MassSpectrum):
 			raise TypeError("`mass_spec` must be a pyms.Spectrum.MassSpectrum object.")
 
-		hit_list = _core._full_spectrum_search(pack(mass_spec, len(mass_spec)))[:n_hits]
+		with registry.phase("full_spectrum_search", "encode"):
+			packed_spectrum = pack(mass_spec, len(mass_spec))
+			pynist_controls = None if controls is None else controls.to_pynist()
+			pynist_constraints = None if constraints is None else constraints.to_pynist()
+
+		with registry.phase("full_spectrum_search", "dll"):
+			hit_list = _core._full_spectrum_search(packed_spectrum, pynist_controls, pynist_constraints)[:n_hits]
+
+		with registry.phase("full_spectrum_search", "decode"):
+			return [SearchResult.from_pynist(hit) for hit in hit_list]
+
+	@staticmethod
+	@registry.instrument
+	def screen_search(mass_spec: MassSpectrum, controls: Optional[SearchControls] = None) -> List[int]:
+		"""
+		Screen the mass spectral library for spectra which may match ``mass_spec``, without comparing the spectra.
+
+		This is much faster than a full search, so can be used to decide which spectra are worth searching in full.
+
+		.. versionadded:: 0.9.0
+
+		:param mass_spec: The mass spectrum to search against the library.
+		:param controls: Options controlling the screen search.
+			The ``presearch`` option cannot be ``'off'``.
+
+		:return: The locations of the candidate spectra in the library.
+			These can be passed to :meth:`~.get_reference_data`.
+		"""
+
+		if not isinstance(mass_spec, MassSpectrum):
+			raise TypeError("`mass_spec` must be a pyms.Spectrum.MassSpectrum object.")
+
+		return _core._screen_search(
+				pack(mass_spec, len(mass_spec)),
+				None if controls is None else controls.to_pynist(),
+				)
+
+	@staticmethod
+	@registry.instrument
+	def any_peak_search(peaks: Iterable[Tuple[int, int, int]], min_matches: Optional[int] = None) -> List[int]:
+		"""
+		Find the spectra in the mass spectral library which contain the given peaks.
 
-		return [SearchResult.from_pynist(hit) for hit in hit_list]
+		The library's peak index is used rather than comparing spectra, so this is much faster than a spectrum search.
 
+		.. versionadded:: 0.9.0
+
+		:param peaks: The peaks to look for, as ``(<m/z>, <min abundance>, <max abundance>)`` tuples.
+			The abundances are percentages of the base peak, between 1 and 100. At most 10 peaks may be given.
+		:param min_matches: The minimum number of the peaks each spectrum must contain.
+			By default each spectrum must contain all of the peaks.
+
+		:return: The locations of the matching spectra in the library.
+			These can be passed to :meth:`~.get_reference_data`.
+		"""
+
+		return _core._any_peak_search(*_any_peak_query(peaks, min_matches))
+
+	def iter_full_spectrum_search(
+			self,
+			spectra: Iterable[SpectrumLike],
+			n_hits: int = 5,
+			max_in_flight: int = 1,
+			controls: Optional[SearchControls] = None,
+			constraints: Optional[SearchConstraints] = None,
+			) -> Iterator[Tuple[int, List[SearchResult]]]:
+		"""
+		Perform a Full Spectrum Search of the mass spectral library for each spectrum in ``spectra``.
+
+		Results are yielded as ``(index, hits)`` tuples as each search finishes,
+		where ``index`` is the position of the spectrum in ``spectra``.
+		``spectra`` is only consumed as results are yielded, so it can be a lazy iterable
+		such as the scans of a :class:`pyms.GCMS.Class.GCMS_data` object.
+
+		.. versionadded:: 0.9.0
+
+		:param spectra: The mass spectra to search against the library.
+			May also contain :class:`pyms.Spectrum.Scan` and :class:`pyms.Peak.Class.Peak` objects.
+		:param n_hits: The number of hits to return for each spectrum.
+		:param max_in_flight: Ignored. The NIST MS Search DLL can only perform one search at a time,
+			so searches are always performed sequentially and results are yielded in order.
+			Accepted for compatibility with :meth:`.docker_engine.Engine.iter_full_spectrum_search`.
+		:param controls: Options controlling how the spectra are compared.
+		:param constraints: Constraints on the hits returned, which are applied during the library search.
+		"""
+
+		if max_in_flight < 1:
+			raise ValueError("`max_in_flight` must be at least 1.")
+
+		for idx, spectrum in enumerate(spectra):
+			yield idx, self.full_spectrum_search(as_mass_spectrum(spectrum), n_hits, controls, constraints)
+
+	@staticmethod
+	@registry.instrument
+	def full_spectrum_search_many(
+			spectra: Iterable[SpectrumLike],
+			n_hits: int = 5,
+			controls: Optional[SearchControls] = None,
+			constraints: Optional[SearchConstraints] = None,
+			release_gil: bool = False,
+			) -> List[List[SearchResult]]:
+		"""
+		Perform a Full Spectrum Search of the mass spectral library for each spectrum in ``spectra``.
+
+		All of the spectra are passed to the C extension at once, and searched without returning to Python
+		between searches, so the per-spectrum overhead is much lower than calling
+		:meth:`~.full_spectrum_search` for each spectrum.
+
+		.. versionadded:: 0.9.0
+
+		:param spectra: The mass spectra to search against the library.
+			May also contain :class:`pyms.Spectrum.Scan` and :class:`pyms.Peak.Class.Peak` objects.
+		:param n_hits: The number of hits to return for each spectrum.
+		:param controls: Options controlling how the spectra are compared.
+		:param constraints: Constraints on the hits returned, which are applied during the library search.
+		:param release_gil: Release the GIL while the spectra are searched, so other Python threads can run.
+			The search engine must not be used from another thread until the searches finish,
+			except to call :meth:`~.cancel_search`.
+
+		:return: The hits for each spectrum, in the same order as ``spectra``.
+		"""
+
+		with registry.phase("full_spectrum_search_many", "encode"):
+			packed_spectra = []
+			for spectrum in spectra:
+				mass_spec = as_mass_spectrum(spectrum)
+				packed_spectra.append(pack(mass_spec, len(mass_spec)).encode("ASCII"))
+
+		if not packed_spectra:
+			return []
+
+		with registry.phase("full_spectrum_search_many", "dll"):
+			hit_table = _core._full_spectrum_search_batch(
+					b''.join(packed_spectra),
+					[0, *itertools.accumulate(map(len, packed_spectra))],
+					n_hits,
+					None if controls is None else controls.to_pynist(),
+					None if constraints is None else constraints.to_pynist(),
+					release_gil,
+					)
+
+		registry.increment("full_spectrum_search_many", "spectra", len(packed_spectra))
+
+		with registry.phase("full_spectrum_search_many", "decode"):
+			return _hit_lists_from_table(hit_table, len(packed_spectra))
+
+	@staticmethod
+	def cancel_search() -> None:
+		"""
+		Cancel the library search in progress, which then raises :exc:`RuntimeError`.
+
+		Only searches started by :meth:`~.full_spectrum_search_many` with ``release_gil=True``
+		can be cancelled, by calling this method from another thread.
+		Other searches hold the GIL until they finish, so cannot be interrupted.
+
+		.. versionadded:: 0.9.0
+		"""
+
+		_core._cancel_search()
+
+	@registry.instrument
 	def full_search_with_ref_data(
 			self,
 			mass_spec: MassSpectrum,
 			n_hits: int = 5,
+			prefetch: int = 1,
+			controls: Optional[SearchControls] = None,
+			constraints: Optional[SearchConstraints] = None,
 			) -> List[Tuple[SearchResult, ReferenceData]]:
 		"""
 		Perform a Full Spectrum Search of the mass spectral library, including reference data.
 
+		The reference data for the top ``prefetch`` hits is retrieved immediately.
+		The reference data for the remaining hits is only retrieved from the library
+		when it is first accessed (see :class:`~.LazyReferenceData`).
+
+		.. versionchanged:: 0.9.0  Added the ``prefetch``, ``controls`` and ``constraints`` arguments.
+
 		:param mass_spec: The mass spectrum to search against the library.
 		:param n_hits: The number of hits to return.
+		:param prefetch: The number of hits to retrieve the reference data for immediately.
+			Pass a value of ``n_hits`` or greater to retrieve the reference data for all hits.
+		:param controls: Options controlling how the spectra are compared.
+		:param constraints: Constraints on the hits returned, which are applied during the library search.
 
 		:return: List of tuples containing possible identities
 			for the mass spectrum, and the reference data
@@ -213,17 +506,29 @@ class Engine:
 		if not isinstance(mass_spec, MassSpectrum):
 			raise TypeError("`mass_spec` must be a pyms.Spectrum.MassSpectrum object.")
 
-		hit_list = self.full_spectrum_search(mass_spec, n_hits)
+		if prefetch < 0:
+			raise ValueError("`prefetch` cannot be negative.")
+
+		hit_list = self.full_spectrum_search(mass_spec, n_hits, controls, constraints)
 
-		output_buffer = []
+		prefetched = self.get_reference_data_many([hit.spec_loc for hit in hit_list[:prefetch]])
+
+		output_buffer: List[Tuple[SearchResult, ReferenceData]] = []
 
 		for idx, hit in enumerate(hit_list):
-			ref_data = self.get_reference_data(hit.spec_loc)
+			if idx < prefetch:
+				ref_data = prefetched[idx]
+			else:
+				ref_data = LazyReferenceData(functools.partial(self.get_reference_data, hit.spec_loc))
 			output_buffer.append((hit, ref_data))
 
+		registry.increment("full_search_with_ref_data", "reference_data_prefetched", len(prefetched))
+		registry.increment("full_search_with_ref_data", "reference_data_deferred", len(hit_list) - len(prefetched))
+
 		return output_buffer
 
 	@staticmethod
+	@registry.instrument
 	def get_reference_data(spec_loc: int) -> ReferenceData:
 		"""
 		Get reference data from the library for the compound at the given location.
@@ -235,6 +540,91 @@ class Engine:
 
 		return ReferenceData.from_pynist(reference_data)
 
+	@staticmethod
+	@registry.instrument
+	def get_reference_data_many(spec_locs: Iterable[int]) -> List[ReferenceData]:
+		"""
+		Get reference data from the library for the compounds at each of the given locations.
+
+		Repeated locations are only retrieved from the library once,
+		and the same :class:`~.ReferenceData` object is returned for each occurrence.
+
+		.. versionadded:: 0.9.0
+
+		:param spec_locs:
+
+		:return: The reference data for each location, in the same order as ``spec_locs``.
+		"""
+
+		spec_locs = [int(spec_loc) for spec_loc in spec_locs]
+		unique_spec_locs = list(dict.fromkeys(spec_locs))
+
+		reference_data = {
+				spec_loc: ReferenceData.from_pynist(record)
+				for spec_loc, record in zip(unique_spec_locs, _core._get_reference_data_many(unique_spec_locs))
+				}
+
+		return [reference_data[spec_loc] for spec_loc in spec_locs]
+
+	def iter_library(self, lib_idx: Optional[int] = None, batch_size: int = 1000) -> Iterator[ReferenceData]:
+		"""
+		Iterate over every record in the library, in order of ID number.
+
+		The records are retrieved from the library in batches of ``batch_size``,
+		so only one batch is held in memory at a time.
+
+		.. versionadded:: 0.9.0
+
+		:param lib_idx: The (zero-based) index of the library to iterate over
+			(see :meth:`~.get_lib_paths`). If :py:obj:`None` every library is iterated over in turn.
+		:param batch_size: The number of records to retrieve at once.
+		"""
+
+		if batch_size < 1:
+			raise ValueError("`batch_size` must be at least 1.")
+
+		if lib_idx is None:
+			lib_indices: Iterable[int] = range(len(self.get_lib_paths()))
+		else:
+			lib_indices = [lib_idx]
+
+		for lib_idx in lib_indices:
+			first_id = 0
+
+			while True:
+				spec_locs = _core._seq_id_search(lib_idx, first_id)
+				if not spec_locs:
+					break
+
+				for start in range(0, len(spec_locs), batch_size):
+					records = self.get_reference_data_many(spec_locs[start:start + batch_size])
+					yield from records
+
+				# Guard against looping forever if the library does not return the records in order.
+				next_id = int(records[-1].id) + 1
+				if next_id <= first_id:
+					raise ValueError(f"The records in library {lib_idx} are not in order of ID number.")
+				first_id = next_id
+
+	def export_msp(self, filename: PathLike, lib_idx: Optional[int] = None) -> int:
+		"""
+		Export the library to an MSP file.
+
+		The records are written to the file as they are retrieved from the library,
+		so the whole library is never held in memory.
+
+		.. versionadded:: 0.9.0
+
+		:param filename: The file to write the library to.
+		:param lib_idx: The (zero-based) index of the library to export
+			(see :meth:`~.get_lib_paths`). If :py:obj:`None` every library is exported.
+
+		:return: The number of records written.
+		"""
+
+		with open(filename, 'w', encoding="UTF-8") as fp:
+			return write_msp(self.iter_library(lib_idx), fp)
+
 	def get_lib_paths(self) -> List[str]:
 		"""
 		Returns the list of library names currently in use.
@@ -255,8 +645,48 @@ class Engine:
 
 		return _core._get_active_libs()
 
+	@staticmethod
+	def get_search_stats() -> SearchStats:
+		"""
+		Returns statistics for the library searches made by the most recent spectrum search call.
+
+		These include the number of spectra which passed the pre-search and the time spent comparing spectra.
+
+		.. versionadded:: 0.9.0
+		"""
+
+		return SearchStats.from_dict(_core._get_search_stats())
+
 	def __enter__(self) -> "Engine":
 		return self
 
 	def __exit__(self, exc_type, exc_val, exc_tb):
 		self.uninit()
+
+
+def _hit_lists_from_table(hit_table: Dict[str, Any], num_spectra: int) -> List[List[SearchResult]]:
+	"""
+	Convert the columnar hit table returned by ``_core._full_spectrum_search_batch`` to a list of hits for each spectrum.
+
+	:param hit_table:
+	:param num_spectra:
+	"""
+
+	hit_lists: List[List[SearchResult]] = [[] for _ in range(num_spectra)]
+	hit_names = hit_table["hit_names"]
+	name_width = hit_table["name_width"]
+
+	for row, query_idx in enumerate(hit_table["query_idx"]):
+		hit_lists[query_idx].append(
+				SearchResult(
+						name=parse_name_chars(hit_names[row * name_width:(row + 1) * name_width]),
+						cas=hit_table["cas_no"][row],
+						match_factor=hit_table["sim_num"][row],
+						reverse_match_factor=hit_table["rev_sim_num"][row],
+						hit_prob=hit_table["hit_prob"][row] / 100,
+						spec_loc=hit_table["spec_loc"][row],
+						lib_idx=hit_table["lib_idx"][row],
+						)
+				)
+
+	return hit_lists
@@ -0,0 +1,146 @@
+# stdlib
+import json
+
+# 3rd party
+import numpy
+import pytest
+from domdf_python_tools.paths import PathPlus
+from pyms.Spectrum import MassSpectrum
+
+# this package
+from pyms_nist_search import ReferenceData
+from pyms_nist_search.compiled_library import (
+		CompiledLibrary,
+		compile_jcamp_dir,
+		compile_mona_json,
+		compile_msp,
+		write_compiled_library
+		)
+from pyms_nist_search.msp import write_msp
+
+
+@pytest.fixture()
+def records():
+	return [
+			ReferenceData(
+					name="Benzene",
+					cas="71-43-2",
+					formula="C6H6",
+					mw=78,
+					nist_no=228160,
+					synonyms=["Benzol", "Cyclohexatriene"],
+					contributor="MoNA",
+					id="MoNA000001",
+					lib_idx=2,
+					mass_spec=MassSpectrum([50, 51, 52, 77, 78, 79], [15, 20, 18, 200, 1000, 64]),
+					),
+			ReferenceData(name="No spectrum", exact_mass=123.456),
+			ReferenceData(
+					name="Ünïcödé 2-Propanol",
+					mw=60,
+					mass_spec=MassSpectrum([41.5, 45.0], [0.25, 999]),
+					),
+			ReferenceData(
+					name="abc",
+					cas="1-2-3",
+					synonyms=['x', 'y'],
+					mass_spec=MassSpectrum([41, 42, 43], [10, 20, 30]),
+					),
+			]
+
+
+def test_round_trip(tmp_path, records):
+	filename = PathPlus(tmp_path) / "library.pynistlib"
+	assert write_compiled_library(iter(records), filename) == 4
+
+	with CompiledLibrary(filename) as library:
+		assert len(library) == 4
+		assert list(library) == records
+		assert library[-1] == records[3]
+		assert library[-1].synonyms == ['x', 'y']
+		mass_spec = library[3].mass_spec
+		assert mass_spec is not None
+		assert mass_spec.mass_list == [41, 42, 43]
+		assert library[1:] == records[1:]
+		assert library[1].mass_spec is None
+		assert library[1].exact_mass == 123.456
+		assert library[0].lib_idx == 2
+		assert library.get_name(2) == "Ünïcödé 2-Propanol"
+
+		mz, intensities = library.get_spectrum(0)  # type: ignore[misc]
+		assert mz.dtype == numpy.float32
+		assert not mz.flags.writeable
+		assert mz.tolist() == [50, 51, 52, 77, 78, 79]
+		assert intensities.tolist() == [15, 20, 18, 200, 1000, 64]
+		assert library.get_spectrum(1) is None
+
+		with pytest.raises(IndexError, match="Record index out of range"):
+			library[4]  # pylint: disable=pointless-statement
+
+
+def test_empty_library(tmp_path):
+	filename = PathPlus(tmp_path) / "library.pynistlib"
+	assert write_compiled_library([], filename) == 0
+
+	with CompiledLibrary(filename) as library:
+		assert len(library) == 0
+		assert list(library) == []
+
+
+def test_invalid_file(tmp_path):
+	tmp_pathplus = PathPlus(tmp_path)
+
+	for contents in [b'', b"Not a library", b"NOTALIBR" + b"\0" * 100]:
+		(tmp_pathplus / "invalid.pynistlib").write_bytes(contents)
+
+		with pytest.raises(ValueError, match="is not a compiled library."):
+			CompiledLibrary(tmp_pathplus / "invalid.pynistlib")
+
+
+def test_compile_msp(tmp_path, records):
+	tmp_pathplus = PathPlus(tmp_path)
+	records = [records[0], records[2]]
+
+	with (tmp_pathplus / "library.msp").open('w') as fp:
+		write_msp(records, fp)
+
+	assert compile_msp(tmp_pathplus / "library.msp", tmp_pathplus / "library.pynistlib") == 2
+
+	with CompiledLibrary(tmp_pathplus / "library.pynistlib") as library:
+		assert [ref_data.name for ref_data in library] == ["Benzene", "Ünïcödé 2-Propanol"]
+		# MSP intensities are normalised to 999
+		mass_spec = library[0].mass_spec
+		assert mass_spec is not None
+		assert mass_spec.intensity_list == [15, 20, 18, 200, 999, 64]
+
+
+def test_compile_jcamp_dir(tmp_path):
+	tmp_pathplus = PathPlus(tmp_path)
+	(tmp_pathplus / "jdx").mkdir()
+	(tmp_pathplus / "jdx" / "1.jdx").write_text("##TITLE=Benzene\n##MW=78\n##PEAK TABLE=(XY..XY)\n77,100 78,999\n##END=\n")
+
+	assert compile_jcamp_dir(tmp_pathplus / "jdx", tmp_pathplus / "library.pynistlib", workers=1) == 1
+
+	with CompiledLibrary(tmp_pathplus / "library.pynistlib") as library:
+		(ref_data, ) = library
+		assert ref_data.name == "Benzene"
+		assert ref_data.mw == 78
+		assert ref_data.mass_spec is not None
+		assert ref_data.mass_spec.mass_list == [77, 78]
+
+
+def test_compile_mona_json(tmp_path):
+	tmp_pathplus = PathPlus(tmp_path)
+	mona_data = [{
+			"id": "MoNA000001",
+			"compound": [{"names": [{"name": "Benzene"}, {"name": "Benzol"}], "metaData": []}],
+			"metaData": [{"name": "license", "value": "CC BY", "computed": False}],
+			"submitter": {"institution": "University"},
+			"spectrum": "77:100 78:999",
+			}]
+	(tmp_pathplus / "mona.json").write_text(json.dumps(mona_data))
+
+	assert compile_mona_json(tmp_pathplus / "mona.json", tmp_pathplus / "library.pynistlib") == 1
+
+	with CompiledLibrary(tmp_pathplus / "library.pynistlib") as library:
+		assert list(library) == [ReferenceData.from_mona_dict(mona_data[0])]
@@ -0,0 +1,229 @@
+# stdlib
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+# 3rd party
+import pytest
+import requests
+from pyms.Spectrum import MassSpectrum
+
+# this package
+from pyms_nist_search import ReferenceData, SearchResult, docker_engine
+from pyms_nist_search.reference_data import LazyReferenceData
+from pyms_nist_search.search_controls import SearchConstraints, SearchControls
+from pyms_nist_search.search_stats import SearchStats
+
+
+class FakeSearchServer:
+	"""
+	Stands in for the search server, responding to requests with canned JSON data.
+
+	Requests for any other URL get a 404 response, as from an older docker image.
+	"""
+
+	def __init__(self, routes: Dict[str, Any]):
+		self.routes = routes
+		self.requests: List[Tuple[str, str]] = []
+
+	def request(self, method: str, url: str, **kwargs) -> requests.Response:
+		path = url[len("http://localhost:5001"):]
+		self.requests.append((method, path))
+
+		response = requests.Response()
+		response.url = url
+
+		if path in self.routes:
+			response.status_code = 200
+			response._content = json.dumps(self.routes[path]).encode("UTF-8")
+		else:
+			response.status_code = 404
+			response._content = b"Not Found"
+
+		return response
+
+
+def make_engine(monkeypatch, routes: Dict[str, Any]) -> Tuple[docker_engine.Engine, FakeSearchServer]:
+	server = FakeSearchServer(routes)
+	monkeypatch.setattr(requests, "get", lambda url, **kwargs: server.request("GET", url, **kwargs))
+	monkeypatch.setattr(requests, "post", lambda url, **kwargs: server.request("POST", url, **kwargs))
+
+	# Skip __init__, which would launch the docker container
+	engine = docker_engine.Engine.__new__(docker_engine.Engine)
+	engine.initialised = True
+	engine._server_features = None
+
+	return engine, server
+
+
+@pytest.mark.parametrize("features", [None, []])
+def test_search_options_unsupported(monkeypatch, features: Optional[List[str]]):
+	routes = {} if features is None else {"/info/features": features}
+	engine, server = make_engine(monkeypatch, routes)
+
+	# Default options don't need the server's support
+	engine._check_search_options(None, None)
+	engine._check_search_options(SearchControls(), SearchConstraints())
+	assert server.requests == []
+
+	with pytest.raises(docker_engine.UnsupportedFeatureError, match="update the .* docker image"):
+		engine._check_search_options(SearchControls(timeout=3), None)
+
+	with pytest.raises(docker_engine.UnsupportedFeatureError, match="search controls or constraints"):
+		engine._check_search_options(SearchControls(timeout=3), None)
+
+	# The server is only asked once
+	assert server.requests == [("GET", "/info/features")]
+
+
+def test_search_options_supported(monkeypatch):
+	engine, server = make_engine(monkeypatch, {"/info/features": ["search_options"]})
+	engine._check_search_options(SearchControls(timeout=3), None)
+	engine._check_search_options(SearchControls(min_mass=40), None)
+	assert server.requests == [("GET", "/info/features")]
+
+
+def reference_data_json(spec_loc: int) -> Dict[str, Any]:
+	return json.loads(ReferenceData(name=f"Compound {spec_loc}", cas="71-43-2", id=str(spec_loc)).to_json())
+
+
+def test_get_reference_data_many(monkeypatch):
+	routes = {"/info/features": ["loc_many"], "/search/loc_many/": [reference_data_json(3), reference_data_json(4)]}
+	engine, server = make_engine(monkeypatch, routes)
+
+	first, second, third = engine.get_reference_data_many([3, 4, 3])
+	assert first.name == "Compound 3"
+	assert second.name == "Compound 4"
+	assert third is first
+
+	engine.get_reference_data_many([3, 4])
+	assert server.requests == [("GET", "/info/features"), ("POST", "/search/loc_many/"), ("POST", "/search/loc_many/")]
+
+
+def test_get_reference_data_many_fallback(monkeypatch):
+	routes = {"/search/loc/3": reference_data_json(3), "/search/loc/4": reference_data_json(4)}
+	engine, server = make_engine(monkeypatch, routes)
+
+	first, second, third = engine.get_reference_data_many([3, 4, 3])
+	assert first.name == "Compound 3"
+	assert second.name == "Compound 4"
+	assert third is first
+
+	engine.get_reference_data_many([4])
+
+	# The features are only requested once, and the missing endpoint is never requested.
+	assert server.requests == [
+			("GET", "/info/features"),
+			("POST", "/search/loc/3"),
+			("POST", "/search/loc/4"),
+			("POST", "/search/loc/4"),
+			]
+
+
+def search_result_json(spec_loc: int) -> Dict[str, Any]:
+	return json.loads(SearchResult(name=f"Compound {spec_loc}", cas="71-43-2", spec_loc=spec_loc).to_json())
+
+
+def test_full_search_with_ref_data(monkeypatch):
+	routes = {
+			"/search/spectrum_with_ref_data/": [[search_result_json(idx), reference_data_json(idx)] for idx in range(3)],
+			"/search/spectrum/": [search_result_json(idx) for idx in range(3)],
+			"/search/loc/1": reference_data_json(1),
+			"/search/loc/2": reference_data_json(2),
+			}
+	engine, server = make_engine(monkeypatch, routes)
+	mass_spec = MassSpectrum([50, 51], [15, 20])
+
+	# By default the reference data is retrieved with the hits, and is independent of the engine.
+	hit_list = engine.full_search_with_ref_data(mass_spec, n_hits=3)
+	assert server.requests == [("POST", "/search/spectrum_with_ref_data/")]
+	assert [ref_data.name for hit, ref_data in hit_list] == ["Compound 0", "Compound 1", "Compound 2"]
+	assert not any(isinstance(ref_data, LazyReferenceData) for hit, ref_data in hit_list)
+
+	# Lazy loading is opt-in
+	server.requests.clear()
+	lazy_hit_list = engine.full_search_with_ref_data(mass_spec, n_hits=3, prefetch=0)
+	assert server.requests == [("POST", "/search/spectrum/")]
+	assert all(isinstance(ref_data, LazyReferenceData) for hit, ref_data in lazy_hit_list)
+
+	assert lazy_hit_list[1][1].name == "Compound 1"
+	assert server.requests == [("POST", "/search/spectrum/"), ("POST", "/search/loc/1")]
+
+
+def test_index_search_unsupported(monkeypatch):
+	engine, server = make_engine(monkeypatch, {})
+
+	with pytest.raises(docker_engine.UnsupportedFeatureError, match="index searches"):
+		engine.name_search("Benzene", lib_idx=0)
+
+	with pytest.raises(docker_engine.UnsupportedFeatureError, match="index searches"):
+		engine.formula_search("C6H6")
+
+	assert server.requests == [("GET", "/info/features")]
+
+
+def test_index_search(monkeypatch):
+	routes = {
+			"/info/features": ["index_search"],
+			"/search/name/0": [search_result_json(1)],
+			"/search/mw": [search_result_json(2), search_result_json(3)],
+			}
+	engine, server = make_engine(monkeypatch, routes)
+
+	assert [hit.spec_loc for hit in engine.name_search("Benzene", lib_idx=0)] == [1]
+	assert [hit.spec_loc for hit in engine.mw_search(78)] == [2, 3]
+
+
+def test_screen_search(monkeypatch):
+	mass_spec = MassSpectrum([50, 51], [15, 20])
+
+	engine, server = make_engine(monkeypatch, {})
+	with pytest.raises(docker_engine.UnsupportedFeatureError, match="screen searches"):
+		engine.screen_search(mass_spec)
+
+	engine, server = make_engine(monkeypatch, {"/info/features": ["screen_search"], "/search/screen/": [1, 2]})
+	assert engine.screen_search(mass_spec) == [1, 2]
+
+
+def test_any_peak_search(monkeypatch):
+	engine, server = make_engine(monkeypatch, {})
+	with pytest.raises(docker_engine.UnsupportedFeatureError, match="peak searches"):
+		engine.any_peak_search([(78, 50, 100)])
+
+	engine, server = make_engine(monkeypatch, {"/info/features": ["any_peak_search"], "/search/any_peak/": [3]})
+	assert engine.any_peak_search([(78, 50, 100)]) == [3]
+
+
+def test_get_search_stats(monkeypatch):
+	engine, server = make_engine(monkeypatch, {})
+	with pytest.raises(docker_engine.UnsupportedFeatureError, match="search statistics"):
+		engine.get_search_stats()
+
+	stats = SearchStats(num_searches=1, num_hits=5)
+	engine, server = make_engine(monkeypatch, {"/info/features": ["search_stats"], "/info/search_stats": stats.to_dict()})
+	assert engine.get_search_stats() == stats
+
+
+def test_iter_library(monkeypatch):
+	engine, server = make_engine(monkeypatch, {})
+	with pytest.raises(docker_engine.UnsupportedFeatureError, match="iterating over the library"):
+		list(engine.iter_library(lib_idx=0))
+
+	routes = {
+			"/info/features": ["seq_id_search"],
+			"/search/seq_id/0/0": [3, 4],
+			"/search/seq_id/0/5": [],
+			"/search/loc/3": reference_data_json(3),
+			"/search/loc/4": reference_data_json(4),
+			}
+	engine, server = make_engine(monkeypatch, routes)
+	assert [ref_data.name for ref_data in engine.iter_library(lib_idx=0)] == ["Compound 3", "Compound 4"]
+
+
+def test_full_spectrum_search_many_uninitialised(monkeypatch):
+	engine, server = make_engine(monkeypatch, {})
+	engine.initialised = False
+
+	with pytest.raises(RuntimeError, match="The Search Engine has been uninitialised!"):
+		engine.full_spectrum_search_many([MassSpectrum([50, 51], [15, 20])])
+
+	assert server.requests == []
@@ -1,9 +1,10 @@
 # stdlib
+import sys
 from typing import Optional, Tuple
 
 # 3rd party
 import pytest
-from pyms.Spectrum import MassSpectrum
+from pyms.Spectrum import MassSpectrum, Scan
 
 # this package
 import pyms_nist_search
@@ -42,3 +43,49 @@ def test_different_n_hits(search: pyms_nist_search.Engine, spectra: Tuple[str, O
 		hit_list = search.full_spectrum_search(spectrum, n_hits=n_hits)
 
 		assert len(hit_list) == n_hits
+
+
+def test_iter_full_spectrum_search(search: pyms_nist_search.Engine, spectra: Tuple[str, Optional[MassSpectrum]]):
+	print()
+
+	name, spectrum = spectra
+	if name != "Diphenylamine":
+		pytest.skip()
+
+	assert spectrum is not None
+	scan = Scan(spectrum.mass_list, spectrum.intensity_list)
+
+	results = dict(search.iter_full_spectrum_search(iter([spectrum, scan, spectrum]), n_hits=5, max_in_flight=2))
+	assert sorted(results) == [0, 1, 2]
+
+	expected = search.full_spectrum_search(spectrum, n_hits=5)
+
+	for hit_list in results.values():
+		assert hit_list == expected
+
+	assert list(search.iter_full_spectrum_search([])) == []
+
+	with pytest.raises(ValueError, match="`max_in_flight` must be at least 1."):
+		list(search.iter_full_spectrum_search([spectrum], max_in_flight=0))
+
+	with pytest.raises(TypeError):
+		list(search.iter_full_spectrum_search(["Diphenylamine"]))
+
+
+def test_full_spectrum_search_many(search: pyms_nist_search.Engine, spectra: Tuple[str, Optional[MassSpectrum]]):
+	name, spectrum = spectra
+	if name != "Diphenylamine":
+		pytest.skip()
+
+	assert spectrum is not None
+	scan = Scan(spectrum.mass_list, spectrum.intensity_list)
+
+	expected = search.full_spectrum_search(spectrum, n_hits=5)
+	assert search.full_spectrum_search_many([spectrum, scan, spectrum], n_hits=5) == [expected] * 3
+	assert search.full_spectrum_search_many(iter([spectrum]), n_hits=5) == [expected]
+
+	if sys.platform == "win32":
+		# Only the Windows engine searches in-process, so has a GIL to release.
+		hit_lists = search.full_spectrum_search_many(iter([spectrum]), n_hits=5, release_gil=True)
+		assert hit_lists == [expected]
+	assert search.full_spectrum_search_many([]) == []
@@ -7,6 +7,7 @@ from pyms.Spectrum import MassSpectrum
 # this package
 import pyms_nist_search
 from pyms_nist_search import ReferenceData, SearchResult
+from pyms_nist_search.reference_data import LazyReferenceData
 from pyms_nist_search.utils import lib_name_from_path
 
 
@@ -46,3 +47,27 @@ def test_different_n_hits(search: pyms_nist_search.Engine, spectra: Tuple[str, O
 		hit_list = search.full_search_with_ref_data(spectrum, n_hits=n_hits)
 
 		assert len(hit_list) == n_hits
+
+
+def test_prefetch(search: pyms_nist_search.Engine, spectra: Tuple[str, Optional[MassSpectrum]]):
+	print()
+
+	spectrum = spectra[1]
+
+	eager_hit_list = search.full_search_with_ref_data(spectrum, n_hits=5, prefetch=5)
+
+	for prefetch in range(0, 6):
+		print(f"Testing with prefetch={prefetch}")
+		hit_list = search.full_search_with_ref_data(spectrum, n_hits=5, prefetch=prefetch)
+
+		assert len(hit_list) == 5
+
+		for idx, (hit, ref_data) in enumerate(hit_list):
+			assert isinstance(hit, SearchResult)
+			assert isinstance(ref_data, ReferenceData)
+
+			if idx >= prefetch:
+				assert isinstance(ref_data, LazyReferenceData)
+				assert not ref_data.resolved
+
+		assert hit_list == eager_hit_list
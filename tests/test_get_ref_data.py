@@ -1,7 +1,9 @@
 # stdlib
+import itertools
 from typing import Optional, Tuple
 
 # 3rd party
+import pytest
 from pyms.Spectrum import MassSpectrum
 
 # this package
@@ -36,3 +38,43 @@ def test_get_ref_data(search: pyms_nist_search.Engine, spectra: Tuple[str, Optio
 	# assert search.get_reference_data(hit_list[0].spec_loc).cas == cas
 	print(search.get_reference_data(hit_list[0].spec_loc))
 	print(dict(search.get_reference_data(hit_list[0].spec_loc)))
+
+
+def test_get_ref_data_many(search: pyms_nist_search.Engine, spectra: Tuple[str, Optional[MassSpectrum]]):
+	print()
+
+	name, spectrum = spectra
+	hit_list = search.full_spectrum_search(spectrum, n_hits=5)
+	spec_locs = [hit.spec_loc for hit in hit_list]
+
+	# Include repeated locations
+	spec_locs = spec_locs + spec_locs[::-1]
+
+	ref_data_list = search.get_reference_data_many(spec_locs)
+	assert len(ref_data_list) == len(spec_locs)
+
+	for spec_loc, ref_data in zip(spec_locs, ref_data_list):
+		assert isinstance(ref_data, ReferenceData)
+		assert ref_data == search.get_reference_data(spec_loc)
+
+	assert ref_data_list[0].name.lower() == name.lower()
+	assert search.get_reference_data_many([]) == []
+
+
+def test_iter_library(search: pyms_nist_search.Engine):
+	records = list(itertools.islice(search.iter_library(batch_size=100), 250))
+	assert len(records) == 250
+
+	for ref_data in records:
+		assert isinstance(ref_data, ReferenceData)
+		assert isinstance(ref_data.mass_spec, MassSpectrum)
+		assert ref_data.lib_idx == 0
+
+	ids = [int(ref_data.id) for ref_data in records]
+	assert ids == sorted(ids)
+	assert len(set(ids)) == len(ids)
+
+	assert records[:10] == list(itertools.islice(search.iter_library(lib_idx=0, batch_size=3), 10))
+
+	with pytest.raises(ValueError, match="`batch_size` must be at least 1."):
+		next(search.iter_library(batch_size=0))
@@ -0,0 +1,83 @@
+# stdlib
+from typing import Optional, Tuple
+
+# 3rd party
+import pytest
+from pyms.Spectrum import MassSpectrum
+
+# this package
+import pyms_nist_search
+from pyms_nist_search import SearchResult
+
+
+def test_name_search(search: pyms_nist_search.Engine, spectra: Tuple[str, Optional[MassSpectrum]]):
+	name, spectrum = spectra
+
+	hit_list = search.name_search(name)
+	assert hit_list
+
+	for hit in hit_list:
+		assert isinstance(hit, SearchResult)
+		assert hit.match_factor == 0
+
+	assert hit_list == search.name_search(name.upper())
+	assert hit_list == search.name_search(name, lib_idx=0)
+
+
+def test_name_search_no_match(search: pyms_nist_search.Engine):
+	assert search.name_search("Xyzzy Not A Compound") == []
+
+
+def test_formula_search(search: pyms_nist_search.Engine):
+	hit_list = search.formula_search("C6H6")
+	assert hit_list
+
+	for hit in hit_list:
+		assert isinstance(hit, SearchResult)
+		assert search.get_reference_data(hit.spec_loc).formula == "C6H6"
+
+
+def test_mw_search(search: pyms_nist_search.Engine):
+	hit_list = search.mw_search(78)
+	assert hit_list
+
+	for hit in hit_list:
+		assert isinstance(hit, SearchResult)
+		assert search.get_reference_data(hit.spec_loc).mw == 78
+
+	assert {hit.spec_loc for hit in search.formula_search("C6H6")} <= {hit.spec_loc for hit in hit_list}
+
+
+def test_mw_search_errors(search: pyms_nist_search.Engine):
+	with pytest.raises(ValueError, match="`mw` cannot be negative."):
+		search.mw_search(-1)
+
+
+def test_any_peak_search(search: pyms_nist_search.Engine):
+	# Benzene has a base peak at m/z 78 and a large fragment at m/z 77
+	spec_locs = search.any_peak_search([(78, 50, 100), (77, 5, 100)])
+	assert spec_locs
+	assert {hit.spec_loc for hit in search.formula_search("C6H6")} & set(spec_locs)
+
+	for spec_loc in spec_locs[:10]:
+		ref_data = search.get_reference_data(spec_loc)
+		assert 78 in ref_data.mass_spec.mass_list
+		assert 77 in ref_data.mass_spec.mass_list
+
+	assert set(spec_locs) <= set(search.any_peak_search([(78, 50, 100), (77, 5, 100)], min_matches=1))
+
+
+@pytest.mark.parametrize(
+		"peaks, min_matches, message",
+		[
+				([], None, "At least one peak must be given."),
+				([(0, 10, 100)], None, "Invalid m/z for peak: 0"),
+				([(78, 0, 100)], None, "Invalid abundance range for m/z 78: 0-100"),
+				([(78, 50, 101)], None, "Invalid abundance range for m/z 78: 50-101"),
+				([(78, 50, 100)] * 11, None, "At most 10 `peaks` may be given."),
+				([(78, 50, 100)], 2, r"`min_matches` must be between 1 and the number of peaks \(1\)."),
+				],
+		)
+def test_any_peak_search_errors(search: pyms_nist_search.Engine, peaks, min_matches, message: str):
+	with pytest.raises(ValueError, match=message):
+		search.any_peak_search(peaks, min_matches)
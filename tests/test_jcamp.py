@@ -0,0 +1,185 @@
+# stdlib
+import pathlib
+
+# 3rd party
+import pytest
+from domdf_python_tools.paths import PathPlus
+from pyms.Spectrum import MassSpectrum
+from pyms.Utils.jcamp import JcampTagWarning
+
+# this package
+from pyms_nist_search import ReferenceData
+from pyms_nist_search.jcamp import JcampLoadReport, iter_jcamp, load_jcamp_dir, read_jcamp
+
+benzene_jdx = """\
+##TITLE=Benzene
+##JCAMP-DX=4.24
+##DATA TYPE=MASS SPECTRUM
+##ORIGIN=Japan AIST/NIMC Database- Spectrum MS-NW- 1234
+##OWNER=NIST Mass Spectrometry Data Center
+##CAS REGISTRY NO=71-43-2
+##$NIST MASS SPEC NO=228160
+##MOLFORM=C6 H6
+##MW=78
+##$NIST SOURCE=MSDC
+##XUNITS=M/Z
+##YUNITS=RELATIVE ABUNDANCE
+##XFACTOR=1
+##YFACTOR=1
+##FIRSTX=37
+##LASTX=80
+##FIRSTY=40
+##MAXX=80
+##MINX=37
+##MAXY=9999
+##MINY=10
+##NPOINTS=8
+##PEAK TABLE=(XY..XY)
+37,40 38,60 39,120 50,1560
+51,1820 52,1930 77,1450 78,9999
+##END=
+"""
+
+multi_block_jdx = """\
+##TITLE=Link block
+##JCAMP-DX=5.01
+##DATA TYPE=LINK
+##BLOCKS=2
+$$ A comment which should be ignored
+##TITLE=First spectrum
+##JCAMP-DX=5.01
+##ORIGIN=Somewhere
+##MW=78
+##PEAK TABLE=(XY..XY)
+50 15
+51 20
+##END=
+##TITLE=Second spectrum
+##JCAMP-DX=5.01
+##ORIGIN=Somewhere
+##MOLFORM=C7 H8
+##PEAK TABLE=(XY..XY)
+91,100 92,50
+##END=
+##END=
+"""
+
+
+@pytest.fixture()
+def benzene_file(tmp_path) -> PathPlus:
+	filename = PathPlus(tmp_path) / "71-43-2-Mass.jdx"
+	filename.write_text(benzene_jdx)
+	return filename
+
+
+def test_read_jcamp(benzene_file: PathPlus):
+	ref_data = read_jcamp(benzene_file)
+
+	assert ref_data.name == "Benzene"
+	assert ref_data.cas == "71-43-2"
+	assert ref_data.nist_no == 228160
+	assert ref_data.contributor == "Japan AIST/NIMC Database- Spectrum MS-NW- 1234"
+	assert ref_data.formula == "C6 H6"
+	assert ref_data.mw == 78
+
+	expected_mass_spec = MassSpectrum.from_jcamp(benzene_file)
+	assert ref_data.mass_spec is not None
+	assert ref_data.mass_spec.mass_list == expected_mass_spec.mass_list
+	assert ref_data.mass_spec.intensity_list == expected_mass_spec.intensity_list
+
+	assert ReferenceData.from_jcamp(benzene_file) == ref_data
+	assert ReferenceData.from_jcamp(str(benzene_file)) == ref_data
+	assert ReferenceData.from_jcamp(pathlib.Path(benzene_file)) == ref_data
+
+
+def test_read_jcamp_warnings(benzene_file: PathPlus):
+	with pytest.warns(JcampTagWarning, match="YUNITS"):
+		read_jcamp(benzene_file, ignore_warnings=False)
+
+
+def test_iter_jcamp_multi_block(tmp_path):
+	filename = PathPlus(tmp_path) / "multi.jdx"
+	filename.write_text(multi_block_jdx)
+
+	first, second = iter_jcamp(filename)
+
+	assert first.name == "First spectrum"
+	assert first.mw == 78
+	assert first.mass_spec is not None
+	assert first.mass_spec.mass_list == [50, 51]
+	assert first.mass_spec.intensity_list == [15, 20]
+
+	assert second.name == "Second spectrum"
+	assert second.formula == "C7 H8"
+	assert second.mass_spec is not None
+	assert second.mass_spec.mass_list == [91, 92]
+	assert second.mass_spec.intensity_list == [100, 50]
+
+	assert read_jcamp(filename) == first
+
+
+def test_iter_jcamp_continuation_and_missing_end(tmp_path):
+	filename = PathPlus(tmp_path) / "continued.jdx"
+	filename.write_text("##TITLE=A very long\n compound name\n##PEAK TABLE=(XY..XY)\n41,10 43,100\n")
+
+	(ref_data, ) = iter_jcamp(filename)
+	assert ref_data.name == "A very long compound name"
+	assert ref_data.mass_spec is not None
+	assert ref_data.mass_spec.mass_list == [41, 43]
+
+
+def test_read_jcamp_errors(tmp_path):
+	tmp_pathplus = PathPlus(tmp_path)
+
+	(tmp_pathplus / "empty.jdx").write_text("\n##END=\n")
+	with pytest.raises(ValueError, match="No spectra found in JCAMP-DX file "):
+		read_jcamp(tmp_pathplus / "empty.jdx")
+
+	(tmp_pathplus / "unpaired.jdx").write_text("##TITLE=Unpaired\n##PEAK TABLE=(XY..XY)\n41,10 43\n##END=\n")
+	with pytest.raises(ValueError, match=r"JCAMP-DX XY data is not in \(m/z, intensity\) pairs."):
+		read_jcamp(tmp_pathplus / "unpaired.jdx")
+
+	for obj in [123, 12.3, (12, 34), set(), dict(), list()]:
+		with pytest.raises(TypeError):
+			read_jcamp(obj)  # type: ignore[arg-type]
+
+	with pytest.raises(FileNotFoundError):
+		read_jcamp(tmp_pathplus / "non-existant_file.jdx")
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_load_jcamp_dir(tmp_path, workers: int):
+	tmp_pathplus = PathPlus(tmp_path)
+
+	for idx in range(5):
+		(tmp_pathplus / f"{idx}.jdx").write_text(benzene_jdx.replace("##TITLE=Benzene", f"##TITLE=Benzene {idx}"))
+
+	(tmp_pathplus / "2a.jdx").write_text("##TITLE=Unpaired\n##PEAK TABLE=(XY..XY)\n41,10 43\n##END=\n")
+	(tmp_pathplus / "3a.jdx").write_text(multi_block_jdx)
+	(tmp_pathplus / "notes.txt").write_text("Not a JCAMP-DX file")
+
+	report = JcampLoadReport()
+	spectra = list(load_jcamp_dir(tmp_pathplus, workers=workers, report=report))
+
+	assert [ref_data.name for ref_data in spectra] == [
+			"Benzene 0",
+			"Benzene 1",
+			"Benzene 2",
+			"Benzene 3",
+			"First spectrum",
+			"Second spectrum",
+			"Benzene 4",
+			]
+	assert spectra[0] == read_jcamp(tmp_pathplus / "0.jdx")
+
+	assert report.files == 7
+	assert report.spectra == 7
+	assert report.unknown_tags["YUNITS"] == 5
+	assert report.unknown_tags["BLOCKS"] == 1
+	assert report.errors == {
+			tmp_pathplus / "2a.jdx": "ValueError: JCAMP-DX XY data is not in (m/z, intensity) pairs.",
+			}
+	assert "1 files could not be read:" in report.summary()
+
+	with pytest.raises(ValueError, match="`workers` must be at least 1."):
+		next(load_jcamp_dir(tmp_pathplus, workers=0))
@@ -0,0 +1,98 @@
+# stdlib
+import json
+from typing import List
+
+# 3rd party
+import pytest
+
+# this package
+from pyms_nist_search.metrics import Histogram, MetricEvent, MetricsRegistry
+
+
+def test_histogram():
+	histogram = Histogram(buckets=(0.1, 1.0))
+	for value in (0.05, 0.1, 0.5, 2.0):
+		histogram.observe(value)
+
+	assert histogram.counts == [2, 1, 1]
+	assert histogram.cumulative_counts() == [2, 3, 4]
+	assert histogram.count == 4
+	assert histogram.sum == pytest.approx(2.65)
+	assert histogram.to_dict() == {"buckets": [0.1, 1.0], "counts": [2, 1, 1], "count": 4, "sum": histogram.sum}
+
+
+def test_disabled():
+	registry = MetricsRegistry()
+	events: List[MetricEvent] = []
+	registry.add_hook(events.append)
+
+	@registry.instrument
+	def search(value: int) -> int:
+		with registry.phase("search", "dll"):
+			return value
+
+	assert search(1) == 1
+	registry.increment("search", "retries")
+
+	assert registry.get_latency("search") is None
+	assert registry.get_counter("search", "retries") == 0
+	assert registry.to_dict() == {}
+	assert registry.to_prometheus() == ''
+	assert events == []
+
+
+def test_enabled():
+	registry = MetricsRegistry(buckets=(0.1, 1.0))
+	registry.enable()
+	events: List[MetricEvent] = []
+	registry.add_hook(events.append)
+
+	@registry.instrument
+	def search(value: int) -> int:
+		with registry.phase("search", "dll"):
+			pass
+
+		if value < 0:
+			raise ValueError(value)
+
+		return value
+
+	assert search(1) == 1
+	with pytest.raises(ValueError):
+		search(-1)
+	registry.increment("search", "retries", 2)
+
+	total = registry.get_latency("search")
+	assert total is not None
+	assert total.count == 2
+	assert registry.get_latency("search", "dll").count == 2  # type: ignore[union-attr]
+	assert registry.get_counter("search", "retries") == 2
+	assert registry.get_counter("search", "errors") == 1
+
+	assert [(event.kind, event.method, event.name) for event in events] == [
+			("latency", "search", "dll"),
+			("latency", "search", "total"),
+			("latency", "search", "dll"),
+			("counter", "search", "errors"),
+			("latency", "search", "total"),
+			("counter", "search", "retries"),
+			]
+
+	metrics = json.loads(registry.to_json())
+	assert set(metrics["search"]["latency"]) == {"dll", "total"}
+	assert metrics["search"]["counters"] == {"errors": 1, "retries": 2}
+
+	prometheus = registry.to_prometheus().splitlines()
+	assert "# TYPE pyms_nist_search_latency_seconds histogram" in prometheus
+	assert 'pyms_nist_search_latency_seconds_bucket{method="search",phase="total",le="+Inf"} 2' in prometheus
+	assert 'pyms_nist_search_latency_seconds_count{method="search",phase="total"} 2' in prometheus
+	assert "# TYPE pyms_nist_search_retries_total counter" in prometheus
+	assert 'pyms_nist_search_retries_total{method="search"} 2' in prometheus
+
+	registry.reset()
+	assert registry.to_dict() == {}
+
+	registry.remove_hook(events.append)
+	registry.disable()
+	search(1)
+	assert registry.to_dict() == {}
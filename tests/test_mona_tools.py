@@ -0,0 +1,193 @@
+# stdlib
+import io
+import json
+import zipfile
+from typing import Any, Dict
+
+# 3rd party
+import pytest
+from domdf_python_tools.paths import PathPlus
+
+# this package
+from pyms_nist_search.mona_tools import (
+		MetadataDiagnostics,
+		iter_json_array,
+		iter_mona_json,
+		mass_spec_from_mona,
+		parse_metadata
+		)
+
+compounds = [
+		{"id": "MoNA000001", "compound": [{"names": [{"name": "Benzene"}]}], "score": 1.5e-3},
+		{"id": "MoNA000002", "spectrum": "50.0:15 51.0:20", "tags": [], "text": 'a "quoted" ] [ , string'},
+		12345,
+		[1, [2, [3]]],
+		None,
+		]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64, 1 << 20])
+@pytest.mark.parametrize("indent", [None, 2])
+def test_iter_json_array(chunk_size: int, indent):
+	data = json.dumps(compounds, indent=indent)
+	assert list(iter_json_array(io.StringIO(data), chunk_size=chunk_size)) == compounds
+
+
+@pytest.mark.parametrize("chunk_size", [1, 1 << 20])
+@pytest.mark.parametrize("data", ['[]', "  [ \n ]  ", "[1]", "[1.25,-2]", '["a" , "b"]'])
+def test_iter_json_array_small(data: str, chunk_size: int):
+	assert list(iter_json_array(io.StringIO(data), chunk_size=chunk_size)) == json.loads(data)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 1 << 20])
+@pytest.mark.parametrize(
+		"data, message",
+		[
+				('', "Unexpected end of JSON data"),
+				('{"a": 1}', "JSON data is not an array"),
+				("[1, 2", "Unexpected end of JSON data"),
+				("[1 2]", "Expecting ',' delimiter in JSON array, got '2'"),
+				]
+		)
+def test_iter_json_array_errors(data: str, message: str, chunk_size: int):
+	with pytest.raises(ValueError, match=message):
+		list(iter_json_array(io.StringIO(data), chunk_size=chunk_size))
+
+
+def test_iter_json_array_truncated():
+	with pytest.raises(ValueError):
+		list(iter_json_array(io.StringIO('[{"a": 1}, {"b": '), chunk_size=4))
+
+
+def test_iter_mona_json(tmp_path):
+	tmp_pathplus = PathPlus(tmp_path)
+
+	json_file = tmp_pathplus / "MoNA-export-GC-MS_Spectra.json"
+	json_file.write_text(json.dumps(compounds))
+	assert list(iter_mona_json(json_file)) == compounds
+
+	zip_file = tmp_pathplus / "MoNA-export-GC-MS_Spectra-json.zip"
+	with zipfile.ZipFile(zip_file, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+		zf.writestr("README.txt", "Not JSON")
+		zf.write(json_file, arcname="MoNA-export-GC-MS_Spectra.json")
+
+	assert list(iter_mona_json(zip_file)) == compounds
+
+	empty_zip_file = tmp_pathplus / "empty.zip"
+	with zipfile.ZipFile(empty_zip_file, 'w') as zf:
+		zf.writestr("README.txt", "Not JSON")
+
+	with pytest.raises(FileNotFoundError, match="No JSON file found in "):
+		list(iter_mona_json(empty_zip_file))
+
+
+def test_parse_metadata(capsys):
+	mona_data: Dict[str, Any] = {
+			"compound": [{
+					"names": [{"name": "Benzene"}],
+					"metaData": [
+							{"name": "SMILES", "value": "c1ccccc1", "computed": True},
+							{"name": "Molecular Formula", "value": "C6H6", "computed": False},
+							{"name": "molecular formula", "value": "C6H5", "computed": True},
+							{"name": "Total Exact Mass", "value": 78.04695, "computed": True},
+							{"name": "CAS", "value": "71-43-2", "computed": False},
+							{"name": "Melting Point", "value": "5.5 C", "computed": False},
+							],
+					}],
+			"metaData": [
+					{"name": "accession", "value": "MoNA000001", "computed": False},
+					{"name": "Author", "value": "A. Chemist", "computed": False},
+					{"name": "license", "value": "CC BY", "computed": False},
+					{"name": "Instrument", "value": "GC-MS", "computed": False},
+					{"name": "Institution", "value": "University", "computed": False},
+					{"name": "author", "value": "Someone Else", "category": "mass spectrometry", "computed": False},
+					{"name": "Sample Colour", "value": "Clear", "computed": False},
+					],
+			"submitter": {"institution": "Submitter Institution"},
+			}
+
+	expected = {
+			"formula": "C6H6",
+			"mw": 78.04695,
+			"exact_mass": 78.04695,
+			"cas": "71-43-2",
+			"contributor": "A. Chemist",
+			"license": "CC BY",
+			"id": "MoNA000001",
+			}
+
+	# Unrecognised properties are ignored by default.
+	assert parse_metadata(mona_data) == expected
+	assert not capsys.readouterr().out
+
+	diagnostics = MetadataDiagnostics()
+	assert parse_metadata(mona_data, diagnostics) == expected
+	assert parse_metadata(mona_data, diagnostics) == expected
+	assert not capsys.readouterr().out
+
+	assert diagnostics.records == 2
+	assert dict(diagnostics.unknown_properties) == {
+			("compound", "Melting Point"): 2,
+			("spectrum", "Sample Colour"): 2,
+			}
+	assert diagnostics.summary() == '\n'.join([
+			"4 unrecognised properties in 2 records:",
+			"  compound property 'Melting Point': 2 (e.g. '5.5 C', '5.5 C')",
+			"  spectrum property 'Sample Colour': 2 (e.g. 'Clear', 'Clear')",
+			])
+
+	# Raw per-record output is opt-in.
+	parse_metadata(mona_data, MetadataDiagnostics(verbose=True))
+	assert capsys.readouterr().out.splitlines() == [
+			"{'name': 'Melting Point', 'value': '5.5 C', 'computed': False}",
+			"{'name': 'Sample Colour', 'value': 'Clear', 'computed': False}",
+			]
+
+	# The contributor falls back to the submitter's institution.
+	del mona_data["metaData"][1]
+	mona_data["id"] = "MoNA000002"
+	metadata = parse_metadata(mona_data)
+	assert metadata["contributor"] == "Submitter Institution"
+	assert metadata["id"] == "MoNA000002"
+
+
+def test_mass_spec_from_mona():
+	mass_spec = mass_spec_from_mona("50.0:15 51.5:2.5e1 77:100 78.046:999.9")
+	assert mass_spec.mass_list == [50.0, 51.5, 77.0, 78.046]
+	assert mass_spec.intensity_list == [15.0, 25.0, 100.0, 999.9]
+
+	mass_spec = mass_spec_from_mona("41.0:12.5")
+	assert mass_spec.mass_list == [41.0]
+	assert mass_spec.intensity_list == [12.5]
+
+
+@pytest.mark.parametrize(
+		"mona_ms_string",
+		['', "50.0", "50.0:15 51.0", "50.0:15  51.0:20", "50.0:15 51.0:20 ", "50.0:15:3", "50.0:abc", "50.0 15"],
+		)
+def test_mass_spec_from_mona_errors(mona_ms_string: str):
+	with pytest.raises(ValueError, match="Invalid MoNA spectrum: "):
+		mass_spec_from_mona(mona_ms_string)
+
+
+def test_metadata_diagnostics_merge():
+	diagnostics = MetadataDiagnostics(max_examples=2)
+	assert not diagnostics
+	assert diagnostics.summary() == "No unrecognised properties in 0 records."
+
+	worker_diagnostics = []
+	for worker in range(3):
+		worker_diagnostic = MetadataDiagnostics(max_examples=2)
+		worker_diagnostic.records = 10
+		worker_diagnostic.add_unknown("spectrum", {"name": "Colour", "value": f"Value {worker}"})
+		worker_diagnostics.append(worker_diagnostic)
+
+	worker_diagnostics[0].add_unknown("compound", {"name": "Odour", "value": "None"})
+
+	for worker_diagnostic in worker_diagnostics:
+		diagnostics.merge(worker_diagnostic)
+
+	assert diagnostics
+	assert diagnostics.records == 30
+	assert diagnostics.unknown_properties.most_common() == [(("spectrum", "Colour"), 3), (("compound", "Odour"), 1)]
+	assert [example["value"] for example in diagnostics.examples["spectrum", "Colour"]] == ["Value 0", "Value 1"]
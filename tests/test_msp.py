@@ -0,0 +1,145 @@
+# stdlib
+import io
+import pathlib
+
+# 3rd party
+import numpy
+import pytest
+from domdf_python_tools.paths import PathPlus
+from pyms.Spectrum import MassSpectrum
+
+# this package
+from pyms_nist_search import ReferenceData
+from pyms_nist_search.msp import format_msp_record, iter_msp, write_msp
+
+
+@pytest.fixture()
+def records():
+	return [
+			ReferenceData(
+					name="Benzene",
+					cas="71-43-2",
+					formula="C6H6",
+					mw=78,
+					synonyms=["Benzol", "Cyclohexatriene"],
+					contributor="MoNA",
+					id="MoNA000001",
+					mass_spec=MassSpectrum([50, 51, 52, 77, 78, 79], [15, 20, 18, 200, 1000, 64]),
+					),
+			ReferenceData(
+					name="Diphenylamine",
+					nist_no=5698,
+					mw=169.2,
+					mass_spec=MassSpectrum(
+							[51.0234, 77.0391, 168.0813, 169.0891, 170.0924],
+							[71.5, 61.25, 329.0, 999.0, 137.75],
+							),
+					),
+			ReferenceData(
+					name="Float32",
+					mass_spec=MassSpectrum(
+							numpy.array([41.1, 43.1, 57.1], dtype=numpy.float32),
+							numpy.array([12.5, 100.0, 36.6], dtype=numpy.float32),
+							),
+					),
+			]
+
+
+def test_format_msp_record(records):
+	for ref_data in records:
+		assert format_msp_record(ref_data) == ref_data.to_msp()
+
+
+def test_write_msp(records):
+	fp = io.StringIO()
+	assert write_msp(iter(records), fp) == 3
+	assert fp.getvalue() == ''.join(f"{ref_data.to_msp()}\n\n" for ref_data in records)
+
+	fp = io.StringIO()
+	assert write_msp([], fp) == 0
+	assert fp.getvalue() == ''
+
+
+def test_no_mass_spec():
+	with pytest.raises(ValueError, match="No mass spectrum included in the reference data."):
+		format_msp_record(ReferenceData(name="Compound Name"))
+
+
+@pytest.mark.parametrize("use_mmap", [True, False])
+def test_iter_msp_round_trip(records, tmp_path: pathlib.Path, use_mmap: bool):
+	msp_file = PathPlus(tmp_path) / "library.msp"
+
+	with msp_file.open('w') as fp:
+		write_msp(records, fp)
+
+	reloaded = list(iter_msp(msp_file, use_mmap=use_mmap))
+	assert len(reloaded) == len(records)
+
+	for original, ref_data in zip(records, reloaded):
+		assert isinstance(ref_data, ReferenceData)
+		assert ref_data.to_msp() == original.to_msp()
+		assert ref_data.name == original.name
+		assert ref_data.synonyms == original.synonyms
+		assert ref_data.mw == original.mw
+
+	assert list(ReferenceData.iter_msp(msp_file, use_mmap=use_mmap)) == reloaded
+
+
+def test_iter_msp_fields(records, tmp_path: pathlib.Path):
+	msp_file = PathPlus(tmp_path) / "library.msp"
+
+	with msp_file.open('w') as fp:
+		write_msp(records, fp)
+
+	reloaded = list(iter_msp(msp_file, fields=["name", "cas"], spectra=False))
+	assert [ref_data.name for ref_data in reloaded] == ["Benzene", "Diphenylamine", "Float32"]
+	assert reloaded[0].cas == "71-43-2"
+	assert reloaded[0].synonyms == []
+	assert reloaded[0].formula == ''
+	assert reloaded[0].mass_spec is None
+
+	with pytest.raises(ValueError, match="Unknown MSP field"):
+		list(iter_msp(msp_file, fields=["name", "colour"]))
+
+
+@pytest.mark.parametrize("use_mmap", [True, False])
+def test_iter_msp_nist_format(tmp_path: pathlib.Path, use_mmap: bool):
+	msp_file = PathPlus(tmp_path) / "library.msp"
+	msp_file.write_lines([
+			"NAME: Formaldehyde",
+			"Synon: Methanal",
+			"Formula: CH2O",
+			"MW: 30",
+			"CAS#: 50-00-0;  NIST#: 19016",
+			"Num peaks: 5",
+			"12 17; 13 43; 14 99; 15 8; 16 6;",
+			"Name: Methane",
+			"Num Peaks: 3",
+			'14 109 "CH2+"',
+			'15 888 "CH3+"',
+			'16 999 "CH4+"',
+			])
+
+	formaldehyde, methane = iter_msp(msp_file, use_mmap=use_mmap)
+
+	assert formaldehyde.name == "Formaldehyde"
+	assert formaldehyde.synonyms == ["Methanal"]
+	assert formaldehyde.cas == "50-00-0"
+	assert formaldehyde.nist_no == 19016
+	assert formaldehyde.mw == 30
+	assert formaldehyde.mass_spec is not None
+	assert formaldehyde.mass_spec.mass_list == [12, 13, 14, 15, 16]
+	assert formaldehyde.mass_spec.intensity_list == [17, 43, 99, 8, 6]
+
+	assert methane.name == "Methane"
+	assert methane.mass_spec is not None
+	assert methane.mass_spec.mass_list == [14, 15, 16]
+	assert methane.mass_spec.intensity_list == [109, 888, 999]
+
+
+def test_iter_msp_empty_file(tmp_path: pathlib.Path):
+	msp_file = PathPlus(tmp_path) / "library.msp"
+	msp_file.write_text('')
+
+	assert list(iter_msp(msp_file)) == []
+	assert list(iter_msp(msp_file, use_mmap=True)) == []
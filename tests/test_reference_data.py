@@ -12,6 +12,7 @@ from pyms.Spectrum import MassSpectrum
 # this package
 import pyms_nist_search
 from pyms_nist_search import ReferenceData, SearchResult
+from pyms_nist_search.reference_data import LazyReferenceData
 
 # this package
 from .constants import (
@@ -190,6 +191,57 @@ def test_creation():
 			)
 
 
+def test_lazy_reference_data():
+	ref_data = ReferenceData(
+			name="Compound Name",
+			cas=112233,
+			nist_no=123,
+			id=456,
+			mw=7.8,
+			mass_spec=MassSpectrum([50, 51, 52], [10, 999, 5]),
+			synonyms=["Synonym"],
+			)
+
+	calls = []
+
+	def loader() -> ReferenceData:
+		calls.append(1)
+		return ref_data
+
+	lazy_ref_data = LazyReferenceData(loader)
+	assert isinstance(lazy_ref_data, ReferenceData)
+	assert not lazy_ref_data.resolved
+	assert not calls
+
+	assert lazy_ref_data.name == "Compound Name"
+	assert lazy_ref_data.resolved
+	assert len(calls) == 1
+
+	assert lazy_ref_data.synonyms == ["Synonym"]
+	assert lazy_ref_data.mass_spec == ref_data.mass_spec
+	assert lazy_ref_data == ref_data
+	assert ref_data == lazy_ref_data
+	assert lazy_ref_data.to_dict() == ref_data.to_dict()
+	assert len(calls) == 1
+
+	with pytest.raises(AttributeError):
+		lazy_ref_data._foo  # pylint: disable=pointless-statement
+
+	with pytest.raises(AttributeError):
+		lazy_ref_data.foo  # pylint: disable=pointless-statement
+
+	# Pickling resolves the data first
+	calls.clear()
+	lazy_ref_data = LazyReferenceData(loader)
+	reloaded_ref_data = pickle.loads(pickle.dumps(lazy_ref_data))  # nosec: B301
+	assert len(calls) == 1
+	assert isinstance(reloaded_ref_data, LazyReferenceData)
+	assert reloaded_ref_data.resolved
+	assert reloaded_ref_data == ref_data
+
+	assert json.loads(sdjson.dumps(LazyReferenceData(loader))) == json.loads(sdjson.dumps(ref_data))
+
+
 def test_from_jcamp():
 	# TODO: main bit
 
@@ -0,0 +1,245 @@
+# stdlib
+import json
+from typing import Optional, Tuple
+
+# 3rd party
+import pytest
+from pyms.Spectrum import MassSpectrum
+
+# this package
+import pyms_nist_search
+from pyms_nist_search.search_controls import SearchConstraints, SearchControls
+from pyms_nist_search.search_stats import SearchStats
+
+
+def test_search_controls():
+	controls = SearchControls(min_mass=40, max_mass=300)
+	assert controls.to_dict() == {
+			"min_mass": 40,
+			"max_mass": 300,
+			"min_abund": None,
+			"search_mode": None,
+			"user_mw": None,
+			"reverse": None,
+			"presearch": None,
+			"timeout": None,
+			}
+	assert controls.to_pynist() == {"min_mass": 40, "max_mass": 300}
+	assert SearchControls.from_dict(json.loads(controls.to_json())) == controls
+	assert repr(controls) == "SearchControls(min_mass=40, max_mass=300)"
+
+	assert SearchControls().to_pynist() == {}
+	assert SearchControls(min_mass=-1, max_mass=-1).to_pynist() == {"min_mass": -1, "max_mass": -1}
+
+
+def test_search_controls_search_mode():
+	controls = SearchControls(search_mode='H', user_mw=169, reverse=True, presearch="fast")
+	assert controls.to_pynist() == {"search_mode": 'H', "user_mw": 169, "impure": 1, "presearch": "fast"}
+	assert SearchControls.from_dict(json.loads(controls.to_json())) == controls
+	assert repr(controls) == "SearchControls(search_mode='H', user_mw=169, reverse=True, presearch='fast')"
+
+	assert SearchControls(search_mode='S', reverse=False).to_pynist() == {"search_mode": 'S', "impure": 0}
+	assert SearchControls(presearch="off").to_pynist() == {"presearch": "off"}
+
+
+def test_search_controls_timeout():
+	controls = SearchControls(timeout=2)
+	assert controls.timeout == 2.0
+	assert controls.to_pynist() == {"timeout": 2.0}
+	assert SearchControls.from_dict(json.loads(controls.to_json())) == controls
+	assert repr(controls) == "SearchControls(timeout=2.0)"
+
+
+@pytest.mark.parametrize(
+		"kwargs, message",
+		[
+				({"min_mass": -2}, "`min_mass` must be -1 or greater."),
+				({"max_mass": -2}, "`max_mass` must be -1 or greater."),
+				({"min_mass": 100, "max_mass": 50}, "`max_mass` cannot be less than `min_mass`."),
+				({"min_abund": 1000}, "`min_abund` must be between 0 and 999."),
+				({"search_mode": 'E'}, "Unsupported search mode 'E'"),
+				({"search_mode": 'L'}, "`user_mw` is required for the 'L' search mode."),
+				({"search_mode": 'M', "user_mw": 0}, "`user_mw` must be 1 or greater."),
+				({"presearch": "slow"}, "Unsupported pre-search option 'slow'"),
+				({"timeout": 0}, "`timeout` must be greater than 0."),
+				],
+		)
+def test_search_controls_errors(kwargs, message: str):
+	with pytest.raises(ValueError, match=message):
+		SearchControls(**kwargs)
+
+
+def test_search_constraints():
+	constraints = SearchConstraints(
+			min_mw=50,
+			max_mw=200,
+			elements=['C', 'H', "Cl"],
+			element_counts=[("Cl", '>', 1)],
+			peaks=[(78, 50, 100)],
+			)
+
+	assert constraints.to_pynist() == {
+			"mw_min": 50,
+			"mw_max": 200,
+			"elements": ['C', 'H', "Cl"],
+			"elements_mode": pyms_nist_search.NISTMS_ELS_IN_LIST,
+			"element_counts": [("Cl", '>', 1)],
+			"peaks": [(78, 50, 100)],
+			"peaks_mode": pyms_nist_search.NISTMS_ABS_PEAKS,
+			}
+
+	assert SearchConstraints.from_dict(json.loads(constraints.to_json())) == constraints
+	assert SearchConstraints.from_dict(json.loads(constraints.to_json())).to_pynist() == constraints.to_pynist()
+
+
+def test_search_constraints_defaults():
+	assert SearchConstraints().to_pynist() == {
+			"mw_min": pyms_nist_search.NO_VALUE,
+			"mw_max": pyms_nist_search.NO_VALUE,
+			"elements": [],
+			"elements_mode": pyms_nist_search.NISTMS_ELS_IN_LIST,
+			"element_counts": [],
+			"peaks": [],
+			"peaks_mode": pyms_nist_search.NISTMS_ABS_PEAKS,
+			}
+	assert repr(SearchConstraints()) == "SearchConstraints()"
+
+	constraints = SearchConstraints(min_mw=100, elements=['C', 'H'], exact_elements=True, relative_peaks=True)
+	assert constraints.to_pynist()["mw_max"] == pyms_nist_search.NO_VALUE
+	assert constraints.to_pynist()["elements_mode"] == pyms_nist_search.NISTMS_EXACT
+	assert constraints.to_pynist()["peaks_mode"] == pyms_nist_search.NISTMS_REL_PEAKS
+
+
+def test_search_constraints_relative_peaks():
+	# Peaks after the first may be more abundant than the first peak
+	constraints = SearchConstraints(peaks=[(77, 50, 100), (78, 100, 200)], relative_peaks=True)
+	assert constraints.peaks == [(77, 50, 100), (78, 100, 200)]
+
+	with pytest.raises(ValueError, match="The maximum abundance for m/z 78 cannot be greater than 100%."):
+		SearchConstraints(peaks=[(77, 50, 100), (78, 100, 200)])
+
+
+@pytest.mark.parametrize(
+		"kwargs, message",
+		[
+				({"min_mw": -1}, "`min_mw` cannot be negative."),
+				({"max_mw": -1}, "`max_mw` cannot be negative."),
+				({"min_mw": 100, "max_mw": 50}, "`max_mw` cannot be less than `min_mw`."),
+				({"elements": ["CL"]}, "Invalid element symbol 'CL'"),
+				({"elements": ["Xyz"]}, "Invalid element symbol 'Xyz'"),
+				({"elements": ['C'] * 11}, "At most 10 `elements` may be given."),
+				({"element_counts": [("Cl", '!', 1)]}, "Invalid comparison '!' for element 'Cl'"),
+				({"element_counts": [("Cl", '>', -1)]}, "The count for element 'Cl' cannot be negative."),
+				({"peaks": [(0, 10, 100)]}, "Invalid m/z for peak: 0"),
+				({"peaks": [(78, 60, 50)]}, "Invalid abundance range for m/z 78: 60-50"),
+				({"peaks": [(mz, 0, 100) for mz in range(50, 61)]}, "At most 10 `peaks` may be given."),
+				],
+		)
+def test_search_constraints_errors(kwargs, message: str):
+	with pytest.raises(ValueError, match=message):
+		SearchConstraints(**kwargs)
+
+
+def test_full_search_constraints(search: pyms_nist_search.Engine, spectra: Tuple[str, Optional[MassSpectrum]]):
+	name, spectrum = spectra
+	if name != "Diphenylamine":
+		pytest.skip()
+
+	assert spectrum is not None
+
+	hit_list = search.full_spectrum_search(
+			spectrum,
+			n_hits=20,
+			controls=SearchControls(min_mass=40),
+			constraints=SearchConstraints(min_mw=150, max_mw=200, elements=['C', 'H', 'N']),
+			)
+
+	assert hit_list
+	assert hit_list[0].name.lower() == name.lower()
+
+	for hit in hit_list:
+		ref_data = search.get_reference_data(hit.spec_loc)
+		assert 150 <= ref_data.mw <= 200
+
+
+def test_screen_search(search: pyms_nist_search.Engine, spectra: Tuple[str, Optional[MassSpectrum]]):
+	name, spectrum = spectra
+	if name != "Diphenylamine":
+		pytest.skip()
+
+	assert spectrum is not None
+
+	spec_locs = search.screen_search(spectrum)
+	fast_spec_locs = search.screen_search(spectrum, controls=SearchControls(presearch="fast"))
+	assert 0 < len(fast_spec_locs) <= len(spec_locs)
+
+	hit_list = search.full_spectrum_search(spectrum, n_hits=1)
+	assert hit_list[0].spec_loc in spec_locs
+
+	exhaustive_hit_list = search.full_spectrum_search(
+			spectrum,
+			n_hits=1,
+			controls=SearchControls(search_mode='S', presearch="off"),
+			)
+	assert exhaustive_hit_list[0].name.lower() == name.lower()
+
+
+def test_search_timeout(search: pyms_nist_search.Engine, spectra: Tuple[str, Optional[MassSpectrum]]):
+	name, spectrum = spectra
+	if name != "Diphenylamine":
+		pytest.skip()
+
+	assert spectrum is not None
+
+	with pytest.raises(TimeoutError):
+		search.full_spectrum_search(
+				spectrum,
+				controls=SearchControls(search_mode='S', presearch="off", timeout=1e-6),
+				)
+
+	hit_list = search.full_spectrum_search(spectrum, n_hits=1, controls=SearchControls(timeout=60))
+	assert hit_list[0].name.lower() == name.lower()
+
+
+def test_search_stats():
+	stats = SearchStats(
+			presearch="default",
+			num_searches=1,
+			num_candidates=120,
+			num_compared=120,
+			num_hits=100,
+			num_callbacks=4,
+			presearch_time=0.25,
+			compare_time=0.5,
+			)
+	assert stats.total_time == 0.75
+	assert SearchStats.from_dict(json.loads(stats.to_json())) == stats
+	assert repr(stats) == (
+			"SearchStats(presearch='default', num_searches=1, num_candidates=120, num_compared=120, "
+			"num_hits=100, num_callbacks=4, presearch_time=0.25, compare_time=0.5)"
+			)
+
+
+def test_get_search_stats(search: pyms_nist_search.Engine, spectra: Tuple[str, Optional[MassSpectrum]]):
+	name, spectrum = spectra
+	if name != "Diphenylamine":
+		pytest.skip()
+
+	assert spectrum is not None
+
+	search.full_spectrum_search(spectrum, n_hits=5)
+	stats = search.get_search_stats()
+	assert stats.presearch == "default"
+	assert stats.num_searches == 1
+	assert stats.num_candidates is not None
+	assert 0 < stats.num_compared == stats.num_candidates
+	assert stats.num_hits >= 5
+	assert stats.presearch_time >= 0
+	assert stats.compare_time >= 0
+
+	search.full_spectrum_search(spectrum, controls=SearchControls(search_mode='S', presearch="off"))
+	stats = search.get_search_stats()
+	assert stats.presearch == "off"
+	assert stats.num_candidates is None
+	assert stats.num_compared is None
+	assert stats.presearch_time == 0
@@ -1,5 +1,7 @@
 # 3rd party
 import pytest
+from pyms.Peak.Class import Peak
+from pyms.Spectrum import MassSpectrum, Scan
 
 # this package
 from pyms_nist_search import Engine, utils
@@ -108,3 +110,21 @@ def test_get_lib_paths(search: Engine):
 	lib_paths = search.get_lib_paths()
 	assert len(lib_paths) == 1
 	assert utils.lib_name_from_path(lib_paths[0]) == "MoNA"
+
+
+def test_as_mass_spectrum():
+	mass_spec = MassSpectrum([50.0, 51.0, 52.0], [10.0, 999.0, 5.0])
+	assert utils.as_mass_spectrum(mass_spec) is mass_spec
+
+	converted = utils.as_mass_spectrum(Scan([50.0, 51.0, 52.0], [10.0, 999.0, 5.0]))
+	assert isinstance(converted, MassSpectrum)
+	assert converted.mass_list == mass_spec.mass_list
+	assert converted.intensity_list == mass_spec.intensity_list
+
+	converted = utils.as_mass_spectrum(Peak(12.34, mass_spec))
+	assert isinstance(converted, MassSpectrum)
+	assert converted.mass_list == mass_spec.mass_list
+	assert converted.intensity_list == mass_spec.intensity_list
+
+	with pytest.raises(TypeError, match="`spectrum` must be a pyms.Spectrum.MassSpectrum"):
+		utils.as_mass_spectrum("Diphenylamine")  # type: ignore[arg-type]